@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Compares the memory and speed of sym.config.LinkTable and sym.config.CompactLinkTable
+
+For every requested size a synthetic table is generated with destinations relative to $HOME and sources in a config
+repo, spread over a tree of the requested depth like those of bench_scale.py, and each table is measured on it.
+
+Usage:
+    python benchmarks/bench_linktable.py [--links N [N ...]] [--depth D] [--repeat R] [--json FILE]
+
+The JSON results can be kept per release and compared to spot regressions, and to choose COMPACT_LINKS.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sym.config import CompactLinkTable  # noqa: E402
+from sym.config import LinkTable  # noqa: E402
+
+
+FILES_PER_DIR = 100
+REPO = '/home/user/git/dotfiles'
+TABLES = (('dict', LinkTable), ('compact', CompactLinkTable))
+
+
+def generate(links, depth):
+    """Returns a dict of destination to source paths, as a deserialized config holds them"""
+    symlinks = {}
+    for i in range(links):
+        parts = []
+        n = i // FILES_PER_DIR
+        for level in range(depth):
+            parts.append('d{}'.format(n % 10 if level < depth - 1 else n))
+            n //= 10
+        relpath = os.path.join(*(parts + ['file{}'.format(i)]))
+        symlinks[relpath] = os.path.join(REPO, relpath)
+    return symlinks
+
+
+def get_operations(table, symlinks):
+    """Returns a list of (name, function) of the operations to measure on a table class"""
+    loaded = table(symlinks)
+    destinations = list(symlinks)[::max(1, len(symlinks) // 1000)]
+    directory = os.path.dirname(destinations[len(destinations) // 2])
+
+    def change():
+        for destination in destinations:
+            loaded[destination] = symlinks[destination]
+        del loaded.changes[:]
+
+    def query():
+        loaded._sorted.clear()  # measure building the sorted index too
+        list(loaded.below(directory))
+        list(loaded.within(directory))
+
+    return [
+        ('load', lambda: table(symlinks)),
+        ('save', lambda: dict(loaded.items())),
+        ('lookup (1000)', lambda: [loaded[destination] for destination in destinations]),
+        ('change (1000)', change),
+        ('iterate', lambda: list(loaded.items())),
+        ('query', query),
+    ]
+
+
+def measure(func, repeat):
+    """Returns the best wall clock time of func in seconds"""
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure_size(table, links, depth):
+    """Returns the memory a table holds once the parsed config it was loaded from is gone, in bytes"""
+    tracemalloc.start()
+    symlinks = generate(links, depth)
+    loaded = table(symlinks)
+    del symlinks
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del loaded
+    return size
+
+
+def run(links, depth, repeat):
+    """Returns the results of every table for one synthetic table size"""
+    symlinks = generate(links, depth)
+    results = {}
+    print('{} links:'.format(links))
+    for name, table in TABLES:
+        size = measure_size(table, links, depth)
+        results[name] = {'bytes': size}
+        print('  {:<8} {:<16} {:>10.1f} MiB'.format(name, 'memory', size / 2.0 ** 20))
+        for operation, func in get_operations(table, symlinks):
+            seconds = measure(func, repeat)
+            results[name][operation] = seconds
+            print('  {:<8} {:<16} {:>10.1f} ms'.format(name, operation, seconds * 1000))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the memory and speed of the sym link tables')
+    parser.add_argument('--links', type=int, nargs='+', default=[10000, 100000, 500000],
+                        help='Numbers of links to generate tables for (default: %(default)s)')
+    parser.add_argument('--depth', type=int, default=3, help='Directory levels to spread links over (default: 3)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per operation (default: %(default)s)')
+    parser.add_argument('--json', metavar='FILE', help='Write the results as JSON to FILE')
+    args = parser.parse_args()
+
+    results = {}
+    for links in args.links:
+        results[str(links)] = run(links, args.depth, args.repeat)
+
+    if args.json:
+        with open(args.json, 'w') as stream:
+            json.dump({'python': platform.python_version(), 'depth': args.depth, 'repeat': args.repeat,
+                       'results': results}, stream, indent=1, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Measures how the sym API scales with the number of managed links
+
+For every requested size a synthetic config repo and $HOME are generated, with the links spread over a tree of the
+requested depth and a fraction of them broken, and each API operation is timed and its peak Python memory recorded.
+
+Usage:
+    python benchmarks/bench_scale.py [--links N [N ...]] [--depth D] [--broken FRACTION] [--repeat R] [--json FILE]
+
+The JSON results can be kept per release and compared to spot regressions.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sym import api  # noqa: E402
+from sym.config import load_config  # noqa: E402
+
+
+FILES_PER_DIR = 100
+
+
+class SyntheticHome(object):
+    """A throwaway $HOME and config repo managing a given number of links
+
+    Attributes:
+        homedir  - The generated home directory
+        testrepo - The generated config repo
+        links    - The number of managed links
+        depth    - How many directory levels the links are spread over
+        broken   - The fraction of links which are broken, half missing and half with a missing source
+    """
+
+    def __init__(self, links, depth, broken):
+        self.links = links
+        self.depth = depth
+        self.broken = broken
+        self.homedir = tempfile.mkdtemp('homedir')
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        self.environ = dict(os.environ)
+
+    def relpath(self, i):
+        """Returns the path of the i-th file relative to the home or repo directory"""
+        parts = []
+        n = i // FILES_PER_DIR
+        for level in range(self.depth):
+            parts.append('d{}'.format(n % 10 if level < self.depth - 1 else n))
+            n //= 10
+        return os.path.join(*(parts + ['file{}'.format(i)]))
+
+    def generate(self):
+        os.environ['HOME'] = self.homedir
+        os.environ['XDG_CACHE_HOME'] = os.path.join(self.homedir, '.cache')
+        api.init(argparse.Namespace(basedir=self.testrepo))
+
+        config = load_config(api.get_symconfig_path())
+        broken_every = int(1 / self.broken) if self.broken else 0
+        for i in range(self.links):
+            relpath = self.relpath(i)
+            source = os.path.join(self.testrepo, relpath)
+            destination = os.path.join(self.homedir, relpath)
+            for path in (source, destination):
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+            config.symlinks[relpath] = source
+
+            if not broken_every or i % broken_every:
+                open(source, 'a').close()
+                os.symlink(source, destination)
+            elif i % (2 * broken_every) == 0:
+                os.symlink(source, destination)  # broken by a missing source
+            # else: broken by a missing link
+        config.save()
+
+    def cleanup(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+
+def get_operations(home):
+    """Returns a list of (name, function) of the operations to measure"""
+    symconfig = api.get_symconfig_path()
+    new_source = os.path.join(home.testrepo, 'new')
+    open(new_source, 'a').close()
+
+    def load_uncached():
+        os.utime(symconfig)  # a just modified config is never served from the cache
+        load_config(symconfig)
+
+    def load_cached():
+        os.utime(symconfig, ns=(10 ** 18, 10 ** 18))  # old enough to be cached, the first run fills the cache
+        load_config(symconfig)
+
+    config = load_config(symconfig)
+    batch = [(new_source, os.path.join(home.homedir, '.batch{}'.format(i))) for i in range(100)]
+    return [
+        ('load_config', load_uncached),
+        ('load_config (cached)', load_cached),
+        ('save', config.save),
+        ('add', lambda: api.add(argparse.Namespace(source=new_source, destination=os.path.join(home.homedir, '.new'),
+                                                   fold=False, copy=False))),
+        ('add_many (100)', lambda: api.add_many(batch)),
+        ('verify', lambda: api.verify(argparse.Namespace(jobs=16, incremental=False))),
+        ('verify --incremental', lambda: api.verify(argparse.Namespace(jobs=16, incremental=True))),
+        ('apply --dry-run', lambda: api.apply(argparse.Namespace(dry_run=True, copy=False))),
+        ('list', lambda: list(api.list_links(argparse.Namespace(path=None, pattern=None, source=None)))),
+        ('list --glob', lambda: list(api.list_links(argparse.Namespace(path=None, pattern='.batch1*', source=None)))),
+    ]
+
+
+def measure(func, repeat):
+    """Returns the best wall clock time of func in seconds, and its peak traced memory in bytes"""
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    # Tracing allocations slows everything down, so the peak memory comes from a separate run
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def run(links, depth, broken, repeat):
+    """Returns the results of every operation for one synthetic home"""
+    home = SyntheticHome(links, depth, broken)
+    try:
+        start = time.perf_counter()
+        home.generate()
+        print('{} links: generated in {:.1f} s'.format(links, time.perf_counter() - start))
+
+        results = {}
+        for name, func in get_operations(home):
+            seconds, peak = measure(func, repeat)
+            results[name] = {'seconds': seconds, 'peak_bytes': peak}
+            print('  {:<24} {:>10.1f} ms {:>10.1f} MiB'.format(name, seconds * 1000, peak / 2.0 ** 20))
+        return results
+    finally:
+        home.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure how the sym API scales with the number of managed links')
+    parser.add_argument('--links', type=int, nargs='+', default=[10000, 50000, 100000],
+                        help='Numbers of links to generate homes for (default: %(default)s)')
+    parser.add_argument('--depth', type=int, default=3, help='Directory levels to spread links over (default: 3)')
+    parser.add_argument('--broken', type=float, default=0.01,
+                        help='Fraction of the links which are broken (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per operation (default: %(default)s)')
+    parser.add_argument('--json', metavar='FILE', help='Write the results as JSON to FILE')
+    args = parser.parse_args()
+
+    results = {}
+    for links in args.links:
+        results[str(links)] = run(links, args.depth, args.broken, args.repeat)
+
+    if args.json:
+        with open(args.json, 'w') as stream:
+            json.dump({'python': platform.python_version(), 'depth': args.depth, 'broken': args.broken,
+                       'repeat': args.repeat, 'results': results}, stream, indent=1, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
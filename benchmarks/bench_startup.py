@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Measures the cold start time of every sym subcommand
+
+Every subcommand is run in a fresh interpreter against a throwaway $HOME and config repo, the minimum and median wall
+clock times are reported together with the startup time of a bare interpreter for reference.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--json FILE] [--baseline FILE] [--tolerance FRACTION]
+
+With --baseline the results are compared against the JSON written by an earlier --json run and the script exits with 1
+if any subcommand got slower than the tolerance allows.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LINKS = 50
+
+
+def get_commands(testrepo, homedir):
+    """Returns a list of (name, argv) of the subcommands to measure"""
+    source = os.path.join(testrepo, 'file0')
+    destination = os.path.join(homedir, '.file0')
+    return [
+        ('interpreter', None),
+        ('help', ['--help']),
+        ('add -h', ['add', '-h']),
+        ('add', ['add', source, destination]),
+        ('remove', ['remove', destination]),
+        ('verify', ['verify']),
+        ('list', ['list']),
+        ('apply --dry-run', ['apply', '--dry-run']),
+    ]
+
+
+def setup_home(homedir, testrepo, env):
+    """Initializes a config in homedir with LINKS links into testrepo"""
+    run_sym(['init', testrepo], env)
+    with open(os.path.join(testrepo, 'manifest'), 'w') as manifest:
+        for i in range(LINKS):
+            source = os.path.join(testrepo, 'file{}'.format(i))
+            open(source, 'a').close()
+            manifest.write('{} {}\n'.format(source, os.path.join(homedir, '.file{}'.format(i))))
+    run_sym(['add', '--from-file', os.path.join(testrepo, 'manifest')], env)
+
+
+def run_sym(argv, env):
+    """Runs sym in a fresh interpreter and returns the wall clock time it took"""
+    cmd = [sys.executable, '-c', 'pass'] if argv is None else [sys.executable, '-m', 'sym'] + argv
+    start = time.perf_counter()
+    subprocess.call(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def measure(runs):
+    """Returns a dict of subcommand name to its min and median cold start time in seconds"""
+    homedir = tempfile.mkdtemp('homedir')
+    testrepo = tempfile.mkdtemp('testrepo')
+    env = dict(os.environ, HOME=homedir, XDG_CACHE_HOME=os.path.join(homedir, '.cache'),
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    try:
+        setup_home(homedir, testrepo, env)
+        results = {}
+        for name, argv in get_commands(testrepo, homedir):
+            run_sym(argv, env)  # warm up the OS caches
+            timings = [run_sym(argv, env) for i in range(runs)]
+            results[name] = {'min': min(timings), 'median': statistics.median(timings)}
+        return results
+    finally:
+        shutil.rmtree(homedir)
+        shutil.rmtree(testrepo)
+
+
+def compare(results, baseline, tolerance):
+    """Returns the names of the subcommands whose min time regressed past tolerance"""
+    regressions = []
+    for name, timing in sorted(results.items()):
+        expected = baseline.get(name, {}).get('min')
+        if expected is not None and timing['min'] > expected * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the cold start time of every sym subcommand')
+    parser.add_argument('--runs', type=int, default=10, help='Runs per subcommand (default: %(default)s)')
+    parser.add_argument('--json', metavar='FILE', help='Write the results as JSON to FILE')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare against the JSON results in FILE')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown against the baseline as a fraction (default: %(default)s)')
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    print('{:<20} {:>10} {:>10}'.format('command', 'min (ms)', 'median (ms)'))
+    for name, timing in results.items():
+        print('{:<20} {:>10.1f} {:>10.1f}'.format(name, timing['min'] * 1000, timing['median'] * 1000))
+
+    if args.json:
+        with open(args.json, 'w') as stream:
+            json.dump({'python': platform.python_version(), 'runs': args.runs, 'results': results}, stream,
+                      indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for name in regressions:
+            print('Regression: {} took {:.1f} ms, baseline {:.1f} ms'.format(
+                name, results[name]['min'] * 1000, baseline[name]['min'] * 1000))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,7 +22,9 @@
 #  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 #  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import sys
+
 from sym import cli
 
 parser = cli.setup_parser()
-cli.parse_args(parser)
+sys.exit(cli.parse_args(parser))
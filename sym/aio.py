@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""An asyncio facade of sym.api
+
+The blocking work of every call (reading and writing the config, the symlink, lstat and realpath calls) runs in a
+thread pool, so that the event loop of the caller is never blocked on a slow home directory. The facade loads the config
+once and keeps it resident (see sym.config.keep_resident) for all its calls, the saves of many changes are coalesced
+into a single write.
+
+    async with Sym() as sym:
+        await sym.add('~/dotfiles/vimrc', '~/.vimrc')
+        results = await sym.verify()
+"""
+
+import argparse
+import asyncio
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from sym import api
+from sym.config import keep_resident
+from sym.config import load_config
+from sym.config import release_resident
+from sym.paths import PathResolver
+from sym.verify import DEFAULT_JOBS
+from sym.verify import Fingerprints
+from sym.verify import verify_links
+
+
+FLUSH_DELAY = 0.1  # Seconds a dirty config waits for further changes before it is written
+
+
+class Sym(object):
+    """Awaitable versions of the sym.api commands, sharing one config kept in memory
+
+    The calls which may change the config (init, add, add_many, remove and apply, which records the copies it makes)
+    run one at a time, verify runs against a snapshot of the symlinks so that it does not hold up the changes. A
+    changed config is written FLUSH_DELAY seconds after the first change, along with every change made in the
+    meantime, and when the facade is closed. A config changed on disk by something else is merged or loaded again, as
+    in sym.server.Server.refresh.
+
+    Attributes:
+        symconfig   - The real path to the symconfig file
+        jobs        - The maximum number of calls running at once, and of filesystem checks a verify runs at once
+        flush_delay - How long a changed config waits for further changes before it is written, in seconds
+        userhome    - The home directory whose config is used, None for the home directory of the user
+        config      - The resident config, None until the first call which needs it
+    """
+
+    def __init__(self, jobs=DEFAULT_JOBS, flush_delay=FLUSH_DELAY, userhome=None):
+        self.userhome = userhome
+        self.symconfig = api.get_symconfig_path(userhome)
+        self.jobs = jobs
+        self.flush_delay = flush_delay
+        self.config = None
+        self._executor = ThreadPoolExecutor(max_workers=jobs)
+        self._lock = threading.Lock()  # Guards the config, and the undo journal which Transactions of a process share
+        self._flush_task = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def init(self, path):
+        """Initializes the sym config, see sym.api.init
+
+        Parameters:
+            path - The directory containing the dotfile sources
+        """
+        await self._change(api.init, argparse.Namespace(basedir=path))
+
+    async def add(self, source, destination, fold=False, copy=False):
+        """Creates a symlink from a source path at a destination, see sym.api.add
+
+        Parameters:
+            source      - The path to the source file in which to symlink to
+            destination - The path to the location where to create the symlink
+            fold        - Link the whole source directory with the fewest symlinks possible, see sym.fold.fold
+            copy        - Copy the source file to the destination rather than symlinking it, see sym.copies
+        """
+        await self._change(api.add, argparse.Namespace(source=source, destination=destination, fold=fold,
+                                                       copy=copy))
+
+    async def add_many(self, entries, atomic=False):
+        """Creates symlinks for many source and destination pairs, see sym.api.add_many
+
+        Parameters:
+            entries - An iterable of (source, destination) pairs
+            atomic  - Add every entry or none of them
+
+        Returns:
+            A list of (entry, error) tuples for every entry that could not be added
+        """
+        def add_many(entries, userhome):
+            return api.add_many(entries, atomic, userhome=userhome)
+
+        return await self._change(add_many, list(entries))
+
+    async def remove(self, paths, recursive=False):
+        """Removes dotfiles from management, deleting their symlinks, see sym.api.remove
+
+        Parameters:
+            paths     - The destinations, sources or directories to remove
+            recursive - Whether directories select everything below them
+
+        Returns:
+            A list of sym.remove.RemoveResult, one per selected symlink
+        """
+        return await self._change(api.remove, argparse.Namespace(paths=list(paths), recursive=recursive))
+
+    async def verify(self, incremental=False):
+        """Verifies that every symlink in the symconfig exists and points to its source, see sym.api.verify
+
+        Parameters:
+            incremental - Only check the symlinks which changed since the last verify
+
+        Returns:
+            A list of sym.verify.VerifyResult, one per symlink in the symconfig
+        """
+        return await self._run(self._verify, incremental)
+
+    async def apply(self, dry_run=False, copy=False):
+        """Creates every symlink in the symconfig which does not exist yet, see sym.api.apply
+
+        Parameters:
+            dry_run - Only report what would be done, without changing the filesystem
+            copy    - Materialize every entry as a copy rather than a symlink, see sym.copies
+
+        Returns:
+            A list of sym.apply.ApplyResult, one per symlink in the symconfig
+        """
+        return await self._change(api.apply, argparse.Namespace(dry_run=dry_run, copy=copy))
+
+    async def flush(self):
+        """Writes the config now if it has changes which were not written yet"""
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+        self._flush_task = None
+        await self._run(self._flush)
+
+    async def close(self):
+        """Writes the config if it changed and stops the thread pool, the facade can not be used afterwards"""
+        await self.flush()
+        await self._run(self._release)
+        self._executor.shutdown()
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _change(self, func, args):
+        try:
+            return await self._run(self._locked, func, args)
+        finally:
+            if self._flush_task is None and self.config is not None and self.config.dirty:
+                self._flush_task = asyncio.ensure_future(self._delayed_flush())
+
+    def _locked(self, func, args):
+        with self._lock:
+            self._load()
+            return func(args, userhome=self.userhome)
+
+    def _verify(self, incremental):
+        with self._lock:
+            config = self._load()
+            symlinks, copies = dict(config.symlinks.items()), dict(config.copies)
+        fingerprints = Fingerprints.load(self.symconfig) if incremental else Fingerprints()
+        results = verify_links(symlinks, PathResolver(self.userhome), self.jobs, fingerprints, incremental,
+                               copies=copies)
+        fingerprints.save(self.symconfig)
+        return results
+
+    def _load(self):
+        """Returns the resident config, loading it first if it is not loaded yet or changed on disk"""
+        if self.config is not None and self.config.changed_on_disk():
+            if self.config.dirty:
+                self.config.flush()  # Merges the changes on disk, see sym.config.ConfigYAML.write
+            else:
+                self._release()
+        if self.config is None:
+            self.symconfig = api.get_symconfig_path(self.userhome)  # Changes when sym.api.init links ~/.symconfig
+            try:
+                self.config = load_config(self.symconfig)
+            except FileNotFoundError:
+                return None  # Not initialized yet, sym.api.init creates it
+            keep_resident(self.symconfig, self.config)
+        return self.config
+
+    def _flush(self):
+        with self._lock:
+            if self.config is not None:
+                self.config.flush()
+
+    def _release(self):
+        if self.config is not None:
+            release_resident(self.symconfig)
+            self.config = None
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_delay)
+        await self.flush()
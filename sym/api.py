@@ -25,17 +25,35 @@
 
 import os
 
-import yaml
-
+from sym.apply import apply_links
 from sym.config import ConfigYAML
+from sym.config import load_config
+from sym.copies import copy_file
+from sym.copies import digest_of
+from sym.copies import hash_file
 from sym.exceptions import FileExistsError
 from sym.exceptions import FileNotFoundError
+from sym.fold import find_folds
+from sym.fold import fold
+from sym.fold import prune_folds
+from sym.fold import refold
+from sym.fold import unfold_parents
+from sym.instrument import timed
+from sym.paths import PathResolver
+from sym.paths import get_user_home
+from sym.query import query_links
+from sym.remove import remove_links
+from sym.remove import select_links
+from sym.transaction import Transaction
+from sym.verify import Fingerprints
+from sym.verify import verify_links
 
 
 ###
 ### API Functions
 ###
-def init(args):
+@timed('api.init')
+def init(args, userhome=None):
     """Initialize sym configuration
 
     Symlink's the sym configuration file to ~/.symconfig to a directory containing a git repo for management of system
@@ -43,12 +61,13 @@ def init(args):
     directory and initialize it as a git repo before proceeding.
 
     Parameters:
-        basedir - The base directory where your configuration git repo lives
+        basedir  - The base directory where your configuration git repo lives
+        userhome - The home directory to initialize, the home directory of the user by default
 
     Returns:
         An integer representing error code
     """
-    userhome = get_user_home()
+    userhome = userhome if userhome is not None else get_user_home()
     symconfig = os.path.join(userhome, '.symconfig')
 
     # figure out if the path is absolute or relative or if it doesn't exist
@@ -72,92 +91,406 @@ def init(args):
     #
     if not os.path.exists(symconfig_basepath):
         config = ConfigYAML()
+        config.path = os.path.realpath(symconfig)
         config.save()
 
     return True  # Success
 
 
-def add(args):
+@timed('api.add')
+def add(args, userhome=None):
     """Creates a symlink from a source path at a destination
 
     Creates a symlink, if the symlink already exists and verified pointing to the correct path then simply updates the
     database to ensure that the symlink is stored.
 
-    Paths are stored as follows:
-        - If absolute paths are passed, then the absolute paths will be stored in the database.
-        - If a relative path is passed, and if the path is relative to the user's $HOME directory then a path relative
-          to the user's $HOME will be saved instead.
-        - If a relative path is passed that is not within the user's $HOME then the absolute path will be stored.
+    Paths are stored as follows (see sym.paths.PathResolver.key):
+        - If the path is within the user's $HOME then a path relative to the user's $HOME will be stored.
+        - If the path is not within the user's $HOME then the absolute path will be stored.
+        In both cases the directories of the path are resolved to their real paths, so that the same file is always
+        stored the same way no matter how it was passed.
+
+    A destination within a directory folded for a tree (see sym.fold) unfolds the directory first. With fold, the
+    source directory is linked into the destination directory as a folded tree instead. With copy, the source file is
+    materialized as a copy at the destination instead of a symlink (see sym.copies).
+
+    The filesystem changes and the config change are made in a sym.transaction.Transaction, if anything fails the
+    filesystem changes are rolled back.
 
     Parameters:
         source      - The path to the source file in which to symlink to
         destination - The path to the location where to create the symlink
-    """
-    symconfig = get_symconfig_path()
-    source = os.path.abspath(args.source)
-    destination = os.path.abspath(args.destination)
+        fold        - Link the whole source directory with the fewest symlinks possible, see sym.fold.fold
+        copy        - Copy the source file to the destination rather than symlinking it
+        userhome    - The home directory whose config to add to, the home directory of the user by default
 
-    if not os.path.exists(source):
-        raise FileNotFoundError('Source path does not exist: {}'.format(source))
+    Returns:
+        The Link added, with fold the Link of the root of the tree
+    """
+    symconfig = get_symconfig_path(userhome)
+    config = load_config(symconfig)
+    resolver = PathResolver(userhome)
+    with Transaction(config, symconfig) as transaction:
+        if args.fold:
+            source, destination = resolver.absolute(args.source), resolver.absolute(args.destination)
+            fold(config, source, destination, resolver, transaction)
+            link = Link(source, destination, resolver.key(source), resolver.key(destination))
+        else:
+            unfold_parents(config, resolver.absolute(args.destination), resolver, transaction)
+            link = plan_link(args.source, args.destination, resolver, args.copy)
+            digest = create_link(link, transaction, args.copy)
+            forget_legacy_keys(config, link, resolver)
+            config.symlinks[link.save_destination] = link.save_source
+            if args.copy:
+                config.copies[link.save_destination] = digest
+            else:
+                config.copies.pop(link.save_destination, None)
+    return link
+
+
+@timed('api.add_many')
+def add_many(entries, atomic=False, report=None, userhome=None):
+    """Creates symlinks for many source and destination pairs, saving the config only once
+
+    Every entry is validated up front before any link is created, the links are then created in one pass and the
+    config is loaded and saved a single time for the whole batch. An entry that fails is reported back to the caller
+    rather than aborting the rest of the batch, unless the batch is atomic.
+
+    The batch runs in a sym.transaction.Transaction, an atomic batch is rolled back entirely as soon as any entry
+    fails, so that either every entry is added or none is.
 
-    if os.path.lexists(destination):
-        if not os.path.realpath(destination) == source:
-            raise FileExistsError('Destination path exists, cannot create link at: {}'.format(destination))
-        # else: Symlink exists but is already pointing to the correct path
-    else:  # If destination path doesn't exist, proceed with creating the symlink
-        os.symlink(source, destination)
-
-    # Add or Update symlink in symlink database
-    # Note: use path relative to $HOME or absolute path if provided by user
-    save_source = source
-    if args.source.startswith('/'):
-        save_source = args.source
-    elif source.startswith(get_user_home()):
-        save_source = os.path.relpath(source, get_user_home())
-
-    save_destination = destination
-    if args.destination.startswith('/'):
-        save_destination = args.destination
-    elif args.destination.startswith(get_user_home()):
-        save_destination = os.path.relpath(destination, get_user_home())
+    Parameters:
+        entries - An iterable of (source, destination) pairs, see add() for how the paths are stored
+        atomic  - Add every entry or none of them
+        report  - Called with (entry, error) as soon as the outcome of an entry is known, error is None for an entry
+                  which was added. The entries of an atomic batch are only reported added once the whole batch is.
+        userhome - The home directory whose config to add to, the home directory of the user by default
 
+    Returns:
+        A list of (entry, error) tuples for every entry that could not be added
+    """
+    symconfig = get_symconfig_path(userhome)
     config = load_config(symconfig)
-    config.symlinks[save_destination] = save_source
+    resolver = PathResolver(userhome)
+    failures = []
+    planned = []
+    added = []
+    claimed = {}  # destination -> source, catches conflicting duplicates within the batch
+
+    with Transaction(config, symconfig) as transaction:
+        for entry in entries:
+            try:
+                if len(entry) != 2:
+                    raise ValueError('Malformed entry, expected a source and a destination: {}'.format(' '.join(entry)))
+                unfold_parents(config, resolver.absolute(entry[1]), resolver, transaction)
+                link = plan_link(entry[0], entry[1], resolver)
+                if claimed.get(link.save_destination, link.save_source) != link.save_source:
+                    raise FileExistsError('Destination path is listed more than once in batch: {}'.format(
+                        link.destination))
+            except (FileExistsError, FileNotFoundError, ValueError) as e:
+                failures.append((entry, e))
+                if report is not None:
+                    report(entry, e)
+                continue
+            claimed[link.save_destination] = link.save_source
+            planned.append((entry, link))
+
+        for entry, link in planned:
+            if atomic and failures:
+                break
+            try:
+                create_link(link, transaction)
+            except OSError as e:
+                failures.append((entry, e))
+                if report is not None:
+                    report(entry, e)
+                continue
+            forget_legacy_keys(config, link, resolver)
+            config.symlinks[link.save_destination] = link.save_source
+            if atomic:
+                added.append(entry)
+            elif report is not None:
+                report(entry, None)
+
+        if atomic and failures:
+            transaction.rollback()
+            added = []
+
+    if report is not None:
+        for entry in added:
+            report(entry, None)
+    return failures
+
+
+@timed('api.migrate')
+def migrate(args, userhome=None):
+    """Converts the symconfig to another file format or storage mode
+
+    Parameters:
+        format   - The format to store the symconfig in, one of sym.serializers.FORMATS, None to keep the current one
+        storage  - How to store the symconfig, one of sym.config.STORAGES, None to keep the current one
+        userhome - The home directory whose config to convert, the home directory of the user by default
+    """
+    config = load_config(get_symconfig_path(userhome))
+    if args.format:
+        config.format = args.format
+    if args.storage:
+        config.storage = args.storage
     config.save()
 
 
-def remove(args):
-    print('remove')
+@timed('api.split')
+def split(args, userhome=None):
+    """Splits the symconfig into shards, so that every host only loads the symlinks it uses (see sym.shards)
+
+    Parameters:
+        rules    - A list of (shard name, glob) tuples, every symlink goes to the first shard whose glob matches its
+                   destination as stored in the symconfig
+        default  - The shard for the symlinks no rule matches
+        userhome - The home directory whose config to split, the home directory of the user by default
+
+    Returns:
+        An OrderedDict of shard name to the number of symlinks in it
+    """
+    from sym.shards import split_config
+
+    return split_config(get_symconfig_path(userhome), args.rules, args.default)
+
+
+@timed('api.apply')
+def apply(args, report=None, userhome=None):
+    """Creates every symlink in the symconfig which does not exist yet, e.g. to deploy the config on a new machine
+
+    The entries materialized as copies are brought up to date with their sources, see sym.apply.apply_links.
 
+    Parameters:
+        dry_run  - Only report what would be done, without changing the filesystem
+        copy     - Materialize every entry as a copy rather than a symlink, e.g. for a home used in a container which
+                   can not see the sources
+        report   - Called with every sym.apply.ApplyResult as soon as it is known
+        userhome - The home directory to apply the config of, the home directory of the user by default
+
+    Returns:
+        A list of sym.apply.ApplyResult, one per symlink in the symconfig
+    """
+    config = load_config(get_symconfig_path(userhome))
+    copies = dict(config.copies)
+    results = apply_links(config.symlinks, PathResolver(userhome), args.dry_run, report, config.copies, args.copy)
+    if config.copies != copies:
+        config.save()
+    return results
+
+
+@timed('api.remove')
+def remove(args, userhome=None):
+    """Removes dotfiles from management, deleting their symlinks
+
+    Every path may be the destination of a symlink or the source of one or more symlinks, with recursive a directory
+    selects every symlink whose destination or source lies below it. Nothing is removed if a path is not managed by
+    sym, and a symlink which does not point to its source is left alone along with its entry (see sym.remove). The
+    config is saved once for all the paths. A path within a folded directory unfolds it first, and the folded trees
+    the symlinks were part of are refolded where possible (see sym.fold). Everything runs in one
+    sym.transaction.Transaction.
+
+    Parameters:
+        paths     - The destinations, sources or directories to remove
+        recursive - Whether directories select everything below them
+        userhome  - The home directory whose config to remove from, the home directory of the user by default
+
+    Returns:
+        A list of sym.remove.RemoveResult, one per selected symlink
+    """
+    symconfig = get_symconfig_path(userhome)
+    config = load_config(symconfig)
+    resolver = PathResolver(userhome)
+    with Transaction(config, symconfig) as transaction:
+        for path in args.paths:
+            unfold_parents(config, resolver.absolute(path), resolver, transaction)
+        destinations = select_links(config.symlinks, resolver, args.paths, args.recursive)
+        results = remove_links(config.symlinks, destinations, resolver, transaction, config.copies)
+        prune_folds(config)
+        for tree in set(tree for result in results for tree in find_folds(config, result.destination)):
+            refold(config, tree, resolver, transaction)
+    return results
+
+
+def list_links(args, userhome=None):
+    """Lists the symlinks in the symconfig, optionally only those matching a query
+
+    Parameters:
+        path     - Only symlinks which are this path or lie below it
+        pattern  - Only symlinks whose destination, as stored in the symconfig, matches this glob
+        source   - Only symlinks whose source is this path or lies below it
+        userhome - The home directory whose config to list, the home directory of the user by default
+
+    Returns:
+        A generator of (destination, source) tuples sorted by destination, see sym.query.query_links
+    """
+    config = load_config(get_symconfig_path(userhome))
+    return query_links(config.symlinks, PathResolver(userhome), args.path, args.pattern, args.source)
 
-def verify(args):
-    print('verify')
+
+@timed('api.status')
+def status(args, userhome=None):
+    """Reports which symlinks in the symconfig changed, and optionally which sources changed content (see sym.status)
+
+    Parameters:
+        content  - Also compare the content of every source to the recorded snapshot
+        snapshot - Record the current content of the sources as the snapshot, implies content
+        jobs     - The maximum number of filesystem checks and files hashed concurrently
+        userhome - The home directory to check the config of, the home directory of the user by default
+
+    Returns:
+        A list of sym.status.StatusResult, one per symlink in the symconfig
+    """
+    from sym.status import ContentHashes
+    from sym.status import check_status
+    from sym.status import record_snapshot
+
+    symconfig = get_symconfig_path(userhome)
+    config = load_config(symconfig)
+    if not (args.content or args.snapshot):
+        return check_status(config.symlinks, PathResolver(userhome), args.jobs, copies=config.copies)[0]
+
+    hashes = ContentHashes.load(symconfig)
+    results, changes = check_status(config.symlinks, PathResolver(userhome), args.jobs, hashes, config.copies)
+    if args.snapshot:
+        record_snapshot(hashes, changes)
+    hashes.save(symconfig)
+    return results
+
+
+@timed('api.verify')
+def verify(args, report=None, userhome=None):
+    """Verifies that every symlink in the symconfig exists and points to its source
+
+    Every verify records stat fingerprints of the symlinks it found OK, an incremental verify uses them to skip the
+    symlinks which have not changed since (see sym.verify.check_link_incremental).
+
+    Parameters:
+        jobs        - The maximum number of filesystem checks to run concurrently
+        incremental - Only check the symlinks which changed since the last verify
+        report      - Called with every sym.verify.VerifyResult as soon as it is known
+        userhome    - The home directory to verify the config of, the home directory of the user by default
+
+    Returns:
+        A list of sym.verify.VerifyResult, one per symlink in the symconfig
+    """
+    symconfig = get_symconfig_path(userhome)
+    config = load_config(symconfig)
+    fingerprints = Fingerprints.load(symconfig) if args.incremental else Fingerprints()
+    results = verify_links(config.symlinks, PathResolver(userhome), args.jobs, fingerprints, args.incremental,
+                           report, config.copies)
+    fingerprints.save(symconfig)
+    return results
+
+
+def watch(args, userhome=None):
+    """Returns a sym.watch.Watcher for the symconfig, which checks symlinks as soon as they change
+
+    Parameters:
+        repair   - Recreate the symlinks which went missing
+        debounce - How long the filesystem must be quiet before the changed symlinks are checked, in seconds
+        userhome - The home directory to watch the config of, the home directory of the user by default
+    """
+    from sym.watch import Watcher
+
+    return Watcher(get_symconfig_path(userhome), userhome, repair=args.repair, debounce=args.debounce)
 
 
 ###
 ### Helper functions
 ###
-def get_user_home():
-    """Returns the home directory of the user"""
-    return os.path.expanduser(os.environ["HOME"])
+@timed('paths.get_symconfig_path')
+def get_symconfig_path(userhome=None):
+    """Returns the real path to .symconfig, in the home directory of the user unless userhome is given"""
+    userhome = userhome if userhome is not None else get_user_home()
+    return os.path.realpath(os.path.join(userhome, '.symconfig'))
 
 
-def get_symconfig_path():
-    """Returns the real path to .symconfig"""
-    userhome = get_user_home()
-    return os.path.realpath(os.path.join(userhome, '.symconfig'))
+class Link(object):
+    """A planned symlink, holding both the resolved paths and the paths to store in the config"""
+
+    def __init__(self, source, destination, save_source, save_destination):
+        self.source = source
+        self.destination = destination
+        self.save_source = save_source
+        self.save_destination = save_destination
 
 
-def load_config(symconfig):
-    """Returns the symconfig object (ConfigYAML)
+@timed('paths.plan_link')
+def plan_link(source_arg, destination_arg, resolver, copy=False):
+    """Validates a source and destination pair and works out how to store them
 
     Parameters:
-        symconfig - The path to symconfig file
+        source_arg      - The source path as given by the user
+        destination_arg - The destination path as given by the user
+        resolver        - The sym.paths.PathResolver of the current command
+        copy            - Whether the source is to be copied rather than symlinked, see sym.copies
 
     Returns:
-        Object containing symconfig (ConfigYAML)
+        A Link describing the symlink to create
     """
-    stream = open(symconfig, 'r')
-    config = yaml.load(stream)
-    stream.close()
-    return config
+    source = resolver.absolute(source_arg)
+    destination = resolver.absolute(destination_arg)
+
+    if not os.path.exists(source):
+        raise FileNotFoundError('Source path does not exist: {}'.format(source))
+
+    if copy:
+        if not os.path.isfile(source):
+            raise ValueError('Only files can be copied: {}'.format(source))
+        if os.path.lexists(destination) and not resolver.realpath(destination) == resolver.realpath(source) and \
+                digest_of(destination) != hash_file(source):
+            raise FileExistsError('Destination path exists, cannot create copy at: {}'.format(destination))
+    elif os.path.lexists(destination) and not resolver.realpath(destination) == resolver.realpath(source):
+        raise FileExistsError('Destination path exists, cannot create link at: {}'.format(destination))
+
+    return Link(source, destination, resolver.key(source), resolver.key(destination))
+
+
+def forget_legacy_keys(config, link, resolver):
+    """Drops the entry an earlier version of sym stored the destination of a Link under, see PathResolver.keys()"""
+    for key in resolver.keys(link.destination)[1:]:
+        config.symlinks.pop(key, None)
+
+
+@timed('link.create')
+def create_link(link, fs=os, copy=False):
+    """Creates the symlink for a planned Link unless it already exists and points to the correct path
+
+    Parameters:
+        link - The planned Link
+        fs   - Makes the filesystem changes, os or a sym.transaction.Transaction
+        copy - Copy the source instead, replacing a symlink to it, see sym.copies
+
+    Returns:
+        The digest of the copied content with copy, otherwise None
+    """
+    if copy:
+        if os.path.islink(link.destination):
+            fs.unlink(link.destination)
+        return (copy_file if fs is os else fs.copy_file)(link.source, link.destination)
+    if not os.path.lexists(link.destination):
+        fs.symlink(link.source, link.destination)
+
+
+def read_manifest(stream):
+    """Reads source and destination pairs from a manifest
+
+    Each line of a manifest holds a source and a destination separated by whitespace, paths containing spaces may be
+    quoted. Blank lines and lines starting with # are ignored.
+
+    Parameters:
+        stream - A file object to read the manifest from
+
+    Returns:
+        A generator of lists, one per manifest entry
+    """
+    import shlex
+
+    for line in stream:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        yield shlex.split(line)
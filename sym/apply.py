@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import collections
+import os
+
+from sym import copies as symcopies
+
+
+CREATED = 'created'
+UPDATED = 'updated'  # A copy (see sym.copies) was replaced by the current content of its source
+UNCHANGED = 'unchanged'
+CONFLICT = 'conflict'
+
+STATUSES = (CREATED, UPDATED, UNCHANGED, CONFLICT)
+
+
+class ApplyResult(object):
+    """The outcome of applying a single symlink entry
+
+    Attributes:
+        destination - The destination path as stored in the config
+        source      - The source path as stored in the config
+        status      - One of CREATED, UPDATED, UNCHANGED or CONFLICT
+        reason      - Why the entry conflicts, None otherwise
+    """
+
+    def __init__(self, destination, source, status, reason=None):
+        self.destination = destination
+        self.source = source
+        self.status = status
+        self.reason = reason
+
+    def __str__(self):
+        if self.reason:
+            return '{}: {} -> {} ({})'.format(self.status, self.destination, self.source, self.reason)
+        return '{}: {} -> {}'.format(self.status, self.destination, self.source)
+
+
+def plan_links(symlinks, resolver):
+    """Groups the symlink entries by the directory their destination lives in
+
+    Parameters:
+        symlinks - A mapping of destination to source paths, as stored in ConfigYAML.symlinks
+        resolver - The sym.paths.PathResolver to resolve paths with
+
+    Returns:
+        An OrderedDict of parent directory to a list of (name, destination, source, absolute source) tuples, sorted by
+        directory so that parents are always planned before their children
+    """
+    groups = collections.defaultdict(list)
+    for destination, source in symlinks.items():
+        parent, name = os.path.split(resolver.resolve(destination))
+        groups[parent].append((name, destination, source, resolver.resolve(source)))
+    return collections.OrderedDict(sorted(groups.items()))
+
+
+def _scan(parent):
+    """Returns a dict of name to os.DirEntry for everything in a directory, which must exist"""
+    with os.scandir(parent) as entries:
+        return dict((entry.name, entry) for entry in entries)
+
+
+def _links_to(entry, parent, source, dirfd, resolver):
+    if not entry.is_symlink():
+        return False
+    target = os.readlink(entry.name, dir_fd=dirfd) if dirfd is not None else os.readlink(entry.path)
+    if target == source:
+        return True
+    return resolver.realpath(os.path.join(parent, entry.name)) == resolver.realpath(source)
+
+
+def apply_links(symlinks, resolver, dry_run=False, report=None, copies=None, copy=False):
+    """Creates every symlink in the config which does not exist yet, and brings the copies up to date
+
+    The entries are grouped by parent directory, each directory is created at most once and scanned once with
+    os.scandir to find the entries which already exist, and the missing links are created relative to an open file
+    descriptor of the directory instead of resolving the full path again for every link.
+
+    An entry materialized as a copy (see sym.copies) is copied again when its source changed, unless the copy was
+    modified since it was made. A symlink to the source is replaced by a copy.
+
+    Parameters:
+        symlinks - A mapping of destination to source paths, as stored in ConfigYAML.symlinks
+        resolver - The sym.paths.PathResolver to resolve paths with
+        dry_run  - Only report what would be done, without changing the filesystem
+        report   - Called with every ApplyResult as soon as it is known
+        copies   - ConfigYAML.copies, updated with the digest of every copy made, None if there are none
+        copy     - Materialize every entry as a copy and record it in copies
+
+    Returns:
+        A list of ApplyResult, grouped by parent directory
+    """
+    results = []
+    copies = copies if copies is not None else {}
+
+    def add(result):
+        results.append(result)
+        if report is not None:
+            report(result)
+
+    for parent, entries in plan_links(symlinks, resolver).items():
+        try:
+            if os.path.isdir(parent):
+                existing = _scan(parent)
+            else:
+                if not dry_run:
+                    os.makedirs(parent)
+                existing = {}
+            dirfd = None if dry_run else os.open(parent, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError as e:
+            for name, destination, source, abs_source in entries:
+                add(ApplyResult(destination, source, CONFLICT, e.strerror))
+            continue
+
+        try:
+            for name, destination, source, abs_source in entries:
+                if copy or destination in copies:
+                    add(_apply_copy(parent, name, destination, source, abs_source, existing, dry_run, resolver, copies))
+                else:
+                    add(_apply_link(parent, name, destination, source, abs_source, existing, dirfd, resolver))
+        finally:
+            if dirfd is not None:
+                os.close(dirfd)
+
+    return results
+
+
+def _apply_link(parent, name, destination, source, abs_source, existing, dirfd, resolver):
+    entry = existing.get(name)
+    if entry is not None:
+        if _links_to(entry, parent, abs_source, dirfd, resolver):
+            return ApplyResult(destination, source, UNCHANGED)
+        return ApplyResult(destination, source, CONFLICT, 'destination exists')
+
+    if not os.path.exists(abs_source):
+        return ApplyResult(destination, source, CONFLICT, 'source does not exist')
+
+    if dirfd is not None:
+        try:
+            os.symlink(abs_source, name, dir_fd=dirfd)
+        except OSError as e:
+            return ApplyResult(destination, source, CONFLICT, e.strerror)
+    return ApplyResult(destination, source, CREATED)
+
+
+def _apply_copy(parent, name, destination, source, abs_source, existing, dry_run, resolver, copies):
+    path = os.path.join(parent, name)
+    entry = existing.get(name)
+    status = CREATED
+    if entry is not None:
+        if not os.path.exists(abs_source):
+            return ApplyResult(destination, source, CONFLICT, 'source does not exist')
+        if entry.is_symlink():
+            if not _links_to(entry, parent, abs_source, None, resolver):
+                return ApplyResult(destination, source, CONFLICT, 'destination exists')
+        elif entry.is_file(follow_symlinks=False):
+            digest = symcopies.digest_of(path)
+            if digest == symcopies.hash_file(abs_source):
+                if not dry_run:
+                    copies[destination] = digest
+                return ApplyResult(destination, source, UNCHANGED)
+            if destination not in copies:
+                return ApplyResult(destination, source, CONFLICT, 'destination exists')
+            if digest != copies[destination]:
+                return ApplyResult(destination, source, CONFLICT, 'destination was modified')
+        else:
+            return ApplyResult(destination, source, CONFLICT, 'destination exists')
+        status = UPDATED
+    elif not os.path.exists(abs_source):
+        return ApplyResult(destination, source, CONFLICT, 'source does not exist')
+
+    if not dry_run:
+        try:
+            copies[destination] = symcopies.copy_file(abs_source, path)
+        except OSError as e:
+            return ApplyResult(destination, source, CONFLICT, e.strerror)
+        except ValueError as e:
+            return ApplyResult(destination, source, CONFLICT, str(e))
+    return ApplyResult(destination, source, status)
+
+
+def summarize(results):
+    """Returns a Counter of how many results there are for each status"""
+    counts = collections.Counter(dict.fromkeys(STATUSES, 0))
+    counts.update(result.status for result in results)
+    return counts
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import errno
+import hashlib
+import marshal
+import os
+import time
+
+
+CACHE_VERSION = 2
+
+# A config modified this recently may be modified again within the same mtime tick without its size changing, such a
+# config is not cached since the cache could not tell the two versions apart.
+RACY_WINDOW_NS = 2 * 10 ** 9
+
+
+def get_cache_dir():
+    """Returns the directory sym keeps its caches in, honouring $XDG_CACHE_HOME"""
+    cachehome = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser(os.environ["HOME"]), '.cache')
+    return os.path.join(cachehome, 'sym')
+
+
+def get_cache_path(symconfig, suffix='config'):
+    """Returns the path of the cache file for a symconfig
+
+    Parameters:
+        symconfig - The real path to the symconfig file
+        suffix    - Distinguishes the different caches kept for the same symconfig
+    """
+    digest = hashlib.sha1(os.path.realpath(symconfig).encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir(), '{}.{}'.format(digest, suffix))
+
+
+def stat_key(st):
+    """Returns the part of a stat result which changes whenever a file is replaced or modified"""
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def load(symconfig, st):
+    """Returns the cached state of a symconfig
+
+    Parameters:
+        symconfig - The real path to the symconfig file
+        st        - The stat result of the symconfig file
+
+    Returns:
+        A tuple of the config state and its format, or None if there is no usable cache
+    """
+    data = load_data(symconfig, 'config')
+    if data is None:
+        return None
+
+    key, state, fmt = data
+    if key != stat_key(st):
+        return None  # Stale cache
+    return state, fmt
+
+
+def store(symconfig, st, state, fmt):
+    """Caches the parsed state of a symconfig
+
+    Parameters:
+        symconfig - The real path to the symconfig file
+        st        - The stat result of the symconfig file when it was read
+        state     - The deserialized config state
+        fmt       - The format the config was stored in
+    """
+    if is_racy(st):
+        return
+    store_data(symconfig, 'config', (stat_key(st), state, fmt))
+
+
+def is_racy(st):
+    """Returns True if a file was modified too recently for its mtime to tell apart further modifications"""
+    return time.time() * 10 ** 9 - st.st_mtime_ns < RACY_WINDOW_NS
+
+
+def load_data(symconfig, suffix):
+    """Returns data kept in the cache for a symconfig
+
+    Parameters:
+        symconfig - The real path to the symconfig file
+        suffix    - The name of the cache to load
+
+    Returns:
+        The cached data, or None if there is no usable cache
+    """
+    try:
+        with open(get_cache_path(symconfig, suffix), 'rb') as stream:
+            version, path, data = marshal.load(stream)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None  # No cache, or the cache is corrupt and will be rebuilt
+
+    if version != CACHE_VERSION or path != os.path.realpath(symconfig):
+        return None
+    return data
+
+
+def store_data(symconfig, suffix, data):
+    """Keeps data in the cache for a symconfig
+
+    The cache is written to a temporary file and renamed into place, so concurrent readers never see a partial cache.
+    Failing to write the cache is not an error, it will simply be rebuilt next time.
+
+    Parameters:
+        symconfig - The real path to the symconfig file
+        suffix    - The name of the cache to store
+        data      - The data to cache, anything marshal can serialize
+    """
+    import tempfile
+
+    cachepath = get_cache_path(symconfig, suffix)
+    try:
+        os.makedirs(os.path.dirname(cachepath), exist_ok=True)
+        fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(cachepath))
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                marshal.dump((CACHE_VERSION, os.path.realpath(symconfig), data), stream)
+            os.replace(tmppath, cachepath)
+        except (OSError, ValueError):
+            os.unlink(tmppath)
+    except OSError:
+        pass
+
+
+def invalidate(symconfig):
+    """Removes the cached state of a symconfig"""
+    try:
+        os.unlink(get_cache_path(symconfig))
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
@@ -24,54 +24,213 @@
 
 
 import argparse
+import os
+import sys
 
-from sym.api import add
-from sym.api import init
-from sym.api import remove
-from sym.api import verify
+# Keep the imports at module level to a minimum, sym.api and PyYAML are only imported by the commands which need them so
+# that e.g. --help starts quickly.
+from sym import instrument
+from sym import output as symoutput
+from sym.constants import CONTINUE
+from sym.constants import DEFAULT_JOBS
+from sym.constants import ENV_SHARDS
+from sym.constants import ENV_TAGS
+from sym.constants import FORMATS
+from sym.constants import POLICIES
+from sym.constants import STORAGES
+from sym.exceptions import ConfigNotFoundError
 from sym.exceptions import FileExistsError
 from sym.exceptions import FileNotFoundError
 
 
+# The statuses of the entries of add and list, see sym.output
+ADDED = 'added'
+FAILED = 'failed'
+ADD_STATUSES = (ADDED, FAILED)
+LISTED = 'listed'
+
+
+def api_call(name):
+    """Returns a function which calls the named sym.api function, importing sym.api only once it is called"""
+    def call(args, **kwargs):
+        from sym import api
+        return getattr(api, name)(args, **kwargs)
+    call.__name__ = name
+    return call
+
+
 def setup_parser_args(parser, subparsers):
     """Setup the main arguement parser"""
     setup_parser_init(subparsers)
     setup_parser_add(subparsers)
     setup_parser_remove(subparsers)
+    setup_parser_list(subparsers)
     setup_parser_verify(subparsers)
+    setup_parser_status(subparsers)
+    setup_parser_apply(subparsers)
+    setup_parser_watch(subparsers)
+    setup_parser_serve(subparsers)
+    setup_parser_migrate(subparsers)
+    setup_parser_split(subparsers)
 
 
 def setup_parser_init(subparsers):
     """Setup the init command parser"""
     parser_init = subparsers.add_parser('init', help='Initialize sym configuration')
     parser_init.add_argument('basedir', help='The base directory where your configuration git repo lives')
-    parser_init.set_defaults(func=init)
+    parser_init.set_defaults(func=api_call('init'))
 
 
 def setup_parser_add(subparsers):
     """Setup the add command parser"""
     parser_add = subparsers.add_parser('add', help='Add dotfile for management')
-    parser_add.add_argument('source')
-    parser_add.add_argument('destination')
-    parser_add.set_defaults(func=add)
+    parser_add.add_argument('source', nargs='?')
+    parser_add.add_argument('destination', nargs='?')
+    parser_add.add_argument('-f', '--from-file', metavar='MANIFEST',
+                            help='Add every source and destination pair listed in MANIFEST, use - to read from stdin')
+    parser_add.add_argument('--atomic', action='store_true',
+                            help='With --from-file, add every dotfile listed or, if any of them fails, none of them')
+    parser_add.add_argument('--fold', action='store_true',
+                            help='Link every file of the source directory into the destination directory, using '
+                                 'directory symlinks wherever the destination holds no other files')
+    parser_add.add_argument('--copy', action='store_true',
+                            help='Copy the source file to the destination instead of symlinking it, for homes in '
+                                 'which symlinks to the source would dangle')
+    parser_add.set_defaults(func=api_call('add'))
 
 
 def setup_parser_remove(subparsers):
     """Setup the remove command parser"""
     parser_remove = subparsers.add_parser('remove', help='Remove dotfile from management')
-    parser_remove.add_argument('symlink')
-    parser_remove.set_defaults(func=remove)
+    parser_remove.add_argument('paths', nargs='+', metavar='path',
+                               help='The symlink to remove, or a source to remove every symlink to')
+    parser_remove.add_argument('-r', '--recursive', action='store_true',
+                               help='Remove every symlink below a directory, or to a source below it')
+    parser_remove.set_defaults(func=api_call('remove'))
+
+
+def setup_parser_list(subparsers):
+    """Setup the list command parser"""
+    parser_list = subparsers.add_parser('list', help='List managed dotfiles')
+    parser_list.add_argument('path', nargs='?', help='Only list dotfiles which are this path or lie below it')
+    parser_list.add_argument('-g', '--glob', dest='pattern', metavar='PATTERN',
+                             help='Only list dotfiles whose path relative to $HOME matches this glob')
+    parser_list.add_argument('-s', '--source', metavar='PATH',
+                             help='Only list dotfiles whose source is this path or lies below it')
+    parser_list.set_defaults(func=api_call('list_links'))
 
 
 def setup_parser_verify(subparsers):
     """Setup the verify command parser"""
     parser_verify = subparsers.add_parser('verify', help='Verify dotfiles')
-    parser_verify.set_defaults(func=verify)
+    parser_verify.add_argument('-j', '--jobs', type=int, default=DEFAULT_JOBS,
+                               help='Number of filesystem checks to run concurrently (default: %(default)s)')
+    mode = parser_verify.add_mutually_exclusive_group()
+    mode.add_argument('--incremental', action='store_true',
+                      help='Only check the dotfiles which changed since they were last verified')
+    mode.add_argument('--full', dest='incremental', action='store_false',
+                      help='Check every dotfile (default)')
+    parser_verify.set_defaults(func=api_call('verify'))
+
+
+def setup_parser_status(subparsers):
+    """Setup the status command parser"""
+    parser_status = subparsers.add_parser('status', help='Show which dotfiles changed')
+    parser_status.add_argument('--content', action='store_true',
+                               help='Also show the dotfiles whose source changed content since the last snapshot')
+    parser_status.add_argument('--snapshot', action='store_true',
+                               help='Record the current content of the sources as the snapshot, implies --content')
+    parser_status.add_argument('-j', '--jobs', type=int, default=DEFAULT_JOBS,
+                               help='Number of files to check and hash concurrently (default: %(default)s)')
+    parser_status.set_defaults(func=api_call('status'))
+
+
+def setup_parser_apply(subparsers):
+    """Setup the apply command parser"""
+    parser_apply = subparsers.add_parser('apply', help='Create every dotfile in the sym configuration')
+    parser_apply.add_argument('-n', '--dry-run', action='store_true',
+                              help='Only report what would be done, without creating anything')
+    parser_apply.add_argument('--copy', action='store_true',
+                              help='Copy every source to its destination instead of symlinking it, replacing the '
+                                   'symlinks already there')
+    parser_apply.add_argument('--homes', nargs='+', metavar='HOME',
+                              help='Apply the configuration of every one of these home directories instead of $HOME, '
+                                   'given as paths, globs or comma separated lists')
+    parser_apply.add_argument('-j', '--jobs', type=int,
+                              help='Number of homes to apply at once with --homes (default: the number of CPUs)')
+    parser_apply.add_argument('--on-error', choices=POLICIES, default=CONTINUE,
+                              help='Whether to apply the remaining homes once a home failed with --homes '
+                                   '(default: %(default)s)')
+    parser_apply.set_defaults(func=api_call('apply'))
+
+
+def setup_parser_watch(subparsers):
+    """Setup the watch command parser"""
+    parser_watch = subparsers.add_parser('watch', help='Watch dotfiles and report them as soon as they change')
+    parser_watch.add_argument('--repair', action='store_true', help='Recreate dotfiles which went missing')
+    parser_watch.add_argument('--debounce', type=float, default=0.2, metavar='SECONDS',
+                              help='Wait for the filesystem to be quiet this long before checking (default: '
+                                   '%(default)s)')
+    parser_watch.set_defaults(func=api_call('watch'))
+
+
+def setup_parser_serve(subparsers):
+    """Setup the serve command parser"""
+    subparsers.add_parser('serve', help='Keep the sym configuration in memory and answer commands over a Unix socket, '
+                                        'other sym commands use it while it runs')
+
+
+def setup_parser_migrate(subparsers):
+    """Setup the migrate command parser"""
+    parser_migrate = subparsers.add_parser('migrate', help='Convert the sym configuration to another file format')
+    parser_migrate.add_argument('format', nargs='?', choices=FORMATS,
+                                help='The file format to store the configuration in')
+    parser_migrate.add_argument('--storage', choices=STORAGES,
+                                help='Rewrite the whole configuration on every change (file) or append changes to a '
+                                     'journal (journal)')
+    parser_migrate.set_defaults(func=api_call('migrate'))
+
+
+def setup_parser_split(subparsers):
+    """Setup the split command parser"""
+    parser_split = subparsers.add_parser('split', help='Split the sym configuration into shards, one file each')
+    parser_split.add_argument('rules', nargs='*', type=parse_split_rule, metavar='SHARD=GLOB',
+                              help='Put the dotfiles whose path relative to $HOME matches GLOB into SHARD, the first '
+                                   'matching rule wins')
+    parser_split.add_argument('--default', default='common', metavar='SHARD',
+                              help='The shard for the dotfiles no rule matches, and for new dotfiles (default: common)')
+    parser_split.set_defaults(func=api_call('split'))
+
+
+def parse_split_rule(rule):
+    """Parses a SHARD=GLOB split rule into a (shard, glob) tuple"""
+    name, sep, pattern = rule.partition('=')
+    if not sep or not name or not pattern:
+        raise argparse.ArgumentTypeError('expected SHARD=GLOB, got {}'.format(rule))
+    return name, pattern
 
 
 def setup_parser():
     """Initialize the Argument Parser"""
     parser = argparse.ArgumentParser(description='Sym, dotfiles and configuration management tool')
+    parser.add_argument('--profile', action='store_true',
+                        help='Report where the time went, can also be enabled by setting ${} to the profile '
+                             'format'.format(instrument.ENV_FORMAT))
+    parser.add_argument('--profile-format', choices=instrument.FORMATS,
+                        help='Report the profile as a table (default), JSON or a Prometheus textfile')
+    parser.add_argument('--profile-output', metavar='FILE',
+                        help='Write the profile to FILE instead of stderr, can also be set with ${}'.format(
+                            instrument.ENV_OUTPUT))
+    parser.add_argument('--format', dest='output', choices=symoutput.FORMATS, default=symoutput.TEXT,
+                        help='Print text (default) or stream one JSON record per processed entry followed by a summary '
+                             'record (ndjson), for add, remove, list, verify, status and apply')
+    parser.add_argument('--lock', action='store_true',
+                        help='Hold the configuration lock for the whole command, rather than merging the changes of '
+                             'concurrent commands when saving')
+    parser.add_argument('--shard', action='append', metavar='NAME',
+                        help='Use this shard of a sharded configuration instead of the ones selected for this host, '
+                             'new dotfiles are added to the first one given (can also be set with ${})'.format(
+                                 ENV_SHARDS))
     subparsers = parser.add_subparsers(dest='apicall', help='Command List')
     setup_parser_args(parser, subparsers)
     return parser
@@ -80,6 +239,84 @@ def setup_parser():
 def parse_args(parser, parse_args=None):
     args = parser.parse_args(parse_args)
 
+    profile = os.environ.get(instrument.ENV_FORMAT)
+    profiling = args.profile or args.profile_format or profile
+    if args.apicall != 'serve':
+        # The server buffers the output of a command, NDJSON runs in process so that it streams. The server loaded the
+        # shards selected for its own environment, a command selecting others runs in process too.
+        selects_shards = args.shard or os.environ.get(ENV_SHARDS) or os.environ.get(ENV_TAGS)
+        local = profiling or args.lock or selects_shards or args.output == symoutput.NDJSON
+        served = run_in_server(args, sys.argv[1:] if parse_args is None else parse_args, local=local)
+        if served is not None:
+            return served
+
+    if args.shard:
+        # Read wherever the config is loaded, see sym.shards.get_selection
+        os.environ[ENV_SHARDS] = ','.join(args.shard)
+    if not args.lock:
+        return run_profiled(parser, args)
+
+    from sym.lock import lock
+    from sym.paths import get_user_home
+
+    with lock(os.path.join(get_user_home(), '.symconfig')):
+        return run_profiled(parser, args)
+
+
+def run_profiled(parser, args):
+    """Runs the command, reporting where the time went if profiling is enabled"""
+    profile = os.environ.get(instrument.ENV_FORMAT)
+    if not (args.profile or args.profile_format or profile):
+        return run_command(parser, args)
+
+    profile_format = args.profile_format or (profile if profile in instrument.FORMATS else instrument.TABLE)
+    instrument.enable()
+    try:
+        return run_command(parser, args)
+    finally:
+        instrument.disable()
+        instrument.report(profile_format, args.profile_output or os.environ.get(instrument.ENV_OUTPUT), args.apicall)
+        instrument.reset()
+
+
+def run_in_server(args, argv, local=False):
+    """Runs a command in the sym server (see sym.server) if one is running
+
+    Commands the server does not answer, or which have to run locally, run in process once the server wrote the
+    changes it batched.
+
+    Returns:
+        The exit code of the command if the server ran it, otherwise None
+    """
+    from sym import server
+
+    remote = args.apicall in server.SERVED_COMMANDS and not local and not getattr(args, 'from_file', None) == '-'
+    if not remote:
+        server.request({'command': 'flush'})
+        return None
+
+    result = server.run_remote(argv)
+    if result is None:
+        return None
+    code, output = result
+    sys.stdout.write(output)
+    return code
+
+
+def run_command(parser, args):
+    """Runs the command selected by the parsed arguments
+
+    Returns:
+        The exit code of the command, None for success
+    """
+    try:
+        return _run_command(parser, args)
+    except ConfigNotFoundError as e:
+        symoutput.Output(args.output, args.apicall).error(e)
+        return 1
+
+
+def _run_command(parser, args):
     if args.apicall == 'init':
         try:
             args.func(args)
@@ -89,15 +326,187 @@ def parse_args(parser, parse_args=None):
             print(e)
 
     elif args.apicall == 'add':
+        if args.from_file:
+            if args.fold or args.copy:
+                parser.error('add --fold and --copy do not support --from-file')
+            return parse_add_many(args)
+        if args.fold and args.copy:
+            parser.error('add --fold and --copy can not be combined')
+        if args.source is None or args.destination is None:
+            parser.error('add requires a source and a destination, or --from-file')
+
+        output = symoutput.Output(args.output, args.apicall)
         try:
-            args.func(args)
-        except FileExistsError as e:
-            print(e)
-        except FileNotFoundError as e:
-            print(e)
+            link = args.func(args)
+        except (FileExistsError, FileNotFoundError, ValueError) as e:
+            output.error(e, source=args.source, destination=args.destination)
+            output.summary({ADDED: 0, FAILED: 1}, ADD_STATUSES, text=False)
+            return 1
+        output.entry(None, source=link.save_source, destination=link.save_destination, status=ADDED)
+        output.summary({ADDED: 1, FAILED: 0}, ADD_STATUSES, text=False)
 
     elif args.apicall == 'remove':
-        pass
+        from sym import remove as symremove
+
+        output = symoutput.Output(args.output, args.apicall)
+        try:
+            results = args.func(args)
+        except FileNotFoundError as e:
+            output.error(e)
+            output.summary(symremove.summarize([]), symremove.STATUSES, text=False)
+            return 1
+        for result in results:
+            output.result(result)
+
+        counts = symremove.summarize(results)
+        output.summary(counts, symremove.STATUSES)
+        return 1 if counts[symremove.CONFLICT] else 0
+
+    elif args.apicall == 'list':
+        output = symoutput.Output(args.output, args.apicall)
+        count = 0
+        for destination, source in args.func(args):
+            output.entry('{} -> {}'.format(destination, source), destination=destination, source=source)
+            count += 1
+        output.summary({LISTED: count}, (LISTED,), text=False)
 
     elif args.apicall == 'verify':
-        pass
+        from sym.verify import OK
+        from sym.verify import SKIPPED
+        from sym.verify import STATUSES
+        from sym.verify import summarize
+
+        output = symoutput.Output(args.output, args.apicall)
+        results = args.func(args, report=output.result)
+
+        counts = summarize(results)
+        output.summary(counts, STATUSES + (SKIPPED,))
+        return 1 if len(results) != counts[OK] else 0
+
+    elif args.apicall == 'status':
+        from sym import status as symstatus
+        from sym.verify import OK
+
+        output = symoutput.Output(args.output, args.apicall)
+        results = args.func(args)
+        for result in results:
+            output.result(result, visible=result.status != OK)
+
+        counts = symstatus.summarize(results)
+        output.summary(counts, symstatus.STATUSES, note='snapshot recorded' if args.snapshot else None)
+        return 1 if len(results) != counts[OK] else 0
+
+    elif args.apicall == 'apply':
+        if args.homes:
+            return apply_homes(args)
+
+        from sym import apply as symapply
+
+        output = symoutput.Output(args.output, args.apicall)
+
+        def report(result):
+            output.result(result, visible=result.status != symapply.UNCHANGED)
+
+        counts = symapply.summarize(args.func(args, report=report))
+        output.summary(counts, symapply.STATUSES, note='dry run' if args.dry_run else None)
+        return 1 if counts[symapply.CONFLICT] else 0
+
+    elif args.apicall == 'watch':
+        def report(results):
+            for result in results:
+                print(result)
+            sys.stdout.flush()
+
+        try:
+            args.func(args).run(report)
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(e)
+            return 1
+
+    elif args.apicall == 'serve':
+        from sym.server import Server
+
+        server = Server()
+        try:
+            server.start()
+        except OSError as e:
+            print(e)
+            return 1
+        server.serve_forever()
+
+    elif args.apicall == 'split':
+        try:
+            shards = args.func(args)
+        except (FileExistsError, ValueError) as e:
+            print(e)
+            return 1
+        for name, count in shards.items():
+            print('{}: {} symlinks'.format(name, count))
+
+    elif args.apicall == 'migrate':
+        args.func(args)
+
+
+def apply_homes(args):
+    """Runs apply for many home directories, printing the outcome of every home
+
+    Returns:
+        0 if every home was applied without conflicts, otherwise 1
+    """
+    from sym import apply as symapply
+    from sym import fleet
+
+    output = symoutput.Output(args.output, args.apicall)
+    homes = fleet.expand_homes(args.homes)
+    if not homes:
+        output.error('No home directories match {}'.format(' '.join(args.homes)))
+        return 1
+
+    def report(result):
+        text = '\n'.join([str(result)] + ['    {}'.format(conflict) for conflict in result.conflicts])
+        fields = {'home': result.home, 'status': result.status}
+        if result.status in (fleet.OK, fleet.CONFLICT):
+            fields['counts'] = dict((status, result.counts[status]) for status in symapply.STATUSES)
+        if result.reason:
+            fields['reason'] = result.reason
+        output.entry(text, **fields)
+
+    counts = fleet.summarize(fleet.apply_homes(homes, args.dry_run, args.jobs, args.on_error, report,
+                                                 args.copy))
+    output.summary(counts, fleet.STATUSES, note='dry run' if args.dry_run else None)
+    return 0 if counts[fleet.OK] == len(homes) else 1
+
+
+def parse_add_many(args):
+    """Runs a batch add from a manifest file, printing every entry that failed
+
+    Returns:
+        0 if every entry was added, otherwise 1
+    """
+    from sym.api import add_many
+    from sym.api import read_manifest
+
+    output = symoutput.Output(args.output, args.apicall)
+    counts = {ADDED: 0, FAILED: 0}
+
+    def report(entry, error):
+        fields = dict(zip(('source', 'destination'), entry)) if len(entry) == 2 else {}
+        if error is None:
+            output.entry(None, status=ADDED, **fields)
+            counts[ADDED] += 1
+        else:
+            output.error(error, **fields)
+            counts[FAILED] += 1
+
+    if args.from_file == '-':
+        failures = add_many(read_manifest(sys.stdin), args.atomic, report)
+    else:
+        with open(args.from_file, 'r') as stream:
+            failures = add_many(read_manifest(stream), args.atomic, report)
+
+    if failures and args.atomic and args.output == symoutput.TEXT:
+        print('Nothing was added')
+    output.summary(counts, ADD_STATUSES, text=False)
+    return 1 if failures else 0
@@ -22,19 +22,684 @@
 #  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 #  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import array
+import bisect
+import collections.abc
+import errno
 import os
-import yaml
+import sys
 
+from sym import cache
+from sym import instrument
+from sym import journal
+from sym import serializers
+from sym.constants import FILE
+from sym.constants import JOURNAL
+from sym.constants import STORAGES  # noqa: F401
+from sym.exceptions import ConfigNotFoundError
+from sym.lock import lock
+from sym.paths import get_user_home
 
-class ConfigYAML(yaml.YAMLObject):
-    yaml_tag = u'!SymConfig'
 
-    def __init__(self):
-        self.symlinks = {}
+# Configs with at least this many links keep them in a CompactLinkTable, see new_link_table()
+COMPACT_LINKS = 100000
+
+
+class _LinkQueries(object):
+    """The prefix lookups of the link tables, built on the _keys() and _referrers() of a table, and their preimages"""
+
+    __slots__ = ()
+
+    def _remember(self, destination):
+        """Records the source of a destination before its first change, if preimages are being recorded"""
+        if self.preimages is not None and destination not in self.preimages:
+            self.preimages[destination] = self.get(destination)
+
+    def destinations_of(self, source):
+        """Returns the sorted destinations which link to a source, both as stored in the config"""
+        return sorted(self._referrers(source))
+
+    def within(self, directory):
+        """Returns the sorted destinations which lie below a directory, or whose source does
+
+        Parameters:
+            directory - The directory as stored in the config, i.e. relative to $HOME or absolute (see PathResolver.key)
+
+        Returns:
+            A list of destinations as stored in the config
+        """
+        found = set(self.below(directory))
+        for source in self.below(directory, sources=True):
+            found.update(self._referrers(source))
+        return sorted(found)
+
+    def below(self, directory, sources=False):
+        """Yields the sorted destinations, or sources, which are a directory or lie below it
+
+        Parameters:
+            directory - The directory as stored in the config, see within()
+            sources   - Whether to yield sources rather than destinations
+        """
+        ordered = self._ordered(sources)
+        if directory == os.curdir:  # $HOME itself, every relative path lies below it
+            for key in ordered:
+                if not os.path.isabs(key):
+                    yield key
+            return
+
+        directory = directory.rstrip(os.sep)
+        index = bisect.bisect_left(ordered, directory)
+        if index < len(ordered) and ordered[index] == directory:
+            yield directory
+        for key in self.starting_with(directory + os.sep, sources):
+            yield key
+
+    def starting_with(self, prefix, sources=False):
+        """Yields the sorted destinations, or sources, which start with a string prefix, found by bisecting"""
+        ordered = self._ordered(sources)
+        index = bisect.bisect_left(ordered, prefix)
+        while index < len(ordered) and ordered[index].startswith(prefix):
+            yield ordered[index]
+            index += 1
+
+    def _ordered(self, sources):
+        name = 'sources' if sources else 'destinations'
+        if name not in self._sorted:
+            self._sorted[name] = sorted(self._keys(sources))
+        return self._sorted[name]
+
+
+class LinkTable(_LinkQueries, dict):
+    """A dict of destination to source paths which records every change made to it
+
+    The changes are kept as a list of (destination, source) tuples, with a source of None for a removed destination, so
+    that a journaled config can save just the changes instead of rewriting the whole file.
+
+    A reverse index from every source to the destinations linking to it is kept up to date alongside, so that the links
+    to a source, or to anything below a directory, can be found without scanning the whole table.
+
+    While preimages is a dict rather than None, the source every changed destination had before its first change is
+    recorded in it, None for a destination which was not in the table, so that the changes can be undone (see
+    sym.transaction).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(LinkTable, self).__init__(*args, **kwargs)
+        self.changes = []
+        self.preimages = None
+        self._sources = {}
+        self._sorted = {}  # lazily sorted destinations and sources for prefix lookups, dropped on every change
+        for destination, source in self.items():
+            self._index(destination, source)
+
+    def _index(self, destination, source):
+        self._sources.setdefault(source, set()).add(destination)
+        self._sorted.clear()
+
+    def _unindex(self, destination, source):
+        destinations = self._sources[source]
+        destinations.discard(destination)
+        if not destinations:
+            del self._sources[source]
+        self._sorted.clear()
+
+    def _keys(self, sources):
+        return self._sources if sources else self
+
+    def _referrers(self, source):
+        return self._sources.get(source, ())
+
+    def __setitem__(self, destination, source):
+        self._remember(destination)
+        if destination in self:
+            self._unindex(destination, self[destination])
+        super(LinkTable, self).__setitem__(destination, source)
+        self._index(destination, source)
+        self.changes.append((destination, source))
+
+    def __delitem__(self, destination):
+        source = self[destination]
+        self._remember(destination)
+        super(LinkTable, self).__delitem__(destination)
+        self._unindex(destination, source)
+        self.changes.append((destination, None))
+
+    def pop(self, destination, *default):
+        if destination in self:
+            self._remember(destination)
+            self._unindex(destination, self[destination])
+            self.changes.append((destination, None))
+        return super(LinkTable, self).pop(destination, *default)
+
+    def popitem(self):
+        destination, source = super(LinkTable, self).popitem()
+        if self.preimages is not None:
+            self.preimages.setdefault(destination, source)
+        self._unindex(destination, source)
+        self.changes.append((destination, None))
+        return destination, source
+
+    def setdefault(self, destination, source=None):
+        if destination not in self:
+            self[destination] = source
+        return self[destination]
+
+    def update(self, *args, **kwargs):
+        for destination, source in dict(*args, **kwargs).items():
+            self[destination] = source
+
+    def clear(self):
+        for destination in self:
+            self._remember(destination)
+        self.changes.extend((destination, None) for destination in self)
+        super(LinkTable, self).clear()
+        self._sources.clear()
+        self._sorted.clear()
+
+
+class CompactLinkTable(_LinkQueries, collections.abc.MutableMapping):
+    """A LinkTable for configs managing a great many links, which stores paths as trees of interned components
+
+    Destinations and sources are nodes of one tree of path components, node n being the component _names[n] below
+    the node _parents[n], node 0 being the empty path. A directory shared by thousands of paths is stored once, and
+    the components are interned so that a destination and its source share their file name.
+
+    The links are array columns indexed by node: _targets holds the source node of a destination node, or -1 for a node
+    which is not a destination. The reverse index threads the destinations of a source node through _first and _next.
+
+    A node is never freed, a path that is no longer used keeps its node until the table is built again, as every load
+    of the config does. Destinations are iterated in the order their paths were first seen rather than the order they
+    were last changed in. Changes and preimages are recorded like those of a LinkTable.
+    """
+
+    __slots__ = ('changes', 'preimages', '_parents', '_names', '_children', '_targets', '_first', '_next', '_count',
+                 '_sorted')
+
+    def __init__(self, links=()):
+        self.changes = []
+        self.preimages = None
+        self._reset()
+        directories = {}
+        for destination, source in (links.items() if hasattr(links, 'items') else links):
+            self._link(self._node(destination, directories), self._node(source, directories))
+
+    def _reset(self):
+        self._parents = array.array('i', [-1])
+        self._names = ['']
+        self._children = {}  # node to a dict of component to child node, only for nodes which have children
+        self._targets = array.array('i', [-1])
+        self._first = array.array('i', [-1])
+        self._next = array.array('i', [-1])
+        self._count = 0
+        self._sorted = {}  # lazily sorted destinations and sources for prefix lookups, dropped on every change
+
+    def _node(self, path, directories=None):
+        """Returns the node of a path, adding the nodes it lacks
+
+        Parameters:
+            path        - The path
+            directories - A dict of directory path to node, to skip walking the directories of paths added in bulk
+        """
+        directory, sep, name = path.rpartition(os.sep)
+        if not sep:
+            parent = 0
+        elif directories is None:
+            parent = self._node(directory)
+        else:
+            parent = directories.get(directory)
+            if parent is None:
+                parent = directories[directory] = self._node(directory)
+
+        children = self._children.get(parent)
+        if children is None:
+            children = self._children[parent] = {}
+        node = children.get(name)
+        if node is None:
+            name = sys.intern(name)
+            node = children[name] = len(self._names)
+            self._parents.append(parent)
+            self._names.append(name)
+            self._targets.append(-1)
+            self._first.append(-1)
+            self._next.append(-1)
+        return node
+
+    def _find(self, path):
+        """Returns the node of a path, or -1 if it has none"""
+        node = 0
+        for name in path.split(os.sep):
+            children = self._children.get(node)
+            if children is None:
+                return -1
+            node = children.get(name, -1)
+            if node < 0:
+                return -1
+        return node
+
+    def _path(self, node):
+        names = []
+        while node:
+            names.append(self._names[node])
+            node = self._parents[node]
+        return os.sep.join(reversed(names))
+
+    def _paths(self, nodes):
+        """Yields the paths of nodes, joining the path of every parent directory only once"""
+        parents, names = self._parents, self._names
+        prefixes = {0: ''}  # directory node to its path with a trailing separator
+        for node in nodes:
+            parent = parents[node]
+            prefix = prefixes.get(parent)
+            if prefix is None:
+                prefix = prefixes[parent] = self._path(parent) + os.sep
+            yield prefix + names[node]
+
+    def _link(self, destination, source):
+        previous = self._targets[destination]
+        if previous == source:
+            return
+        if previous < 0:
+            self._count += 1
+        else:
+            self._unthread(destination, previous)
+        self._targets[destination] = source
+        self._next[destination] = self._first[source]
+        self._first[source] = destination
+        self._sorted.clear()
+
+    def _unlink(self, destination):
+        self._unthread(destination, self._targets[destination])
+        self._targets[destination] = -1
+        self._count -= 1
+        self._sorted.clear()
+
+    def _unthread(self, destination, source):
+        """Removes a destination node from the reverse index of its source node"""
+        node = self._first[source]
+        if node == destination:
+            self._first[source] = self._next[destination]
+        else:
+            while self._next[node] != destination:
+                node = self._next[node]
+            self._next[node] = self._next[destination]
+        self._next[destination] = -1
+
+    def _linked(self, destination):
+        """Returns the node of a destination in the table, raising KeyError if it is not"""
+        node = self._find(destination)
+        if node < 0 or self._targets[node] < 0:
+            raise KeyError(destination)
+        return node
+
+    def _keys(self, sources):
+        if sources:
+            return self._paths(node for node, first in enumerate(self._first) if first >= 0)
+        return iter(self)
+
+    def _referrers(self, source):
+        node = self._find(source)
+        destination = self._first[node] if node >= 0 else -1
+        while destination >= 0:
+            yield self._path(destination)
+            destination = self._next[destination]
+
+    def _items(self):
+        destinations = [node for node, source in enumerate(self._targets) if source >= 0]
+        return zip(self._paths(destinations), self._paths(self._targets[node] for node in destinations))
+
+    def __getitem__(self, destination):
+        return self._path(self._targets[self._linked(destination)])
+
+    def __setitem__(self, destination, source):
+        self._remember(destination)
+        self._link(self._node(destination), self._node(source))
+        self.changes.append((destination, source))
+
+    def __delitem__(self, destination):
+        node = self._linked(destination)
+        self._remember(destination)
+        self._unlink(node)
+        self.changes.append((destination, None))
+
+    def __contains__(self, destination):
+        node = self._find(destination)
+        return node >= 0 and self._targets[node] >= 0
+
+    def __iter__(self):
+        return self._paths(node for node, source in enumerate(self._targets) if source >= 0)
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(self.items()))
+
+    def items(self):
+        return _CompactItems(self)
+
+    def values(self):
+        return _CompactValues(self)
+
+    def clear(self):
+        for destination in self:
+            self._remember(destination)
+        self.changes.extend((destination, None) for destination in self)
+        self._reset()
+
+
+class _CompactItems(collections.abc.ItemsView):
+    """The items of a CompactLinkTable, iterated without looking every destination up again"""
+
+    __slots__ = ()
+
+    def __iter__(self):
+        return self._mapping._items()
+
+
+class _CompactValues(collections.abc.ValuesView):
+    """The sources of a CompactLinkTable, iterated without looking every destination up again"""
+
+    __slots__ = ()
+
+    def __iter__(self):
+        return (source for _, source in self._mapping._items())
+
+
+def new_link_table(links=()):
+    """Returns a LinkTable of a mapping of destination to source paths, a CompactLinkTable if it is very large
+
+    Parameters:
+        links - A mapping of destination to source paths
+
+    Returns:
+        A LinkTable, or a CompactLinkTable if there are at least COMPACT_LINKS links
+    """
+    if len(links) >= COMPACT_LINKS:
+        return CompactLinkTable(links)
+    return LinkTable(links)
+
+
+class ConfigYAML(object):
+    """The sym configuration, a database of the symlinks under management
+
+    The config is stored in the format it was loaded from, see sym.serializers for the supported formats.
+
+    With the default FILE storage every save rewrites the whole config. With JOURNAL storage a save only appends the
+    changes made to symlinks to a journal next to the config, the journal is replayed on top of the config when it is
+    loaded and compacted into a new config once it grows past journal.COMPACT_BYTES.
+
+    The symlinks are a LinkTable, or a CompactLinkTable once there are COMPACT_LINKS of them, see new_link_table().
+
+    Directory trees linked with folding are recorded in folds, a dict of the source to the destination directory of
+    every tree, see sym.fold. The symlinks of a tree are entries of symlinks like any other.
+
+    Entries materialized as copies rather than symlinks are recorded in copies, a dict of the destination to the digest
+    of the content last copied there, see sym.copies.
+
+    Writes hold the lock of the config (see sym.lock). If another process wrote the config since it was loaded, the
+    config is read again and the changes made since are merged on top of it, so that concurrent writers do not lose
+    each other's updates. A symlink changed by both is resolved in favour of the last writer.
+
+    Attributes:
+        path     - The real path of the file the config is read from and written to, None for the .symconfig of the home
+                   directory of the user
+        disk_key - The stat keys of the config file and its journal when the config was last read or written, see
+                   get_disk_key()
+    """
+
+    def __init__(self, fmt=serializers.YAML, storage=FILE):
+        self.symlinks = LinkTable()
+        self.folds = {}
+        self.copies = {}
+        self.format = fmt
+        self.storage = storage
+        self._saved_settings = None  # (format, storage, folds, copies) of the config on disk, None if never saved
+        self.deferred = False  # Saves only mark the config dirty, see keep_resident()
+        self.dirty = False
+        self.path = None
+        self.disk_key = None
+
+    def __getstate__(self):
+        state = {'symlinks': dict(self.symlinks.items())}
+        if self.folds:
+            state['folds'] = dict(self.folds)
+        if self.copies:
+            state['copies'] = dict(self.copies)
+        if self.storage != FILE:
+            state['storage'] = self.storage
+        return state
+
+    def __setstate__(self, state):
+        self.symlinks = new_link_table(state.get('symlinks') or {})
+        self.folds = dict(state.get('folds') or {})
+        self.copies = dict(state.get('copies') or {})
+        self.storage = state.get('storage', FILE)
+
+    @classmethod
+    def from_state(cls, state, fmt=serializers.YAML):
+        """Builds a config from its deserialized state"""
+        config = cls(fmt)
+        config.__setstate__(state)
+        config._saved_settings = config._settings()
+        return config
 
     def save(self):
-        userhome = os.environ["HOME"]
-        symconfig = os.path.abspath(os.path.join(userhome, '.symconfig'))
-        stream = open(symconfig, 'w')
-        yaml.dump(self, stream)
-        stream.close()
+        """Writes the config, unless saves are deferred in which case the config is only marked dirty"""
+        if self.deferred:
+            self.dirty = True
+            return
+        self.write()
+
+    def flush(self):
+        """Writes the config if a deferred save left it dirty"""
+        if self.dirty:
+            self.write()
+
+    def is_modified(self):
+        """Returns True if the config was changed since it was read or written"""
+        return bool(self.symlinks.changes) or self._saved_settings != self._settings()
+
+    def changed_on_disk(self):
+        """Returns True if something else wrote the config since it was read or written"""
+        return get_disk_key(self.get_path()) != self.disk_key
+
+    def get_path(self):
+        """Returns the real path of the file the config is written to"""
+        if self.path is not None:
+            return self.path
+        return os.path.realpath(os.path.join(get_user_home(), '.symconfig'))
+
+    @instrument.timed('config.save')
+    def write(self):
+        self.dirty = False
+        symconfig = self.get_path()
+
+        with lock(symconfig):
+            if self.disk_key is not None and get_disk_key(symconfig) != self.disk_key:
+                with instrument.span('config.merge'):
+                    self._merge(symconfig)
+            self._write(symconfig)
+            self.disk_key = get_disk_key(symconfig)
+
+    def _write(self, symconfig):
+        journaled = self.storage == JOURNAL and self._saved_settings == self._settings()
+        if journaled and os.path.exists(symconfig):
+            if not self.symlinks.changes:
+                return
+            size = journal.append(symconfig, self.symlinks.changes)
+            del self.symlinks.changes[:]
+            if size < journal.COMPACT_BYTES:
+                return
+
+        cache.invalidate(symconfig)
+        write_file_atomic(symconfig, lambda stream: serializers.dump(self.__getstate__(), stream, self.format))
+        journal.remove(symconfig)
+        del self.symlinks.changes[:]
+        self._saved_settings = self._settings()
+
+    def _merge(self, symconfig):
+        """Replaces the config by the one on disk with the changes made since it was loaded applied on top"""
+        theirs = _read_config(symconfig)
+        symlinks = theirs.symlinks
+        for destination, source in self.symlinks.changes:
+            if source is None:
+                symlinks.pop(destination, None)
+            else:
+                symlinks[destination] = source
+        symlinks.changes = self.symlinks.changes
+
+        saved_format, saved_storage, saved_folds, saved_copies = self._saved_settings
+        self.symlinks = symlinks
+        self.folds = _merge_dict(theirs.folds, saved_folds, self.folds)
+        self.copies = _merge_dict(theirs.copies, saved_copies, self.copies)
+        if self.format == saved_format:
+            self.format = theirs.format
+        if self.storage == saved_storage:
+            self.storage = theirs.storage
+        self._saved_settings = theirs._saved_settings
+
+    def _settings(self):
+        """Returns what a journal cannot record, a change to any of it rewrites the whole config"""
+        return self.format, self.storage, dict(self.folds), dict(self.copies)
+
+
+def _merge_dict(theirs, saved, ours):
+    """Returns theirs with the keys changed from saved to ours applied on top"""
+    merged = dict(theirs)
+    for key in set(saved) - set(ours):
+        merged.pop(key, None)
+    merged.update((key, value) for key, value in ours.items() if saved.get(key) != value)
+    return merged
+
+
+# Configs kept in memory by a long running process, by real path (see sym.server)
+_resident = {}
+
+
+def keep_resident(symconfig, config):
+    """Keeps a config in memory for the rest of the process
+
+    load_config returns the resident config instead of reading the file, and saves of the config are deferred until
+    ConfigYAML.flush() is called so that many changes can be written at once.
+    """
+    config.deferred = True
+    _resident[os.path.realpath(symconfig)] = config
+
+
+def release_resident(symconfig):
+    """Stops keeping a config in memory, writing it first if it is dirty"""
+    config = _resident.pop(os.path.realpath(symconfig), None)
+    if config is not None:
+        config.deferred = False
+        config.flush()
+
+
+def write_file_atomic(path, write):
+    """Replaces a file without ever leaving it partially written
+
+    The new contents are written to a temporary file in the same directory, synced to disk and renamed over the
+    original file. The original file's permissions are kept.
+
+    Parameters:
+        path  - The path of the file to replace
+        write - A function which writes the new contents to the stream it is passed
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+        mode = 0o666 & ~_get_umask()
+
+    import tempfile
+
+    fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'w') as stream:
+            os.fchmod(fd, mode)
+            write(stream)
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(tmppath, path)
+    except BaseException:
+        os.unlink(tmppath)
+        raise
+
+
+def _get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def get_disk_key(symconfig):
+    """Returns the stat keys (see sym.cache.stat_key) of a symconfig and its journal, None for a file that is missing
+
+    The key changes whenever another process writes the config.
+    """
+    keys = []
+    for path in (symconfig, journal.get_journal_path(symconfig)):
+        try:
+            keys.append(cache.stat_key(os.stat(path)))
+        except OSError:
+            keys.append(None)
+    return tuple(keys)
+
+
+@instrument.timed('config.load')
+def load_config(symconfig):
+    """Returns the symconfig object (ConfigYAML)
+
+    The parsed config is cached (see sym.cache) and the cache is used instead of parsing the file again for as long as
+    the file's inode, size and modification time are unchanged. The journal of a journaled config is replayed on top.
+    A symconfig which is a directory holds shards, only the shards selected for this host are read (see sym.shards).
+
+    Parameters:
+        symconfig - The path to symconfig file
+
+    Returns:
+        Object containing symconfig (ConfigYAML)
+    """
+    if _resident:
+        config = _resident.get(os.path.realpath(symconfig))
+        if config is not None:
+            return config
+    try:
+        return _read_config(symconfig)
+    except IsADirectoryError:
+        from sym.shards import load_sharded  # sym.shards builds on this module
+
+        return load_sharded(symconfig)
+
+
+def _read_config(symconfig):
+    # Taken before reading, a write in between makes the config look changed on disk rather than hiding the write
+    disk_key = get_disk_key(symconfig)
+    if disk_key[0] is None:
+        raise ConfigNotFoundError(errno.ENOENT, 'No sym configuration, run sym init first', symconfig)
+    if disk_key[1] is None:
+        # Saves replace the file by an atomic rename, reading it needs no lock
+        config = _read_snapshot(symconfig)
+    else:
+        # The shared lock keeps a writer from compacting the journal between reading the snapshot and the journal
+        with lock(symconfig, shared=True):
+            config = _read_snapshot(symconfig)
+            with instrument.span('config.journal_replay'):
+                journal.replay(symconfig, config.symlinks)
+    config.path = os.path.realpath(symconfig)
+    config.disk_key = disk_key
+    del config.symlinks.changes[:]
+    return config
+
+
+def _read_snapshot(symconfig):
+    with open(symconfig, 'r') as stream:
+        st = os.fstat(stream.fileno())
+        with instrument.span('config.cache_load'):
+            cached = cache.load(symconfig, st)
+        if cached is None:
+            with instrument.span('config.parse'):
+                state, fmt = serializers.loads(stream.read())
+            with instrument.span('config.cache_store'):
+                cache.store(symconfig, st, state, fmt)
+        else:
+            state, fmt = cached
+    return ConfigYAML.from_state(state, fmt)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Constants the command line needs to build its parser, kept free of imports so that e.g. --help starts quickly
+
+The modules they belong to import them from here, see sym.config, sym.serializers, sym.fleet, sym.shards and
+sym.verify.
+
+The same goes for the rest of sym, as every command is a new process which pays for all it imports: a module only some
+code paths need (e.g. tempfile when writing, concurrent.futures when checking entries in parallel) is imported in the
+functions which use it rather than at the top of the module.
+"""
+
+# The storage modes of a config, see sym.config.ConfigYAML
+FILE = 'file'
+JOURNAL = 'journal'
+STORAGES = (FILE, JOURNAL)
+
+# The file formats of a config, see sym.serializers
+YAML = 'yaml'
+JSON = 'json'
+FORMATS = (YAML, JSON)
+
+# How sym.fleet.apply_homes goes on once a home failed
+CONTINUE = 'continue'  # Apply the other homes when a home fails
+STOP = 'stop'          # Do not start any further homes once a home failed
+POLICIES = (CONTINUE, STOP)
+
+# Select shards by name instead of by host, a comma separated list (see the --shard option and sym.shards)
+ENV_SHARDS = 'SYM_SHARDS'
+# The tags of this host, a comma separated list
+ENV_TAGS = 'SYM_TAGS'
+
+# The number of threads checking symlinks in parallel, see sym.verify
+DEFAULT_JOBS = 16
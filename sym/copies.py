@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Materializes sources as copies at their destinations, for homes in which symlinks into the repo would dangle
+
+A copy is cloned with a FICLONE reflink where the filesystem supports it, so that it shares the blocks of its source
+until either is modified. Otherwise the data is copied in the kernel with os.copy_file_range, or os.sendfile where that
+is not supported either, before falling back to reading and writing it. A copy is written next to its destination and
+renamed over it, so the destination never has partial content, and it is skipped when the destination already has the
+content of the source.
+
+The config records the digest of the content last copied for every copy (see ConfigYAML.copies), which tells a copy
+whose source changed since apart from one which was modified in place.
+"""
+
+import errno
+import hashlib
+import mmap
+import os
+import stat
+
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+
+MMAP_THRESHOLD = 1024 * 1024  # Files at least this big are hashed through mmap rather than read in blocks
+BLOCK_SIZE = 64 * 1024
+
+# The errors which mean a way of copying is not supported for the files at hand, rather than that the copy failed
+_UNSUPPORTED = (errno.EBADF, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EOPNOTSUPP, errno.EXDEV, errno.EPERM)
+
+
+def hash_file(path, size=None):
+    """Returns the BLAKE2 hex digest of the content of a file, reading files of MMAP_THRESHOLD bytes or more via mmap"""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as stream:
+        if size is None:
+            size = os.fstat(stream.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            for block in iter(lambda: stream.read(BLOCK_SIZE), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def digest_of(path):
+    """Returns the digest of a regular file, None if it does not exist or is something else, e.g. a symlink"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return hash_file(path, st.st_size)
+
+
+def clone_file(source, destination):
+    """Writes the content of source to a new file at destination, which must not exist, with the mode bits of source
+
+    Returns:
+        How the data was copied, one of 'reflink', 'copy_file_range', 'sendfile' or 'read'
+    """
+    if not os.path.isfile(source):
+        raise ValueError('Only files can be copied: {}'.format(source))
+    fd = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        method = clone_into(source, fd)
+    except BaseException:
+        os.close(fd)
+        os.unlink(destination)
+        raise
+    os.close(fd)
+    return method
+
+
+def clone_into(source, fd):
+    """Writes the content of source to an empty file open for writing, and gives it the mode bits of source
+
+    Returns:
+        How the data was copied, see clone_file()
+    """
+    with open(source, 'rb') as src:
+        st = os.fstat(src.fileno())
+        if not stat.S_ISREG(st.st_mode):
+            raise ValueError('Only files can be copied: {}'.format(source))
+        method = _clone(src.fileno(), fd, st.st_size)
+        os.fchmod(fd, stat.S_IMODE(st.st_mode))
+    return method
+
+
+def _clone(src_fd, dst_fd, size):
+    import fcntl  # Imported here as copies are rare, and it is POSIX only
+
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return 'reflink'
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED:
+            raise
+
+    offset = 0
+    for method in ('copy_file_range', 'sendfile'):
+        try:
+            while offset < size:
+                if method == 'copy_file_range':
+                    copied = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+                else:
+                    os.lseek(dst_fd, offset, os.SEEK_SET)
+                    copied = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                if copied == 0:
+                    break  # The source shrank
+                offset += copied
+            return method
+        except (AttributeError, OSError) as e:  # AttributeError: not available on this platform
+            if offset or (isinstance(e, OSError) and e.errno not in _UNSUPPORTED):
+                raise
+
+    os.lseek(src_fd, 0, os.SEEK_SET)
+    os.lseek(dst_fd, 0, os.SEEK_SET)
+    for block in iter(lambda: os.read(src_fd, BLOCK_SIZE), b''):
+        while block:
+            block = block[os.write(dst_fd, block):]
+    return 'read'
+
+
+def copy_file(source, destination):
+    """Materializes source at destination, replacing whatever is there, unless destination has its content already
+
+    The content of the destination is only hashed if it is a regular file of the same size as the source.
+
+    Returns:
+        The digest of the content of source
+    """
+    size = os.stat(source).st_size
+    digest = hash_file(source, size)
+    try:
+        st = os.lstat(destination)
+    except OSError:
+        st = None
+    if st is not None and stat.S_ISREG(st.st_mode) and st.st_size == size and hash_file(destination, size) == digest:
+        return digest
+
+    import tempfile
+
+    directory, name = os.path.split(destination)
+    fd, tmppath = tempfile.mkstemp(dir=directory, prefix='.{}.'.format(name))
+    try:
+        try:
+            clone_into(source, fd)
+        finally:
+            os.close(fd)
+        os.replace(tmppath, destination)
+    except BaseException:
+        os.unlink(tmppath)
+        raise
+    return digest
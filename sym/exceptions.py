@@ -22,9 +22,19 @@
 #  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 
+import builtins
+
+
 class FileExistsError(Exception):
     """Exception raised when a path already exists"""
 
 
 class FileNotFoundError(Exception):
     """Exception raised when a path is not found"""
+
+
+class ConfigNotFoundError(builtins.FileNotFoundError):
+    """Exception raised when there is no symconfig, sym init creates it
+
+    It is an OSError with errno ENOENT, like the error reading a missing file raises.
+    """
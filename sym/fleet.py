@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Applies the configs of many home directories at once, e.g. of the service accounts of a shared host
+
+Every home is applied with its own config (see sym.api.apply) in a pool of worker processes. A home which fails, e.g.
+because it has no config or its config can not be read, is isolated from the others: it is reported as FAILED and, by
+default, the other homes are still applied.
+"""
+
+import argparse
+import collections
+import glob
+import os
+
+from sym import apply as symapply
+from sym.constants import CONTINUE
+from sym.constants import STOP
+from sym.query import WILDCARDS
+
+
+OK = 'ok'              # Every symlink is in place
+CONFLICT = 'conflict'  # Some symlinks conflict with files in the home
+FAILED = 'failed'      # The home could not be applied at all
+SKIPPED = 'skipped'    # The home was not applied because an earlier one failed, see STOP
+STATUSES = (OK, CONFLICT, FAILED, SKIPPED)
+
+
+class HomeResult(object):
+    """The outcome of applying the config of a single home directory
+
+    Attributes:
+        home      - The home directory
+        status    - One of STATUSES
+        counts    - A Counter of the sym.apply statuses of the symlinks of the home, empty unless the home was applied
+        conflicts - The sym.apply.ApplyResult of every conflicting symlink
+        reason    - Why the home failed, None otherwise
+    """
+
+    def __init__(self, home, status, counts=None, conflicts=(), reason=None):
+        self.home = home
+        self.status = status
+        self.counts = counts if counts is not None else collections.Counter()
+        self.conflicts = list(conflicts)
+        self.reason = reason
+
+    def __str__(self):
+        if self.reason:
+            return '{}: {} ({})'.format(self.status, self.home, self.reason)
+        if self.status == SKIPPED:
+            return '{}: {}'.format(self.status, self.home)
+        return '{}: {} ({})'.format(self.status, self.home, ', '.join(
+            '{} {}'.format(self.counts[status], status) for status in symapply.STATUSES))
+
+
+def expand_homes(specs):
+    """Returns the home directories given by a list of paths and globs, e.g. ['/home/svc-*', '/srv/build']
+
+    Every spec may also be a comma separated list. Globs only match directories, the homes are returned in the order
+    they were given, globs sorted, and every home only once.
+    """
+    homes = []
+    for spec in specs:
+        for pattern in filter(None, spec.split(',')):
+            if WILDCARDS.search(pattern):
+                homes.extend(sorted(path for path in glob.glob(os.path.expanduser(pattern)) if os.path.isdir(path)))
+            else:
+                homes.append(os.path.expanduser(pattern))
+    return list(collections.OrderedDict.fromkeys(os.path.abspath(home) for home in homes))
+
+
+def apply_home(home, dry_run=False, copy=False):
+    """Applies the config of a single home directory, in a worker process
+
+    Returns:
+        A HomeResult, any error is caught and reported as FAILED
+    """
+    from sym import api  # Imported here to keep the module cheap to import for the cli
+
+    try:
+        results = api.apply(argparse.Namespace(dry_run=dry_run, copy=copy), userhome=home)
+    except Exception as e:
+        return HomeResult(home, FAILED, reason=str(e) or e.__class__.__name__)
+
+    counts = symapply.summarize(results)
+    conflicts = [result for result in results if result.status == symapply.CONFLICT]
+    return HomeResult(home, CONFLICT if conflicts else OK, counts, conflicts)
+
+
+def apply_homes(homes, dry_run=False, jobs=None, policy=CONTINUE, report=None, copy=False):
+    """Applies the configs of many home directories in a pool of worker processes
+
+    Parameters:
+        homes   - The home directories, see expand_homes()
+        dry_run - Only report what would be done, without changing the filesystem
+        jobs    - The maximum number of homes applied at once, the number of CPUs by default
+        policy  - What to do once a home failed, one of sym.constants.POLICIES
+        report  - Called with every HomeResult as soon as the home is done
+        copy    - Materialize every entry as a copy rather than a symlink, see sym.copies
+
+    Returns:
+        A list of HomeResult, in the same order as homes
+    """
+    jobs = jobs or os.cpu_count() or 1
+    results = {}
+
+    def done(result):
+        results[result.home] = result
+        if report is not None:
+            report(result)
+
+    if jobs <= 1 or len(homes) <= 1:
+        for home in homes:
+            if policy == STOP and any(result.status == FAILED for result in results.values()):
+                done(HomeResult(home, SKIPPED))
+            else:
+                done(apply_home(home, dry_run, copy))
+        return [results[home] for home in homes]
+
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures import as_completed
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(homes))) as executor:
+        futures = dict((executor.submit(apply_home, home, dry_run, copy), home) for home in homes)
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception as e:  # The worker died, e.g. it was killed
+                result = HomeResult(futures[future], FAILED, reason=str(e) or e.__class__.__name__)
+            done(result)
+            if result.status == FAILED and policy == STOP:
+                for pending in futures:
+                    if pending.cancel():
+                        done(HomeResult(futures[pending], SKIPPED))
+    return [results[home] for home in homes]
+
+
+def summarize(results):
+    """Returns a Counter of how many homes there are for each status"""
+    counts = collections.Counter(dict.fromkeys(STATUSES, 0))
+    counts.update(result.status for result in results)
+    return counts
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+
+from sym.exceptions import FileExistsError
+from sym.exceptions import FileNotFoundError
+from sym.paths import PathResolver
+from sym.paths import is_within
+
+
+def find_folds(config, destination):
+    """Returns the sources of the folded trees a destination lies in
+
+    Parameters:
+        config      - The sym.config.ConfigYAML the trees are recorded in
+        destination - The destination as stored in the config
+    """
+    return [source for source, root in config.folds.items() if is_within(destination, root)]
+
+
+def is_folded(config, destination, resolver):
+    """Returns True if a destination is a symlink to a directory which sym created for a folded tree
+
+    Parameters:
+        config      - The sym.config.ConfigYAML of the symlinks
+        destination - The destination as stored in the config
+        resolver    - The sym.paths.PathResolver of the current command
+    """
+    source = config.symlinks.get(destination)
+    return source is not None and bool(find_folds(config, destination)) and os.path.isdir(resolver.resolve(source))
+
+
+def fold(config, source, destination, resolver, fs=os):
+    """Links every file below a source directory into a destination directory, with the fewest symlinks possible
+
+    A destination directory which does not exist yet, or which only holds symlinks sym would create anyway, is replaced
+    by a single symlink to the source directory. A destination directory which also holds foreign files is kept and
+    the tree is linked one level down, recursively. A directory folded for another tree which is in the way is unfolded
+    into per-file symlinks so both trees fit. The tree is recorded in config.folds by its source, which is how later
+    commands know the directory symlinks may be unfolded and refolded.
+
+    Nothing is changed if any file of the tree conflicts with a foreign file at the destination.
+
+    Parameters:
+        config      - The sym.config.ConfigYAML to record the symlinks in, the caller saves it
+        source      - The absolute path of the source directory
+        destination - The absolute path of the destination directory
+        resolver    - The sym.paths.PathResolver of the current command
+        fs          - Makes the filesystem changes, os or a sym.transaction.Transaction
+    """
+    if not os.path.isdir(source):
+        raise FileNotFoundError('Source path is not a directory: {}'.format(source))
+
+    unfold_parents(config, destination, resolver, fs)
+    conflicts = []
+    _find_conflicts(config, source, destination, PathResolver(resolver.home), conflicts)
+    if conflicts:
+        raise FileExistsError('Destination paths exist, cannot fold {} into {}: {}'.format(
+            source, destination, ', '.join(conflicts)))
+
+    parent = os.path.dirname(destination)
+    if not os.path.isdir(parent):
+        fs.makedirs(parent)
+    tree = resolver.key(source)
+    config.folds[tree] = resolver.key(destination)
+    _fold(config, source, destination, resolver, fs)
+    refold(config, tree, resolver, fs)
+
+
+def _find_conflicts(config, source, destination, resolver, conflicts):
+    """Collects the destinations which are in the way of folding, without changing anything
+
+    Folded directories are looked through rather than unfolded, the merged tree is the same either way. A separate
+    resolver is used as the real paths of directories seen through folded symlinks change once they are unfolded.
+    """
+    if not os.path.lexists(destination) or os.path.realpath(destination) == os.path.realpath(source):
+        return
+    if os.path.islink(destination) and not is_folded(config, resolver.key(destination), resolver):
+        conflicts.append(destination)
+        return
+    if not (os.path.isdir(source) and os.path.isdir(destination)):
+        conflicts.append(destination)
+        return
+    for name in sorted(os.listdir(source)):
+        _find_conflicts(config, os.path.join(source, name), os.path.join(destination, name), resolver, conflicts)
+
+
+def _fold(config, source, destination, resolver, fs):
+    if not os.path.lexists(destination):
+        fs.symlink(source, destination)
+    elif os.path.realpath(destination) != os.path.realpath(source):
+        if os.path.islink(destination):
+            unfold(config, destination, resolver, fs)
+        for name in os.listdir(source):
+            _fold(config, os.path.join(source, name), os.path.join(destination, name), resolver, fs)
+        return
+    config.symlinks[resolver.key(destination)] = resolver.key(source)
+
+
+def unfold(config, destination, resolver, fs=os):
+    """Replaces a folded directory symlink by a real directory holding a symlink for every file in the source directory
+
+    Parameters:
+        config      - The sym.config.ConfigYAML of the symlinks, the caller saves it
+        destination - The absolute path of the folded directory
+        resolver    - The sym.paths.PathResolver of the current command
+        fs          - Makes the filesystem changes, os or a sym.transaction.Transaction
+    """
+    key = resolver.key(destination)
+    source = config.symlinks[key]
+    abs_source = resolver.resolve(source)
+
+    fs.unlink(destination)
+    fs.mkdir(destination)
+    resolver.forget(destination)
+    del config.symlinks[key]
+    for name in os.listdir(abs_source):
+        fs.symlink(os.path.join(abs_source, name), os.path.join(destination, name))
+        config.symlinks[os.path.join(key, name)] = os.path.join(source, name)
+
+
+def unfold_parents(config, path, resolver, fs=os):
+    """Unfolds every folded directory a path lies in, so that a foreign file can be put there
+
+    Parameters:
+        config   - The sym.config.ConfigYAML of the symlinks, the caller saves it
+        path     - The absolute path about to be created
+        resolver - The sym.paths.PathResolver of the current command
+        fs       - Makes the filesystem changes, os or a sym.transaction.Transaction
+    """
+    path = os.path.normpath(path)
+    parents = []
+    parent = os.path.dirname(path)
+    while parent != os.path.dirname(parent):
+        parents.append(parent)
+        parent = os.path.dirname(parent)
+
+    # Top down, the real path of a directory below a folded one is only known once the folded one is unfolded
+    for parent in reversed(parents):
+        if os.path.islink(parent) and is_folded(config, resolver.key(parent), resolver):
+            unfold(config, parent, resolver, fs)
+
+
+def refold(config, tree, resolver, fs=os):
+    """Folds every directory of a folded tree which only holds the symlinks of the tree back into a single symlink
+
+    Parameters:
+        config   - The sym.config.ConfigYAML of the symlinks, the caller saves it
+        tree     - The source of the tree as stored in config.folds
+        resolver - The sym.paths.PathResolver of the current command
+        fs       - Makes the filesystem changes, os or a sym.transaction.Transaction
+    """
+    abs_root = resolver.resolve(config.folds[tree])
+    if os.path.islink(abs_root) or not os.path.isdir(abs_root):
+        return
+
+    source_root = resolver.resolve(tree)
+    for directory, _, _ in os.walk(abs_root, topdown=False):
+        source = os.path.normpath(os.path.join(source_root, os.path.relpath(directory, abs_root)))
+        if os.path.isdir(source) and _owns(config, source, directory, resolver):
+            key = resolver.key(directory)
+            for name in os.listdir(directory):
+                fs.unlink(os.path.join(directory, name))
+                del config.symlinks[os.path.join(key, name)]
+            fs.rmdir(directory)
+            resolver.forget(directory)
+            fs.symlink(source, directory)
+            config.symlinks[key] = resolver.key(source)
+
+
+def _owns(config, source, directory, resolver):
+    """Returns True if a directory holds a symlink for every file of a source directory, and nothing else"""
+    names = os.listdir(directory)
+    if sorted(names) != sorted(os.listdir(source)):
+        return False
+    key = resolver.key(directory)
+    for name in names:
+        entry = config.symlinks.get(os.path.join(key, name))
+        if entry is None or resolver.resolve(entry) != os.path.join(source, name) or \
+                not os.path.islink(os.path.join(directory, name)):
+            return False
+    return True
+
+
+def prune_folds(config):
+    """Forgets the folded trees which no symlink is left in, e.g. once they were removed"""
+    for tree in list(config.folds):
+        if next(config.symlinks.below(tree, sources=True), None) is None:
+            del config.folds[tree]
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import collections
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+
+TABLE = 'table'
+JSON = 'json'
+PROMETHEUS = 'prometheus'
+FORMATS = (TABLE, JSON, PROMETHEUS)
+
+ENV_FORMAT = 'SYM_PROFILE'
+ENV_OUTPUT = 'SYM_PROFILE_OUTPUT'
+
+# The filesystem calls counted while instrumentation is enabled, as (module, attribute) pairs
+SYSCALLS = (
+    (os, 'stat'), (os, 'lstat'), (os, 'readlink'), (os, 'symlink'), (os, 'unlink'), (os, 'scandir'), (os, 'open'),
+    (os, 'makedirs'), (os.path, 'realpath'), (os.path, 'abspath'), (os.path, 'exists'), (os.path, 'lexists'),
+)
+
+_enabled = False
+_lock = threading.Lock()
+_spans = collections.OrderedDict()  # name -> [calls, seconds]
+_syscalls = collections.Counter()
+_originals = {}
+
+
+class _NullSpan(object):
+    """The span handed out while instrumentation is disabled, it does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    """Times the code it wraps and adds the time to the named span"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            totals = _spans.setdefault(self.name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed
+        return False
+
+
+def span(name):
+    """Returns a context manager which adds the time spent within it to the named span
+
+    While instrumentation is disabled a shared no-op context manager is returned, so spans cost next to nothing.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def timed(name):
+    """Decorates a function so that every call to it is timed as the named span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _counting(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _lock:
+            _syscalls[name] += 1
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def is_enabled():
+    """Returns True if instrumentation is enabled"""
+    return _enabled
+
+
+def enable():
+    """Starts collecting spans and counting filesystem calls
+
+    Filesystem calls are counted by temporarily wrapping the functions listed in SYSCALLS, nothing is wrapped while
+    instrumentation is disabled.
+    """
+    global _enabled
+    if _enabled:
+        return
+    for module, attr in SYSCALLS:
+        original = getattr(module, attr)
+        _originals[(module, attr)] = original
+        setattr(module, attr, _counting(attr, original))
+    _enabled = True
+
+
+def disable():
+    """Stops collecting, restoring the wrapped filesystem functions"""
+    global _enabled
+    for (module, attr), original in _originals.items():
+        setattr(module, attr, original)
+    _originals.clear()
+    _enabled = False
+
+
+def reset():
+    """Discards everything collected so far"""
+    with _lock:
+        _spans.clear()
+        _syscalls.clear()
+
+
+def get_data():
+    """Returns everything collected so far as a dict of spans and syscalls"""
+    with _lock:
+        return {
+            'spans': collections.OrderedDict((name, {'calls': calls, 'seconds': seconds})
+                                             for name, (calls, seconds) in _spans.items()),
+            'syscalls': dict(_syscalls),
+        }
+
+
+def format_table(data):
+    """Formats collected data as a human readable table"""
+    lines = ['{:<32} {:>8} {:>12}'.format('span', 'calls', 'time (ms)')]
+    for name, span_data in data['spans'].items():
+        lines.append('{:<32} {:>8} {:>12.3f}'.format(name, span_data['calls'], span_data['seconds'] * 1000))
+    lines.append('')
+    lines.append('{:<32} {:>8}'.format('syscall', 'calls'))
+    for name, calls in sorted(data['syscalls'].items()):
+        lines.append('{:<32} {:>8}'.format(name, calls))
+    return '\n'.join(lines) + '\n'
+
+
+def format_json(data):
+    """Formats collected data as JSON"""
+    return json.dumps(data, indent=1) + '\n'
+
+
+def format_prometheus(data, command=None):
+    """Formats collected data in the Prometheus text exposition format, for the node exporter's textfile collector"""
+    labels = 'command="{}",'.format(command) if command else ''
+    lines = [
+        '# HELP sym_span_seconds Time spent in each phase of the last sym run.',
+        '# TYPE sym_span_seconds gauge',
+    ]
+    lines.extend('sym_span_seconds{{{}span="{}"}} {}'.format(labels, name, span_data['seconds'])
+                 for name, span_data in data['spans'].items())
+    lines.extend([
+        '# HELP sym_span_calls Number of times each phase ran in the last sym run.',
+        '# TYPE sym_span_calls gauge',
+    ])
+    lines.extend('sym_span_calls{{{}span="{}"}} {}'.format(labels, name, span_data['calls'])
+                 for name, span_data in data['spans'].items())
+    lines.extend([
+        '# HELP sym_syscalls Number of filesystem calls made in the last sym run.',
+        '# TYPE sym_syscalls gauge',
+    ])
+    lines.extend('sym_syscalls{{{}syscall="{}"}} {}'.format(labels, name, calls)
+                 for name, calls in sorted(data['syscalls'].items()))
+    return '\n'.join(lines) + '\n'
+
+
+def report(fmt=TABLE, output=None, command=None):
+    """Writes everything collected so far
+
+    Parameters:
+        fmt     - One of FORMATS
+        output  - The path of the file to write to, None for stderr. The file is replaced atomically, as the textfile
+                  collector requires.
+        command - The sym command that ran, used as a label by the Prometheus format
+    """
+    data = get_data()
+    if fmt == JSON:
+        text = format_json(data)
+    elif fmt == PROMETHEUS:
+        text = format_prometheus(data, command)
+    else:
+        text = format_table(data)
+
+    if output is None:
+        sys.stderr.write(text)
+        return
+
+    tmppath = '{}.{}.tmp'.format(output, os.getpid())
+    with open(tmppath, 'w') as stream:
+        stream.write(text)
+    os.replace(tmppath, output)
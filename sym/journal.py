@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import errno
+import json
+import os
+
+
+# Once the journal grows past this size the next save compacts it into a new snapshot of the config
+COMPACT_BYTES = 64 * 1024
+
+
+def get_journal_path(symconfig):
+    """Returns the path of the journal kept next to a symconfig"""
+    return os.path.realpath(symconfig) + '.journal'
+
+
+def append(symconfig, changes):
+    """Appends changes to the journal of a symconfig
+
+    Every change is written as one JSON record per line, [destination, source] when a symlink was added or updated and
+    [destination, null] when it was removed. The records are written with a single write and synced to disk. If the
+    journal ends in a record torn by a crash, the records start on a new line so that they are not part of it.
+
+    Parameters:
+        symconfig - The path to the symconfig file
+        changes   - A list of (destination, source) changes, see LinkTable.changes
+
+    Returns:
+        The size of the journal in bytes after appending
+    """
+    records = ''.join(json.dumps(change) + '\n' for change in changes)
+    fd = os.open(get_journal_path(symconfig), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        size = os.fstat(fd).st_size
+        if size and os.pread(fd, 1, size - 1) != b'\n':
+            records = '\n' + records
+        os.write(fd, records.encode('utf-8'))
+        os.fsync(fd)
+        return os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+
+
+def replay(symconfig, symlinks):
+    """Applies the journal of a symconfig on top of the symlinks loaded from its snapshot
+
+    A record that cannot be parsed can only be the result of a write torn by a crash, replay skips it. The records
+    appended after it start on a new line (see append()) and are applied.
+
+    Parameters:
+        symconfig - The path to the symconfig file
+        symlinks  - The dict of destination to source paths to update
+    """
+    try:
+        stream = open(get_journal_path(symconfig), 'r')
+    except (IOError, OSError) as e:
+        if e.errno == errno.ENOENT:
+            return
+        raise
+
+    with stream:
+        for line in stream:
+            try:
+                destination, source = json.loads(line)
+            except (TypeError, ValueError):
+                continue
+            if source is None:
+                symlinks.pop(destination, None)
+            else:
+                symlinks[destination] = source
+
+
+def remove(symconfig):
+    """Removes the journal of a symconfig, once its changes are part of the snapshot"""
+    try:
+        os.unlink(get_journal_path(symconfig))
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
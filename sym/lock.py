@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import contextlib
+import errno
+import fcntl
+import os
+
+from sym import cache
+
+
+# Locks held by this process, by lock path, as [fd, depth, shared]
+_held = {}
+
+
+def get_lock_path(symconfig):
+    """Returns the path of the lock file of a symconfig, kept in the cache directory rather than in the repo"""
+    return cache.get_cache_path(symconfig, 'lock')
+
+
+@contextlib.contextmanager
+def lock(symconfig, shared=False):
+    """Holds the lock of a symconfig for the duration of a with block
+
+    The lock is an fcntl.flock() on a lock file, so it is released by the kernel if the process dies while holding it.
+    Readers of a journaled config take it shared to see its snapshot and journal in a consistent state, writers take it
+    exclusive.
+    The lock is reentrant within a process, a nested block keeps the lock the outer block holds and only upgrades a
+    shared lock to an exclusive one if it has to.
+
+    Parameters:
+        symconfig - The path to the symconfig file
+        shared    - Take a shared lock rather than an exclusive one
+    """
+    path = get_lock_path(symconfig)
+    held = _held.get(path)
+    if held is not None:
+        if held[2] and not shared:
+            fcntl.flock(held[0], fcntl.LOCK_EX)
+            held[2] = False
+        held[1] += 1
+        try:
+            yield
+        finally:
+            held[1] -= 1
+        return
+
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        _held[path] = [fd, 1, shared]
+        try:
+            yield
+        finally:
+            del _held[path]
+    finally:
+        os.close(fd)  # Closing the last descriptor releases the lock
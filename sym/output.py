@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Reports the outcome of a command, as text for people or as NDJSON for machines
+
+In NDJSON mode every processed entry is written as one JSON object on its own line, flushed as soon as it is reported,
+so that the output of a large run can be consumed while the command still runs. Every record has a type:
+
+    entry   - One processed entry, with its destination and source as stored in the symconfig and, for most commands,
+              its status
+    error   - An error which is printed as a plain message in text mode, with the error message
+    summary - Always the last record, with the number of entries of each status and the elapsed time in seconds
+"""
+
+import sys
+import time
+
+
+TEXT = 'text'
+NDJSON = 'ndjson'
+FORMATS = (TEXT, NDJSON)
+
+RESULT_FIELDS = ('destination', 'source', 'status', 'target', 'reason', 'checked', 'link', 'content', 'digest')
+
+
+class Output(object):
+    """Writes the entries, errors and summary of one command in the chosen format
+
+    Attributes:
+        format  - One of FORMATS
+        command - The command whose outcome is reported
+        stream  - Where to write, sys.stdout by default
+        start   - The time.monotonic() the command started at
+    """
+
+    def __init__(self, fmt, command, stream=None):
+        self.format = fmt
+        self.command = command
+        self.stream = sys.stdout if stream is None else stream
+        self.start = time.monotonic()
+
+    def entry(self, text, **fields):
+        """Reports one processed entry
+
+        Parameters:
+            text   - The line to print in text mode, None to print nothing
+            fields - The fields of the NDJSON record
+        """
+        if self.format == NDJSON:
+            self._write(dict(fields, type='entry', command=self.command))
+        elif text is not None:
+            self.stream.write(text + '\n')
+
+    def result(self, result, visible=True):
+        """Reports the result object of one processed entry, e.g. a sym.verify.VerifyResult
+
+        Parameters:
+            result  - The result, its RESULT_FIELDS which are not None are the fields of the NDJSON record
+            visible - Whether the result is printed in text mode
+        """
+        fields = dict((field, getattr(result, field)) for field in RESULT_FIELDS
+                      if getattr(result, field, None) is not None)
+        self.entry(str(result) if visible else None, **fields)
+
+    def error(self, error, **fields):
+        """Reports an error, e.g. an exception which aborted the command
+
+        Parameters:
+            error  - The error, printed as is in text mode
+            fields - Further fields of the NDJSON record, e.g. the entry which failed
+        """
+        if self.format == NDJSON:
+            self._write(dict(fields, type='error', command=self.command, message=str(error)))
+        else:
+            self.stream.write('{}\n'.format(error))
+
+    def summary(self, counts, statuses, text=True, note=None):
+        """Reports how many entries there were of each status, as the last record
+
+        Parameters:
+            counts   - A mapping of status to the number of entries, e.g. a collections.Counter
+            statuses - The statuses to report, in order
+            text     - Whether the summary is printed in text mode
+            note     - A remark about the whole run, e.g. that it was a dry run
+        """
+        if self.format == NDJSON:
+            record = {'type': 'summary', 'command': self.command,
+                      'counts': dict((status, counts[status]) for status in statuses),
+                      'elapsed': round(time.monotonic() - self.start, 6)}
+            if note is not None:
+                record['note'] = note
+            self._write(record)
+        elif text:
+            summary = ', '.join('{} {}'.format(counts[status], status) for status in statuses)
+            self.stream.write(summary + (' ({})'.format(note) if note else '') + '\n')
+
+    def _write(self, record):
+        import json  # Imported here as it is only needed for NDJSON output
+
+        self.stream.write(json.dumps(record) + '\n')
+        self.stream.flush()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import os
+
+
+def get_user_home():
+    """Returns the home directory of the user"""
+    return os.path.expanduser(os.environ["HOME"])
+
+
+def is_within(path, directory):
+    """Returns True if path is directory or lies below it, both must be normalized absolute paths"""
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+class PathResolver(object):
+    """Resolves and canonicalizes the paths sym works with, for the duration of a command
+
+    The home directory and its real path are computed once, and the real path of every directory is memoized so that
+    resolving many paths in the same directory costs a single lstat per path rather than one per path component. The
+    memoized real paths are not invalidated unless sym itself replaces a directory (see forget()), a resolver should
+    therefore not outlive the command it was created for.
+
+    Paths are stored in the config (see key()) relative to the home directory when they lie within it and as normalized
+    absolute paths otherwise, so the same file always ends up with the same key however it was specified.
+
+    Attributes:
+        home      - The home directory relative config paths are resolved against
+        real_home - The real path of the home directory
+    """
+
+    def __init__(self, userhome=None):
+        self.home = userhome if userhome is not None else get_user_home()
+        self.real_home = os.path.realpath(self.home)
+        self._dirs = {}
+
+    def absolute(self, path):
+        """Returns the normalized absolute path of a path given by the user, relative paths are relative to the cwd"""
+        return os.path.abspath(os.path.expanduser(path))
+
+    def resolve(self, path):
+        """Returns the absolute path of a path stored in the config, relative paths are relative to the home dir"""
+        return os.path.join(self.home, os.path.expanduser(path))
+
+    def realdir(self, directory):
+        """Returns the memoized real path of a directory"""
+        try:
+            return self._dirs[directory]
+        except KeyError:
+            realdir = self._dirs[directory] = os.path.realpath(directory)
+            return realdir
+
+    def forget(self, directory):
+        """Forgets the memoized real paths of a directory and everything below it, once sym replaced it"""
+        for memoized in [memoized for memoized in self._dirs if is_within(memoized, directory)]:
+            del self._dirs[memoized]
+
+    def canonical(self, path):
+        """Returns an absolute path with every directory resolved to its real path, the last component is kept as is
+
+        This identifies a symlink itself rather than what it points to, which is what a destination should be.
+        """
+        directory, name = os.path.split(os.path.normpath(path))
+        if not name:
+            return self.realdir(directory)
+        return os.path.join(self.realdir(directory), name)
+
+    def realpath(self, path):
+        """Returns the real path of an absolute path, like os.path.realpath but with memoized directories"""
+        canonical = self.canonical(path)
+        if os.path.islink(canonical):
+            return os.path.realpath(canonical)
+        return canonical
+
+    def key(self, path):
+        """Returns the canonical form an absolute path is stored in the config as"""
+        canonical = self.canonical(path)
+        if is_within(canonical, self.real_home):
+            return os.path.relpath(canonical, self.real_home)
+        return canonical
+
+    def keys(self, path):
+        """Returns the keys an absolute path may be stored in the config as, its key() first
+
+        Before keys were canonicalized, a path given as an absolute path was stored as is, so the entry of a path within
+        the home directory may be stored under its absolute path in a config written by an earlier version of sym.
+        """
+        key = self.key(path)
+        keys = [key]
+        if not os.path.isabs(key):
+            for legacy in (path, os.path.join(self.home, key), os.path.join(self.real_home, key)):
+                legacy = os.path.normpath(legacy)
+                if legacy not in keys:
+                    keys.append(legacy)
+        return keys
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import fnmatch
+import os
+import re
+
+from sym.paths import is_within
+
+
+WILDCARDS = re.compile(r'[*?[]')
+
+
+def query_links(symlinks, resolver, path=None, pattern=None, source=None):
+    """Yields the symlink entries matching a query, sorted by destination
+
+    Every filter narrows the sorted indexes of sym.config.LinkTable by bisecting them, so a query only touches the
+    entries it returns (plus the ones a glob rejects within the narrowed range) rather than the whole table.
+
+    Parameters:
+        symlinks - The sym.config.LinkTable of the config
+        resolver - The sym.paths.PathResolver of the current command
+        path     - Only entries whose destination is this path or lies below it, as given by the user
+        pattern  - Only entries whose destination, as stored in the config, matches this glob
+        source   - Only entries whose source is this path or lies below it, as given by the user
+
+    Returns:
+        A generator of (destination, source) tuples as stored in the config
+    """
+    if source is not None:
+        destinations = set()
+        for key in resolver.keys(resolver.absolute(source)):
+            for match in symlinks.below(key, sources=True):
+                destinations.update(symlinks.destinations_of(match))
+        destinations = iter(sorted(destinations))
+        if path is not None:
+            directories = resolver.keys(resolver.absolute(path))
+            destinations = (destination for destination in destinations
+                            if any(_is_below(destination, directory) for directory in directories))
+    elif path is not None:
+        keys = resolver.keys(resolver.absolute(path))
+        if len(keys) == 1:
+            destinations = symlinks.below(keys[0])
+        else:  # Also the entries an earlier version of sym stored under absolute paths, see PathResolver.keys()
+            destinations = iter(sorted(set(destination for key in keys for destination in symlinks.below(key))))
+    elif pattern is not None:
+        # Only destinations starting with the literal part of the glob can match it
+        destinations = symlinks.starting_with(WILDCARDS.split(pattern, 1)[0])
+    else:
+        destinations = symlinks.starting_with('')
+
+    for destination in destinations:
+        if pattern is None or fnmatch.fnmatchcase(destination, pattern):
+            yield destination, symlinks[destination]
+
+
+def _is_below(key, directory):
+    if directory == os.curdir:  # $HOME itself, every relative path lies below it
+        return not os.path.isabs(key)
+    return is_within(key, directory)
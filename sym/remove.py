@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import collections
+import os
+
+from sym import copies as symcopies
+from sym import verify
+from sym.exceptions import FileNotFoundError
+
+
+REMOVED = 'removed'
+FORGOTTEN = 'forgotten'
+CONFLICT = 'conflict'
+
+STATUSES = (REMOVED, FORGOTTEN, CONFLICT)
+
+
+class RemoveResult(object):
+    """The outcome of removing a single symlink entry
+
+    Attributes:
+        destination - The destination path as stored in the config
+        source      - The source path as stored in the config
+        status      - One of REMOVED (the symlink was deleted), FORGOTTEN (the symlink was already gone) or CONFLICT
+        reason      - Why the entry conflicts, None otherwise
+    """
+
+    def __init__(self, destination, source, status, reason=None):
+        self.destination = destination
+        self.source = source
+        self.status = status
+        self.reason = reason
+
+    def __str__(self):
+        if self.reason:
+            return '{}: {} -> {} ({})'.format(self.status, self.destination, self.source, self.reason)
+        return '{}: {} -> {}'.format(self.status, self.destination, self.source)
+
+
+def select_links(symlinks, resolver, paths, recursive=False):
+    """Finds the symlink entries a list of paths given by the user refers to
+
+    A path refers to the entry it is the destination of, otherwise to every entry it is the source of (found through
+    the reverse index of sym.config.LinkTable). With recursive, a directory also refers to every entry whose destination
+    or source lies below it.
+
+    Parameters:
+        symlinks  - The sym.config.LinkTable of the config
+        resolver  - The sym.paths.PathResolver of the current command
+        paths     - The paths as given by the user
+        recursive - Whether directories select everything below them
+
+    Returns:
+        A sorted list of the selected destinations as stored in the config
+    """
+    selected = set()
+    for path in paths:
+        keys = resolver.keys(resolver.absolute(path))
+        found = [key for key in keys if key in symlinks]
+        if found:
+            selected.update(found)
+            continue
+
+        destinations = set()
+        for key in keys:
+            destinations.update(symlinks.within(key) if recursive else symlinks.destinations_of(key))
+        if not destinations:
+            raise FileNotFoundError('Path is not managed by sym: {}'.format(path))
+        selected.update(destinations)
+    return sorted(selected)
+
+
+def remove_links(symlinks, destinations, resolver, fs=os, copies=None):
+    """Deletes the symlinks of the given entries and drops the entries from the config
+
+    A symlink is only deleted once it is verified to point to its source, anything else found at the destination is
+    left untouched and its entry is kept, so that removing never destroys a file sym did not create. Likewise a copy
+    (see sym.copies) is only deleted if it still has the content it was copied with or the content of its source.
+
+    Parameters:
+        symlinks     - The sym.config.LinkTable of the config, the entries are deleted from it
+        destinations - The destinations of the entries to remove, see select_links()
+        resolver     - The sym.paths.PathResolver of the current command
+        fs           - Makes the filesystem changes, os or a sym.transaction.Transaction
+        copies       - ConfigYAML.copies, the entries of the copies removed are deleted from it, None if there are none
+
+    Returns:
+        A list of RemoveResult, one per destination
+    """
+    results = []
+    for destination in destinations:
+        source = symlinks[destination]
+        if copies and destination in copies:
+            results.append(_remove_copy(destination, source, copies[destination], resolver, fs))
+        else:
+            results.append(_remove_link(destination, source, resolver, fs))
+        if results[-1].status != CONFLICT:
+            del symlinks[destination]
+            if copies:
+                copies.pop(destination, None)
+    return results
+
+
+def _remove_link(destination, source, resolver, fs):
+    result = verify.check_link(destination, source, resolver)
+    if result.status == verify.MISSING:
+        return RemoveResult(destination, source, FORGOTTEN)
+
+    abs_destination = resolver.resolve(destination)
+    if result.status == verify.WRONG_TARGET or result.target is None:
+        return RemoveResult(destination, source, CONFLICT, 'not a symlink to the source' if result.target is None
+                            else 'links to {}'.format(result.target))
+    if result.status == verify.DANGLING_SOURCE and \
+            resolver.realpath(abs_destination) != resolver.realpath(resolver.resolve(source)):
+        return RemoveResult(destination, source, CONFLICT, 'links to {}'.format(result.target))
+
+    try:
+        fs.unlink(abs_destination)
+    except OSError as e:
+        return RemoveResult(destination, source, CONFLICT, e.strerror)
+    return RemoveResult(destination, source, REMOVED)
+
+
+def _remove_copy(destination, source, digest, resolver, fs):
+    abs_destination = resolver.resolve(destination)
+    if not os.path.lexists(abs_destination):
+        return RemoveResult(destination, source, FORGOTTEN)
+
+    current = symcopies.digest_of(abs_destination)
+    if current is None:
+        return RemoveResult(destination, source, CONFLICT, 'not a copy of the source')
+    if current != digest and current != symcopies.digest_of(resolver.resolve(source)):
+        return RemoveResult(destination, source, CONFLICT, 'the copy was modified')
+
+    try:
+        fs.unlink(abs_destination)
+    except OSError as e:
+        return RemoveResult(destination, source, CONFLICT, e.strerror)
+    return RemoveResult(destination, source, REMOVED)
+
+
+def summarize(results):
+    """Returns a Counter of how many results there are for each status"""
+    counts = collections.Counter(dict.fromkeys(STATUSES, 0))
+    counts.update(result.status for result in results)
+    return counts
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import json
+
+from sym.constants import FORMATS  # noqa: F401
+from sym.constants import JSON
+from sym.constants import YAML
+
+
+YAML_TAG = u'!SymConfig'
+
+# PyYAML takes longer to import than the rest of sym together, it is imported the first time a YAML config is read or
+# written (see _get_yaml) rather than up front.
+_yaml = None
+
+
+class _SymConfigState(dict):
+    """Marks the state of a config so that it is dumped with the !SymConfig tag"""
+
+
+def _construct_symconfig(loader, node):
+    return loader.construct_mapping(node, deep=True)
+
+
+def _represent_symconfig(dumper, data):
+    return dumper.represent_mapping(YAML_TAG, dict(data))
+
+
+def _get_yaml():
+    """Imports PyYAML and returns a tuple of the module, the loader and the dumper to use
+
+    The libyaml backed safe loader and dumper are used when PyYAML was built with libyaml, they are many times faster
+    than the pure Python implementations. The !SymConfig tag is registered on private subclasses of them, so that the
+    safe loader and dumper of other code in the same process are left as they are.
+    """
+    global _yaml
+    if _yaml is None:
+        import yaml
+
+        class Loader(getattr(yaml, 'CSafeLoader', yaml.SafeLoader)):
+            pass
+
+        class Dumper(getattr(yaml, 'CSafeDumper', yaml.SafeDumper)):
+            pass
+
+        Loader.add_constructor(YAML_TAG, _construct_symconfig)
+        Dumper.add_representer(_SymConfigState, _represent_symconfig)
+        _yaml = (yaml, Loader, Dumper)
+    return _yaml
+
+
+def detect_format(text):
+    """Returns the format of a serialized symconfig
+
+    JSON documents always start with '{' whereas YAML symconfig documents start with the !SymConfig tag.
+    """
+    if text.lstrip()[:1] == '{':
+        return JSON
+    return YAML
+
+
+def loads(text):
+    """Deserializes a symconfig
+
+    Parameters:
+        text - The contents of a symconfig file
+
+    Returns:
+        A tuple of the config state (dict) and the format it was stored in
+    """
+    fmt = detect_format(text)
+    if fmt == JSON:
+        state = json.loads(text)
+    else:
+        yaml, loader, dumper = _get_yaml()
+        state = yaml.load(text, Loader=loader)
+    return state or {}, fmt
+
+
+def dump(state, stream, fmt=YAML, tagged=True):
+    """Serializes the state of a config to a stream
+
+    Parameters:
+        state  - The config state (dict) to serialize
+        stream - A file object to write to
+        fmt    - One of FORMATS
+        tagged - Tag a YAML document as a symconfig, other documents (e.g. the index of a sharded symconfig) are plain
+                 mappings
+    """
+    if fmt == JSON:
+        json.dump(state, stream, indent=1, sort_keys=True)
+        stream.write('\n')
+    elif fmt == YAML:
+        yaml, loader, dumper = _get_yaml()
+        yaml.dump(_SymConfigState(state) if tagged else state, stream, Dumper=dumper, default_flow_style=False)
+    else:
+        raise ValueError('Unknown symconfig format: {}'.format(fmt))
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import contextlib
+import errno
+import io
+import json
+import os
+import selectors
+import signal
+import socket
+import time
+
+from sym import cache
+from sym import cli
+from sym.config import keep_resident
+from sym.config import load_config
+from sym.config import release_resident
+from sym.paths import get_user_home
+
+
+# The commands a running server answers, every other command runs in process after asking the server to flush
+SERVED_COMMANDS = ('add', 'list', 'remove', 'verify')
+
+# Deferred saves are written once no request arrived for FLUSH_IDLE seconds, and at least every FLUSH_MAX seconds
+FLUSH_IDLE = 0.5
+FLUSH_MAX = 5.0
+
+ENV_NO_SERVER = 'SYM_NO_SERVER'
+
+
+def get_symconfig_path():
+    """Returns the real path to .symconfig"""
+    return os.path.realpath(os.path.join(get_user_home(), '.symconfig'))
+
+
+def get_socket_path(symconfig):
+    """Returns the path of the socket a server for a symconfig listens on"""
+    return cache.get_cache_path(symconfig, 'sock')
+
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def _receive(sock):
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = sock.recv(64 * 1024)
+        if not chunk:
+            break
+        data += chunk
+    return json.loads(data.decode('utf-8')) if data else None
+
+
+def request(message, symconfig=None):
+    """Sends a request to the server for a symconfig
+
+    Parameters:
+        message   - The request, a dict with a 'command' of 'run' (with 'argv' and 'cwd') or 'flush'
+        symconfig - The real path to the symconfig file, defaults to the one of the current user
+
+    Returns:
+        The response of the server, or None if no server is running
+    """
+    if os.environ.get(ENV_NO_SERVER):
+        return None
+
+    path = get_socket_path(symconfig or get_symconfig_path())
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (OSError, socket.error):
+        sock.close()
+        return None  # No server is running, or it died and left its socket behind
+
+    with contextlib.closing(sock):
+        _send(sock, message)
+        return _receive(sock)
+
+
+def run_remote(argv):
+    """Runs sym with the given arguments in the server, if one is running
+
+    Returns:
+        A tuple of the exit code and the output of the command, or None if no server is running
+    """
+    try:
+        cwd = os.getcwd()
+    except OSError:
+        return None  # The cwd was removed, run in process where relative paths behave as they always did
+    response = request({'command': 'run', 'argv': argv, 'cwd': cwd})
+    if response is None:
+        return None
+    return response['exit'], response['output']
+
+
+class Server(object):
+    """Keeps a config in memory and runs sym commands against it for clients connecting to a Unix socket
+
+    Commands run one at a time, exactly as they would in process (see sym.cli.run_command), except that the config is
+    loaded once and kept resident (see sym.config.keep_resident) and saves are batched: a dirty config is written once
+    the server has been idle for FLUSH_IDLE seconds, at least every FLUSH_MAX seconds and when the server stops. The
+    config is reloaded when it is changed on disk by something else while it is not dirty.
+
+    Attributes:
+        symconfig - The real path to the symconfig file
+        path      - The path of the socket
+    """
+
+    def __init__(self, symconfig=None):
+        self.symconfig = symconfig or get_symconfig_path()
+        self.path = get_socket_path(self.symconfig)
+        self.config = None
+        self.dirty_since = None
+        self.sock = None
+        self.running = False
+
+    def start(self):
+        """Loads the config and starts listening"""
+        if request({'command': 'ping'}, self.symconfig) is not None:
+            raise OSError(errno.EADDRINUSE, 'A sym server is already running', self.path)
+        try:
+            os.unlink(self.path)  # Left behind by a server which died
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+        self.config = load_config(self.symconfig)
+        keep_resident(self.symconfig, self.config)
+
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o077)
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        self.sock.listen(16)
+        self.running = True
+
+    def stop(self):
+        """Stops listening and writes the config if it is dirty"""
+        self.running = False
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        if self.config is not None:
+            release_resident(self.symconfig)
+            self.config = None
+
+    def refresh(self):
+        """Catches up with changes something else wrote to the config on disk
+
+        A dirty config is written right away, which merges the changes on disk into it (see ConfigYAML.write), a clean
+        one is loaded again.
+        """
+        if not self.config.changed_on_disk():
+            return
+        if self.config.dirty:
+            self.flush()
+            return
+        release_resident(self.symconfig)
+        self.config = load_config(self.symconfig)
+        keep_resident(self.symconfig, self.config)
+
+    def flush(self):
+        """Writes the config if it is dirty"""
+        if self.config.dirty:
+            self.config.flush()
+        self.dirty_since = None
+
+    def handle(self, message):
+        """Answers a single request"""
+        if message['command'] == 'ping':
+            return {'exit': 0, 'output': ''}
+        if message['command'] == 'flush':
+            self.flush()
+            return {'exit': 0, 'output': ''}
+
+        self.refresh()
+        output = io.StringIO()
+        cwd = os.getcwd()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                os.chdir(message['cwd'])
+                parser = cli.setup_parser()
+                code = cli.run_command(parser, parser.parse_args(message['argv']))
+            except SystemExit as e:
+                code = e.code
+            except Exception as e:
+                print(e)
+                code = 1
+            finally:
+                os.chdir(cwd)
+
+        if self.config.dirty and self.dirty_since is None:
+            self.dirty_since = time.monotonic()
+        return {'exit': code or 0, 'output': output.getvalue()}
+
+    def serve_once(self, timeout=None):
+        """Answers the next request, waiting up to timeout seconds for one
+
+        Returns:
+            True if a request was answered
+        """
+        selector = selectors.DefaultSelector()
+        selector.register(self.sock, selectors.EVENT_READ)
+        try:
+            if not selector.select(timeout):
+                return False
+        finally:
+            selector.close()
+
+        conn, _ = self.sock.accept()
+        with contextlib.closing(conn):
+            message = _receive(conn)
+            if message is not None:
+                _send(conn, self.handle(message))
+        return True
+
+    def serve_forever(self):
+        """Answers requests until stopped by SIGINT or SIGTERM"""
+        def stop(signum, frame):
+            self.running = False
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        try:
+            while self.running:
+                timeout = None
+                if self.dirty_since is not None:
+                    timeout = max(0, min(FLUSH_IDLE, self.dirty_since + FLUSH_MAX - time.monotonic()))
+                try:
+                    answered = self.serve_once(timeout if timeout is not None else 1.0)
+                except InterruptedError:
+                    continue
+                if self.dirty_since is not None:
+                    if not answered or time.monotonic() - self.dirty_since >= FLUSH_MAX:
+                        self.flush()
+        finally:
+            self.stop()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import collections
+import errno
+import fnmatch
+import os
+
+from sym import cache
+from sym import journal
+from sym import serializers
+from sym.config import ConfigYAML
+from sym.config import FILE
+from sym.config import new_link_table
+from sym.config import load_config
+from sym.config import write_file_atomic
+from sym.constants import ENV_SHARDS
+from sym.constants import ENV_TAGS
+from sym.exceptions import FileExistsError
+from sym.exceptions import FileNotFoundError
+from sym.lock import lock
+
+
+INDEX = 'index'
+DEFAULT_SHARD = 'common'
+
+
+def get_index_path(symconfig):
+    """Returns the path of the index of a sharded symconfig"""
+    return os.path.join(symconfig, INDEX)
+
+
+def get_selection():
+    """Returns the hostname, the tags and the explicitly requested shards of this host, see select_shards()"""
+    tags = [tag for tag in os.environ.get(ENV_TAGS, '').split(',') if tag]
+    requested = [name for name in os.environ.get(ENV_SHARDS, '').split(',') if name]
+    return os.uname().nodename, tags, requested
+
+
+def select_shards(index, hostname, tags=(), requested=()):
+    """Returns the names of the shards a host uses
+
+    Every shard in the index may list the hosts (glob patterns) and tags it applies to. A shard applies to a host that
+    matches one of its hosts or has one of its tags, a shard without any hosts or tags applies to every host. Shards
+    requested by name are used instead of the ones selected by host.
+
+    Parameters:
+        index     - The index of the sharded symconfig
+        hostname  - The name of the host
+        tags      - The tags of the host
+        requested - The names of the shards to use, if any
+
+    Returns:
+        A sorted list of shard names
+    """
+    shards = index.get('shards') or {}
+    if requested:
+        unknown = [name for name in requested if name not in shards]
+        if unknown:
+            raise FileNotFoundError('Unknown shards: {}'.format(', '.join(unknown)))
+        return sorted(set(requested))
+
+    selected = []
+    for name, conditions in sorted(shards.items()):
+        hosts = (conditions or {}).get('hosts') or []
+        shard_tags = (conditions or {}).get('tags') or []
+        if not hosts and not shard_tags or set(tags) & set(shard_tags) or \
+                any(fnmatch.fnmatchcase(hostname, host) for host in hosts):
+            selected.append(name)
+    return selected
+
+
+def load_sharded(symconfig):
+    """Loads the shards of a sharded symconfig selected for this host
+
+    A sharded symconfig is a directory holding an index and one config file per shard, only the selected shards are
+    read. New symlinks are added to the first shard requested by name, otherwise to the default shard of the index if
+    it is selected.
+
+    Parameters:
+        symconfig - The path to the symconfig directory
+
+    Returns:
+        A ShardedConfig
+    """
+    symconfig = os.path.realpath(symconfig)
+    with open(get_index_path(symconfig), 'r') as stream:
+        index_key = cache.stat_key(os.fstat(stream.fileno()))
+        index, fmt = serializers.loads(stream.read())
+
+    hostname, tags, requested = get_selection()
+    shards = collections.OrderedDict()
+    for name in select_shards(index, hostname, tags, requested):
+        shards[name] = _load_shard(os.path.join(symconfig, name), fmt)
+
+    if requested:
+        target = requested[0]
+    else:
+        target = index.get('default', DEFAULT_SHARD)
+    return ShardedConfig(symconfig, index_key, shards, target if target in shards else None)
+
+
+def _load_shard(path, fmt):
+    try:
+        return load_config(path)
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            raise
+    shard = ConfigYAML(fmt)  # Listed in the index but nothing was added to it yet
+    shard.path = path
+    return shard
+
+
+class ShardedConfig(object):
+    """The shards of a sharded symconfig selected for this host, used like a ConfigYAML holding all of them
+
+    symlinks, folds and copies hold the entries of every selected shard. When the config is written, every change made
+    to them goes to the shard holding the entry, or to the target shard for a new entry, and only the shards that
+    changed are written.
+
+    Attributes:
+        path   - The real path of the symconfig directory
+        shards - An OrderedDict of the selected shards, shard name to ConfigYAML
+        target - The name of the shard new entries are added to, None if no shard is selected for them
+    """
+
+    def __init__(self, path, index_key, shards, target):
+        self.path = path
+        self.shards = shards
+        self.target = target
+        self.deferred = False  # Saves only mark the config dirty, see sym.config.keep_resident()
+        self.dirty = False
+        self._index_key = index_key
+        self._reset()
+
+    def _reset(self):
+        symlinks = {}
+        self.folds = {}
+        self.copies = {}
+        for shard in self.shards.values():
+            symlinks.update(shard.symlinks)
+            self.folds.update(shard.folds)
+            self.copies.update(shard.copies)
+        self.symlinks = new_link_table(symlinks)
+        self._saved_folds = dict(self.folds)
+        self._saved_copies = dict(self.copies)
+
+    @property
+    def format(self):
+        shard = self.shards.get(self.target)
+        return shard.format if shard is not None else serializers.YAML
+
+    @format.setter
+    def format(self, fmt):
+        for shard in self.shards.values():
+            shard.format = fmt
+
+    @property
+    def storage(self):
+        shard = self.shards.get(self.target)
+        return shard.storage if shard is not None else FILE
+
+    @storage.setter
+    def storage(self, storage):
+        for shard in self.shards.values():
+            shard.storage = storage
+
+    def changed_on_disk(self):
+        """Returns True if something else wrote the index or any selected shard since they were read"""
+        try:
+            index_key = cache.stat_key(os.stat(get_index_path(self.path)))
+        except OSError:
+            index_key = None
+        return index_key != self._index_key or any(shard.changed_on_disk() for shard in self.shards.values())
+
+    def save(self):
+        """Writes the shards that changed, unless saves are deferred in which case the config is only marked dirty"""
+        if self.deferred:
+            self.dirty = True
+            return
+        self.write()
+
+    def flush(self):
+        """Writes the config if a deferred save left it dirty"""
+        if self.dirty:
+            self.write()
+
+    def write(self):
+        self.dirty = False
+        for destination, source in self.symlinks.changes:
+            shard = self._holder(lambda shard: destination in shard.symlinks)
+            if source is None:
+                if shard is not None:
+                    del shard.symlinks[destination]
+            else:
+                (shard or self._target()).symlinks[destination] = source
+
+        for tree in set(self._saved_folds) - set(self.folds):
+            shard = self._holder(lambda shard: tree in shard.folds)
+            if shard is not None:
+                del shard.folds[tree]
+        for tree, root in self.folds.items():
+            if self._saved_folds.get(tree) != root:
+                (self._holder(lambda shard: tree in shard.folds) or self._target()).folds[tree] = root
+
+        # A copy goes with its symlink entry, which the loop above put in place
+        for destination in set(self._saved_copies) - set(self.copies):
+            shard = self._holder(lambda shard: destination in shard.copies)
+            if shard is not None:
+                del shard.copies[destination]
+        for destination, digest in self.copies.items():
+            if self._saved_copies.get(destination) != digest:
+                shard = self._holder(lambda shard: destination in shard.symlinks) or self._target()
+                shard.copies[destination] = digest
+
+        for shard in self.shards.values():
+            if shard.is_modified():
+                shard.write()
+        self._reset()  # Writing merged in whatever other processes wrote to the shards
+
+    def _holder(self, holds):
+        for shard in self.shards.values():
+            if holds(shard):
+                return shard
+        return None
+
+    def _target(self):
+        if self.target is None:
+            raise FileNotFoundError('No shard of {} is selected to add symlinks to, select one with --shard'.format(
+                self.path))
+        return self.shards[self.target]
+
+
+def split_config(symconfig, rules=(), default=DEFAULT_SHARD):
+    """Splits a single file symconfig into a directory of shards
+
+    Every symlink goes to the first shard whose glob matches its destination as stored in the config, and to the
+    default shard if none does. The shards do not list any hosts or tags in the index, so every host keeps using all of
+    them until the index is edited.
+
+    Parameters:
+        symconfig - The path to the symconfig file
+        rules     - A list of (shard name, glob) tuples
+        default   - The name of the shard for the symlinks no rule matches, new symlinks are added to it as well
+
+    Returns:
+        An OrderedDict of shard name to the number of symlinks in it
+    """
+    symconfig = os.path.realpath(symconfig)
+    names = [default] + [name for name, _ in rules]
+    for name in names:
+        if not name or name != os.path.basename(name) or name.startswith('.') or name == INDEX or \
+                name.endswith('.journal'):
+            raise ValueError('Invalid shard name: {}'.format(name))
+
+    def shard_of(destination):
+        for name, pattern in rules:
+            if fnmatch.fnmatchcase(destination, pattern):
+                return name
+        return default
+
+    with lock(symconfig):
+        if os.path.isdir(symconfig):
+            raise FileExistsError('The symconfig is sharded already: {}'.format(symconfig))
+        config = load_config(symconfig)
+        shards = collections.OrderedDict((name, ConfigYAML(config.format, config.storage)) for name in names)
+        for destination, source in config.symlinks.items():
+            shards[shard_of(destination)].symlinks[destination] = source
+        for tree, root in config.folds.items():
+            shards[shard_of(root)].folds[tree] = root
+        for destination, digest in config.copies.items():
+            shards[shard_of(destination)].copies[destination] = digest
+        index = {'default': default, 'shards': dict((name, {}) for name in shards)}
+
+        import tempfile
+
+        # The shards keep the permissions of the config, the directory can be searched by whoever could read it
+        mode = os.stat(symconfig).st_mode & 0o7777
+        tmpdir = tempfile.mkdtemp(dir=os.path.dirname(symconfig), prefix='.' + os.path.basename(symconfig) + '.')
+        os.chmod(tmpdir, mode | (mode & 0o444) >> 2)
+        for name, shard in shards.items():
+            write_file_atomic(os.path.join(tmpdir, name),
+                              lambda stream, shard=shard: serializers.dump(shard.__getstate__(), stream, shard.format))
+        write_file_atomic(get_index_path(tmpdir),
+                          lambda stream: serializers.dump(index, stream, config.format, tagged=False))
+        for name in os.listdir(tmpdir):
+            os.chmod(os.path.join(tmpdir, name), mode)
+
+        # The old config is only removed once the complete shards took its place
+        unsplit = tmpdir + '.unsplit'
+        os.rename(symconfig, unsplit)
+        os.rename(tmpdir, symconfig)
+        os.unlink(unsplit)
+        journal.remove(symconfig)
+        cache.invalidate(symconfig)
+
+    return collections.OrderedDict((name, len(shard.symlinks)) for name, shard in shards.items())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Reports which managed dotfiles changed, either their symlink or, optionally, the content of their source
+
+Content changes are found by hashing every source with BLAKE2 and comparing the digests to a snapshot recorded
+earlier, e.g. when the dotfiles were last deployed. Digests are cached by the (inode, size, mtime_ns) of the file so
+that only the files modified since they were last hashed are read again, see sym.copies.hash_file for how files are
+read. The digests and the snapshot describe the state of this host's filesystem, so they are kept in the cache (see
+sym.cache).
+"""
+
+import collections
+import hashlib
+import os
+import stat
+
+from sym import cache
+from sym import verify
+from sym.copies import hash_file
+
+
+UNCHANGED = 'unchanged'  # The source has the content recorded in the snapshot
+MODIFIED = 'modified'    # The source has different content than recorded in the snapshot
+NEW = 'new'              # The source is not in the snapshot
+DELETED = 'deleted'      # The source is in the snapshot but no longer exists
+
+CONTENT_STATUSES = (UNCHANGED, MODIFIED, NEW, DELETED)
+STATUSES = verify.STATUSES + (MODIFIED, NEW, DELETED)
+
+
+class StatusResult(object):
+    """The state of a single symlink entry
+
+    Attributes:
+        destination - The destination path as stored in the config
+        source      - The source path as stored in the config
+        status      - The status of the symlink (see sym.verify.STATUSES) if it is not OK, otherwise the content
+                      status of its source if it changed, otherwise sym.verify.OK
+        link        - The status of the symlink, one of sym.verify.STATUSES
+        content     - The content status of the source, one of CONTENT_STATUSES, None unless content was checked
+        digest      - The hex digest of the source, None unless content was checked and the source exists
+    """
+
+    def __init__(self, destination, source, link, content=None, digest=None):
+        self.destination = destination
+        self.source = source
+        self.link = link
+        self.content = content
+        self.digest = digest
+        if link != verify.OK or content in (None, UNCHANGED):
+            self.status = link
+        else:
+            self.status = content
+
+    def __str__(self):
+        return '{}: {} -> {}'.format(self.status, self.destination, self.source)
+
+
+class ContentHashes(object):
+    """The cached digests of source files and the recorded snapshot
+
+    Attributes:
+        files    - A dict of the path of a file to its (inode, size, mtime_ns, digest)
+        snapshot - A dict of source, as stored in the config, to its digest, None if no snapshot was recorded
+    """
+
+    def __init__(self, files=None, snapshot=None):
+        self.files = files or {}
+        self.snapshot = snapshot
+
+    @classmethod
+    def load(cls, symconfig):
+        """Returns the digests and snapshot recorded for a symconfig"""
+        data = cache.load_data(symconfig, 'content')
+        if data is None:
+            return cls()
+        return cls(*data)
+
+    def save(self, symconfig):
+        """Records the digests and snapshot for a symconfig"""
+        cache.store_data(symconfig, 'content', (self.files, self.snapshot))
+
+    def digest(self, path):
+        """Returns the hex digest of a file or directory tree, None if it does not exist
+
+        The digest of a file is only computed again if its inode, size or mtime changed. The digest of a directory
+        covers the names, modes and digests of everything below it.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if stat.S_ISDIR(st.st_mode):
+            return self._digest_tree(path)
+
+        key = cache.stat_key(st)
+        cached = self.files.get(path)
+        if cached is not None and tuple(cached[:3]) == key:
+            return cached[3]
+
+        digest = hash_file(path, st.st_size)
+        if not cache.is_racy(st):  # Too recent to tell apart further modifications
+            self.files[path] = key + (digest,)
+        return digest
+
+    def _digest_tree(self, directory):
+        tree = hashlib.blake2b()
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest = self.digest(path)
+                tree.update('{}\0{}\0'.format(os.path.relpath(path, directory), digest).encode('utf-8'))
+        return tree.hexdigest()
+
+
+def check_content(symlinks, resolver, hashes, jobs=verify.DEFAULT_JOBS):
+    """Hashes every source of the symlinks in a bounded thread pool and compares them to the snapshot
+
+    Hashing releases the GIL while it reads, so the sources are hashed concurrently. Every source is hashed once, even
+    if several symlinks share it.
+
+    Parameters:
+        symlinks - A mapping of destination to source paths, as stored in ConfigYAML.symlinks
+        resolver - The sym.paths.PathResolver to resolve paths with
+        hashes   - The ContentHashes to use and update
+        jobs     - The maximum number of files to hash at once
+
+    Returns:
+        A dict of source, as stored in the config, to a tuple of its content status and its digest
+    """
+    sources = sorted(set(symlinks.values()))
+    paths = [resolver.resolve(source) for source in sources]
+    if jobs <= 1 or len(paths) <= 1:
+        digests = [hashes.digest(path) for path in paths]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+            digests = list(executor.map(hashes.digest, paths))
+
+    snapshot = hashes.snapshot or {}
+    changes = {}
+    for source, digest in zip(sources, digests):
+        if digest is None:
+            changes[source] = (DELETED if source in snapshot else NEW, None)
+        elif source not in snapshot:
+            changes[source] = (NEW, digest)
+        else:
+            changes[source] = (UNCHANGED if snapshot[source] == digest else MODIFIED, digest)
+    return changes
+
+
+def record_snapshot(hashes, changes):
+    """Makes the current digests of the sources the snapshot later changes are compared to
+
+    Parameters:
+        hashes  - The ContentHashes to record the snapshot in
+        changes - The outcome of check_content()
+    """
+    hashes.snapshot = dict((source, digest) for source, (status, digest) in changes.items() if digest is not None)
+
+
+def check_status(symlinks, resolver, jobs=verify.DEFAULT_JOBS, hashes=None, copies=()):
+    """Checks the state of every symlink entry and, if hashes are given, the content of every source
+
+    Parameters:
+        symlinks - A mapping of destination to source paths, as stored in ConfigYAML.symlinks
+        resolver - The sym.paths.PathResolver to resolve paths with
+        jobs     - The maximum number of filesystem checks to run at once
+        hashes   - The ContentHashes to compare the sources to, None to only check the symlinks
+        copies   - The destinations materialized as copies, see sym.verify.verify_links
+
+    Returns:
+        A tuple of a list of StatusResult in the order of symlinks, and the outcome of check_content() or None
+    """
+    links = verify.verify_links(symlinks, resolver, jobs, copies=copies)
+    if hashes is None:
+        return [StatusResult(link.destination, link.source, link.status) for link in links], None
+
+    changes = check_content(symlinks, resolver, hashes, jobs)
+    return [StatusResult(link.destination, link.source, link.status, *changes[link.source]) for link in links], changes
+
+
+def summarize(results):
+    """Returns a Counter of how many results there are for each status"""
+    counts = collections.Counter(dict.fromkeys(STATUSES, 0))
+    counts.update(result.status for result in results)
+    return counts
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import aio
+from sym.config import load_config
+from sym.exceptions import FileExistsError
+
+
+class TestAio(unittest.TestCase):
+    """Tests the asyncio facade of sym.api"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        os.chdir(self.homedir)
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        self.symconfig = os.path.join(self.testrepo, 'symconfig')
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def read_symconfig(self):
+        with open(self.symconfig, 'r') as stream:
+            return stream.read()
+
+    def test_aio(self):
+        """Test concurrent adds share one config and are saved together"""
+        sources = [os.path.join(self.testrepo, 'linkme{}'.format(i)) for i in range(8)]
+        links = [os.path.join(self.homedir, '.linkme{}'.format(i)) for i in range(8)]
+        for source in sources:
+            open(source, 'a').close()
+
+        async def run():
+            async with aio.Sym(jobs=4, flush_delay=60) as sym:
+                await sym.init(self.testrepo)
+                await asyncio.gather(*(sym.add(source, link) for source, link in zip(sources, links)))
+                self.assertTrue(sym.config.dirty)
+                self.assertNotIn('.linkme', self.read_symconfig())  # Not written yet
+
+                with self.assertRaises(FileExistsError):
+                    await sym.add(sources[1], links[0])
+
+                results = await sym.verify()
+                self.assertEqual([result.status for result in results], ['ok'] * 8)
+
+                os.remove(links[0])
+                results = await sym.apply(dry_run=True)
+                self.assertEqual([result.destination for result in results if result.status == 'created'],
+                                 ['.linkme0'])
+
+                results = await sym.remove([links[1]])
+                self.assertEqual([result.status for result in results], ['removed'])
+
+        asyncio.run(run())
+        for source, link in zip(sources[2:], links[2:]):
+            self.assertEqual(os.readlink(link), source)
+        self.assertFalse(os.path.lexists(links[1]))
+        config = load_config(self.symconfig)
+        self.assertEqual(sorted(config.symlinks), ['.linkme{}'.format(i) for i in range(8) if i != 1])
+
+    def test_aio_coalesces_saves(self):
+        """Test changes are written once the flush delay passed"""
+        source = os.path.join(self.testrepo, 'linkme')
+        open(source, 'a').close()
+
+        async def run():
+            sym = aio.Sym(flush_delay=0)
+            await sym.init(self.testrepo)
+            await sym.add(source, os.path.join(self.homedir, '.linkme'))
+            await sym.add(source, os.path.join(self.homedir, '.linkme2'))
+            await asyncio.sleep(0.2)
+            self.assertFalse(sym.config.dirty)
+            self.assertIn('.linkme2', self.read_symconfig())
+            await sym.close()
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
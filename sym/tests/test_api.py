@@ -23,6 +23,7 @@
 #  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import argparse
+import io
 import os
 import shutil
 import tempfile
@@ -40,9 +41,15 @@ class TestAPI(unittest.TestCase):
     def setUp(self):
         os.environ["HOME"] = tempfile.mkdtemp('homedir')
         self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
         self.testrepo = tempfile.mkdtemp('testrepo')
 
     def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
         shutil.rmtree(self.homedir)
         shutil.rmtree(self.testrepo)
 
@@ -73,6 +80,94 @@ class TestAPI(unittest.TestCase):
         api.init(relargs)
         self.assertTrue(os.path.lexists(sysconfig_path))
 
+    def test_api_add_many(self):
+        """Test adding a batch of symlinks"""
+        args = argparse.Namespace(basedir=self.testrepo)
+        api.init(args)
+
+        source_a = os.path.join(self.testrepo, 'linkme_a')
+        source_b = os.path.join(self.testrepo, 'linkme_b')
+        open(source_a, 'a').close()
+        open(source_b, 'a').close()
+        link_a = os.path.join(self.homedir, '.link_a')
+        link_b = os.path.join(self.homedir, '.link_b')
+
+        failures = api.add_many([
+            (source_a, link_a),
+            (source_b, link_b),
+            (os.path.join(self.testrepo, 'missing'), os.path.join(self.homedir, '.missing')),
+            (source_b, link_a),  # conflicts with the first entry
+            ('too', 'many', 'paths'),
+        ])
+
+        self.assertEqual(len(failures), 3)
+        self.assertIsInstance(failures[0][1], FileNotFoundError)
+        self.assertIsInstance(failures[1][1], FileExistsError)
+        self.assertIsInstance(failures[2][1], ValueError)
+        self.assertEqual(os.path.realpath(link_a), source_a)
+        self.assertEqual(os.path.realpath(link_b), source_b)
+
+        config = api.load_config(api.get_symconfig_path())
+        self.assertEqual(config.symlinks['.link_a'], source_a)
+        self.assertEqual(config.symlinks['.link_b'], source_b)
+
+    def test_api_remove(self):
+        """Test removing every symlink to a source"""
+        api.init(argparse.Namespace(basedir=self.testrepo))
+        source = os.path.join(self.testrepo, 'linkme')
+        open(source, 'a').close()
+        api.add_many([(source, os.path.join(self.homedir, '.link_a')), (source, os.path.join(self.homedir, '.link_b'))])
+
+        results = api.remove(argparse.Namespace(paths=[source], recursive=False))
+        self.assertEqual([result.destination for result in results], ['.link_a', '.link_b'])
+        self.assertFalse(os.path.lexists(os.path.join(self.homedir, '.link_a')))
+        self.assertEqual(api.load_config(api.get_symconfig_path()).symlinks, {})
+        self.assertRaises(FileNotFoundError, api.remove, argparse.Namespace(paths=[source], recursive=False))
+
+    def test_api_legacy_absolute_keys(self):
+        """Test the entries earlier versions stored under absolute paths within $HOME are still found"""
+        api.init(argparse.Namespace(basedir=self.testrepo))
+        sources = [os.path.join(self.testrepo, name) for name in ('a', 'b')]
+        legacy = [os.path.join(self.homedir, name) for name in ('.a', '.b')]
+        config = api.load_config(api.get_symconfig_path())
+        for source, destination in zip(sources, legacy):
+            open(source, 'a').close()
+            os.symlink(source, destination)
+            config.symlinks[destination] = source
+        config.save()
+
+        links = api.list_links(argparse.Namespace(path=self.homedir, pattern=None, source=None))
+        self.assertEqual([destination for destination, _ in links], legacy)
+        results = api.remove(argparse.Namespace(paths=['~/.a'], recursive=False))
+        self.assertEqual([result.destination for result in results], [legacy[0]])
+        api.add(argparse.Namespace(source=sources[1], destination=legacy[1], fold=False, copy=False))
+        config = api.load_config(api.get_symconfig_path())
+        self.assertEqual(config.symlinks, {'.b': os.path.realpath(sources[1])})
+
+    def test_api_read_manifest(self):
+        """Test parsing a manifest of source and destination pairs"""
+        manifest = io.StringIO('# comment\n\nsource dest\n"with space" dest2\n')
+        self.assertEqual(list(api.read_manifest(manifest)), [['source', 'dest'], ['with space', 'dest2']])
+
+    def test_api_migrate(self):
+        """Test converting the symconfig between file formats"""
+        args = argparse.Namespace(basedir=self.testrepo)
+        api.init(args)
+        symconfig = api.get_symconfig_path()
+        config = api.load_config(symconfig)
+        config.symlinks['.testfile'] = 'git/dotfiles/testfile'
+        config.save()
+
+        api.migrate(argparse.Namespace(format='json', storage=None))
+        config = api.load_config(symconfig)
+        self.assertEqual(config.format, 'json')
+        self.assertEqual(config.symlinks, {'.testfile': 'git/dotfiles/testfile'})
+
+        api.migrate(argparse.Namespace(format='yaml', storage=None))
+        config = api.load_config(symconfig)
+        self.assertEqual(config.format, 'yaml')
+        self.assertEqual(config.symlinks, {'.testfile': 'git/dotfiles/testfile'})
+
     ###
     ### API Helper Functions
     ###
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import apply
+from sym.paths import PathResolver
+
+
+class TestApply(unittest.TestCase):
+    """Tests materializing a config onto the filesystem"""
+
+    def setUp(self):
+        self.homedir = tempfile.mkdtemp('homedir')
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        self.resolver = PathResolver(self.homedir)
+        self.symlinks = {}
+        for name in ('a', 'b', 'c'):
+            open(os.path.join(self.testrepo, name), 'a').close()
+            self.symlinks[os.path.join('.config', 'app', name)] = os.path.join(self.testrepo, name)
+        self.symlinks['.d'] = os.path.join(self.testrepo, 'd')  # source does not exist
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def test_plan_links(self):
+        """Test entries are grouped by parent directory"""
+        groups = apply.plan_links(self.symlinks, self.resolver)
+        self.assertEqual(list(groups), [self.homedir, os.path.join(self.homedir, '.config', 'app')])
+        self.assertEqual(sorted(name for name, _, _, _ in groups[os.path.join(self.homedir, '.config', 'app')]),
+                         ['a', 'b', 'c'])
+
+    def test_apply_links(self):
+        """Test missing links are created and existing ones are classified"""
+        appdir = os.path.join(self.homedir, '.config', 'app')
+        os.makedirs(appdir)
+        os.symlink(os.path.join(self.testrepo, 'a'), os.path.join(appdir, 'a'))
+        open(os.path.join(appdir, 'b'), 'a').close()
+
+        results = apply.apply_links(self.symlinks, self.resolver)
+        statuses = dict((result.destination, result.status) for result in results)
+        self.assertEqual(statuses, {
+            os.path.join('.config', 'app', 'a'): apply.UNCHANGED,
+            os.path.join('.config', 'app', 'b'): apply.CONFLICT,
+            os.path.join('.config', 'app', 'c'): apply.CREATED,
+            '.d': apply.CONFLICT,
+        })
+        self.assertEqual(os.readlink(os.path.join(appdir, 'c')), os.path.join(self.testrepo, 'c'))
+        self.assertFalse(os.path.lexists(os.path.join(self.homedir, '.d')))
+
+    def test_apply_links_dry_run(self):
+        """Test a dry run does not touch the filesystem"""
+        results = apply.apply_links(self.symlinks, self.resolver, dry_run=True)
+        counts = apply.summarize(results)
+        self.assertEqual((counts[apply.CREATED], counts[apply.CONFLICT]), (3, 1))
+        self.assertEqual(os.listdir(self.homedir), [])
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import cache
+from sym.config import ConfigYAML
+from sym.config import load_config
+
+
+class TestCache(unittest.TestCase):
+    """Tests the cache of parsed configs"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.configpath = os.path.join(self.homedir, '.symconfig')
+
+        config = ConfigYAML()
+        config.symlinks['.testfile'] = 'git/dotfiles/testfile'
+        config.save()
+        self.age()
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+
+    def age(self):
+        """Backdate the config so that it is old enough to be cached"""
+        os.utime(self.configpath, ns=(10 ** 18, 10 ** 18))
+
+    def test_cache_hit(self):
+        """Test an unchanged config is loaded from the cache"""
+        load_config(self.configpath)
+        cachepath = cache.get_cache_path(self.configpath)
+        self.assertTrue(os.path.exists(cachepath))
+
+        st = os.stat(self.configpath)
+        cache.store(self.configpath, st, {'symlinks': {'.cached': 'cached'}}, 'yaml')
+        self.assertEqual(load_config(self.configpath).symlinks, {'.cached': 'cached'})
+
+    def test_cache_stale(self):
+        """Test a modified config is parsed again"""
+        load_config(self.configpath)
+        with open(self.configpath, 'a') as stream:
+            stream.write('# modified\n')
+        self.age()
+        st = os.stat(self.configpath)
+        self.assertIsNone(cache.load(self.configpath, st))
+        self.assertEqual(load_config(self.configpath).symlinks, {'.testfile': 'git/dotfiles/testfile'})
+        self.assertIsNotNone(cache.load(self.configpath, st))
+
+    def test_cache_corrupt(self):
+        """Test a corrupt cache is ignored and rebuilt"""
+        load_config(self.configpath)
+        with open(cache.get_cache_path(self.configpath), 'wb') as stream:
+            stream.write(b'\x00garbage')
+        self.assertEqual(load_config(self.configpath).symlinks, {'.testfile': 'git/dotfiles/testfile'})
+        self.assertIsNotNone(cache.load(self.configpath, os.stat(self.configpath)))
+
+    def test_cache_invalidated_on_save(self):
+        """Test saving a config removes its cache"""
+        config = load_config(self.configpath)
+        self.assertTrue(os.path.exists(cache.get_cache_path(self.configpath)))
+        config.save()
+        self.assertFalse(os.path.exists(cache.get_cache_path(self.configpath)))
+
+    def test_recent_config_not_cached(self):
+        """Test a config modified within the racy window is not cached"""
+        config = ConfigYAML()
+        config.save()
+        load_config(self.configpath)
+        self.assertFalse(os.path.exists(cache.get_cache_path(self.configpath)))
@@ -22,8 +22,13 @@
 #  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 #  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import contextlib
+import io
+import json
 import os
 import shutil
+import subprocess
+import sys
 import tempfile
 import unittest
 
@@ -36,9 +41,15 @@ class TestCLI(unittest.TestCase):
     def setUp(self):
         os.environ["HOME"] = tempfile.mkdtemp('homedir')
         self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
         self.testrepo = tempfile.mkdtemp()
 
     def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
         shutil.rmtree(self.homedir)
         shutil.rmtree(self.testrepo)
 
@@ -64,6 +75,15 @@ class TestCLI(unittest.TestCase):
         with self.assertRaises(SystemExit):
             parser.parse_known_args('verify -h'.split())
 
+    def test_cli_lazy_imports(self):
+        """Test building the parser does not import sym.api, PyYAML or the modules the commands run in"""
+        modules = ('sym.api', 'yaml', 'sym.config', 'sym.fleet', 'sym.shards', 'sym.verify', 'sym.copies', 'sym.query')
+        code = ('import sys; from sym import cli; cli.setup_parser(); '
+                'print(" ".join(sorted(m for m in {!r} if m in sys.modules)))'.format(modules))
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=root)
+        self.assertEqual(output.strip(), b'')
+
     def test_cli_init(self):
         """Test initializing a symconfig"""
         parser = cli.setup_parser()
@@ -123,3 +143,161 @@ class TestCLI(unittest.TestCase):
         test_path_d = os.path.join(self.testrepo, 'linkme_rel_testrepo')
         cli.parse_args(parser, ['add', tmp_abs_path, test_path_d])
         self.assertTrue(os.path.exists(test_path_d))
+
+    def test_cli_add_from_file(self):
+        """Test adding symlinks listed in a manifest"""
+        parser = cli.setup_parser()
+        cli.parse_args(parser, ['init', self.testrepo])
+
+        manifest = os.path.join(self.testrepo, 'manifest')
+        with open(manifest, 'w') as stream:
+            for name in ('one', 'two'):
+                open(os.path.join(self.testrepo, name), 'a').close()
+                stream.write('{} {}\n'.format(os.path.join(self.testrepo, name),
+                                              os.path.join(self.homedir, '.' + name)))
+            stream.write('{} {}\n'.format(os.path.join(self.testrepo, 'missing'),
+                                          os.path.join(self.homedir, '.missing')))
+
+        self.assertEqual(cli.parse_args(parser, ['add', '--from-file', manifest]), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.homedir, '.one')))
+        self.assertTrue(os.path.exists(os.path.join(self.homedir, '.two')))
+        self.assertFalse(os.path.lexists(os.path.join(self.homedir, '.missing')))
+
+    def test_cli_verify(self):
+        """Test verifying symlinks reports drift through the exit code"""
+        parser = cli.setup_parser()
+        cli.parse_args(parser, ['init', self.testrepo])
+
+        test_path = os.path.join(self.testrepo, 'linkme')
+        test_link = os.path.join(self.homedir, '.symlink')
+        open(test_path, 'a').close()
+        cli.parse_args(parser, ['add', test_path, test_link])
+        self.assertEqual(cli.parse_args(parser, ['verify']), 0)
+
+        self.assertEqual(cli.parse_args(parser, ['verify', '--incremental']), 0)
+
+        os.remove(test_link)
+        self.assertEqual(cli.parse_args(parser, ['verify', '--jobs', '2']), 1)
+        self.assertEqual(cli.parse_args(parser, ['verify', '--incremental']), 1)
+        self.assertEqual(cli.parse_args(parser, ['verify', '--full']), 1)
+
+    def test_cli_missing_config(self):
+        """Test a command run before sym init reports the missing config and leaves nothing behind"""
+        parser = cli.setup_parser()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(cli.parse_args(parser, ['verify']), 1)
+        self.assertIn('run sym init first', output.getvalue())
+        self.assertEqual(os.listdir(self.homedir), [])
+
+    def test_cli_list(self):
+        """Test listing symlinks as NDJSON"""
+        parser = cli.setup_parser()
+        cli.parse_args(parser, ['init', self.testrepo])
+
+        test_path = os.path.join(self.testrepo, 'linkme')
+        open(test_path, 'a').close()
+        cli.parse_args(parser, ['add', test_path, os.path.join(self.homedir, '.symlink')])
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertIsNone(cli.parse_args(parser, ['--format', 'ndjson', 'list', self.homedir]))
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(records[0], {'type': 'entry', 'command': 'list', 'destination': '.symlink',
+                                      'source': test_path})
+        self.assertEqual(records[1]['counts'], {'listed': 1})
+
+    def test_cli_ndjson(self):
+        """Test streaming one JSON record per entry followed by a summary"""
+        parser = cli.setup_parser()
+        cli.parse_args(parser, ['init', self.testrepo])
+
+        test_path = os.path.join(self.testrepo, 'linkme')
+        test_link = os.path.join(self.homedir, '.symlink')
+        open(test_path, 'a').close()
+
+        def run(*argv):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                code = cli.parse_args(parser, ['--format', 'ndjson'] + list(argv))
+            return code, [json.loads(line) for line in output.getvalue().splitlines()]
+
+        code, records = run('add', test_path, test_link)
+        self.assertIn(code, (None, 0))
+        self.assertEqual(records[0], {'type': 'entry', 'command': 'add', 'source': test_path,
+                                      'destination': '.symlink', 'status': 'added'})
+        self.assertEqual(records[1]['counts'], {'added': 1, 'failed': 0})
+
+        code, records = run('add', os.path.join(self.testrepo, 'missing'), test_link)
+        self.assertEqual(code, 1)
+        self.assertEqual(records[0]['type'], 'error')
+        self.assertEqual(records[1]['counts'], {'added': 0, 'failed': 1})
+
+        code, records = run('verify')
+        self.assertEqual(code, 0)
+        self.assertEqual([record['type'] for record in records], ['entry', 'summary'])
+        self.assertEqual(records[0]['status'], 'ok')
+        self.assertEqual(records[1]['counts']['ok'], 1)
+        self.assertGreaterEqual(records[1]['elapsed'], 0)
+
+        os.remove(test_link)
+        code, records = run('apply', '--dry-run')
+        self.assertEqual(records[0]['status'], 'created')
+        self.assertEqual(records[1]['note'], 'dry run')
+
+        code, records = run('remove', os.path.join(self.homedir, '.missing'))
+        self.assertEqual(code, 1)
+        self.assertEqual([record['type'] for record in records], ['error', 'summary'])
+
+        code, records = run('remove', test_link)
+        self.assertEqual(code, 0)
+        self.assertEqual(records[0]['status'], 'forgotten')
+        self.assertEqual(records[1]['counts'], {'removed': 0, 'forgotten': 1, 'conflict': 0})
+
+    def test_cli_status(self):
+        """Test showing the dotfiles whose source changed since the snapshot"""
+        parser = cli.setup_parser()
+        cli.parse_args(parser, ['init', self.testrepo])
+
+        test_path = os.path.join(self.testrepo, 'linkme')
+        open(test_path, 'a').close()
+        cli.parse_args(parser, ['add', test_path, os.path.join(self.homedir, '.symlink')])
+
+        self.assertEqual(cli.parse_args(parser, ['status']), 0)
+        self.assertEqual(cli.parse_args(parser, ['status', '--content']), 1)
+        self.assertEqual(cli.parse_args(parser, ['status', '--snapshot']), 1)
+        self.assertEqual(cli.parse_args(parser, ['status', '--content']), 0)
+
+        with open(test_path, 'w') as stream:
+            stream.write('changed')
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(cli.parse_args(parser, ['status', '--content']), 1)
+        self.assertEqual(output.getvalue().splitlines()[0], 'modified: .symlink -> {}'.format(test_path))
+
+    def test_cli_apply(self):
+        """Test creating every symlink in the config"""
+        parser = cli.setup_parser()
+        cli.parse_args(parser, ['init', self.testrepo])
+
+        test_path = os.path.join(self.testrepo, 'linkme')
+        test_link = os.path.join(self.homedir, '.symlink')
+        open(test_path, 'a').close()
+        cli.parse_args(parser, ['add', test_path, test_link])
+        os.remove(test_link)
+
+        self.assertEqual(cli.parse_args(parser, ['apply', '--dry-run']), 0)
+        self.assertFalse(os.path.lexists(test_link))
+        self.assertEqual(cli.parse_args(parser, ['apply']), 0)
+        self.assertEqual(os.path.realpath(test_link), test_path)
+
+    def test_cli_profile(self):
+        """Test profiling a command"""
+        parser = cli.setup_parser()
+        cli.parse_args(parser, ['init', self.testrepo])
+
+        output = os.path.join(self.testrepo, 'profile.prom')
+        args = ['--profile-format', 'prometheus', '--profile-output', output, 'verify']
+        self.assertEqual(cli.parse_args(parser, args), 0)
+        with open(output) as stream:
+            self.assertIn('sym_span_calls{command="verify",span="api.verify"} 1', stream.read())
@@ -26,9 +26,13 @@ import os
 import tempfile
 import unittest
 import shutil
-import yaml
 
+from sym import config as sym_config
+from sym import serializers
+from sym.config import CompactLinkTable
 from sym.config import ConfigYAML
+from sym.config import LinkTable
+from sym.config import load_config
 
 
 class TestConfig(unittest.TestCase):
@@ -38,16 +42,19 @@ class TestConfig(unittest.TestCase):
         self.configfile, self.configpath = tempfile.mkstemp()
         os.environ["HOME"] = tempfile.mkdtemp('homedir')
         self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
 
     def tearDown(self):
         os.remove(self.configpath)
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
         shutil.rmtree(self.homedir)
 
     def loadConfig(self, configpath):
-        stream = open(configpath, 'r')
-        config = yaml.load(stream)
-        stream.close()
-        return config
+        return load_config(configpath)
 
     def test_create_config(self):
         """Simply test that the config file was created"""
@@ -74,3 +81,121 @@ class TestConfig(unittest.TestCase):
         for symlink in config.symlinks.items():
             print(i, ": ", symlink)
             i += 1
+
+    def test_save_json(self):
+        """Test a config saved as JSON is loaded back as JSON"""
+        config = ConfigYAML(serializers.JSON)
+        config.symlinks['.testfile'] = 'git/dotfiles/testfile'
+        config.save()
+        configpath = os.path.join(self.homedir, '.symconfig')
+        with open(configpath) as stream:
+            self.assertEqual(stream.read(1), '{')
+
+        config = self.loadConfig(configpath)
+        self.assertEqual(config.format, serializers.JSON)
+        self.assertEqual(config.symlinks, {'.testfile': 'git/dotfiles/testfile'})
+
+    def test_load_legacy_yaml(self):
+        """Test loading a config written by earlier versions of sym"""
+        with open(self.configpath, 'w') as stream:
+            stream.write('!SymConfig\nsymlinks: {.testfile: git/dotfiles/testfile}\n')
+        config = self.loadConfig(self.configpath)
+        self.assertEqual(config.format, serializers.YAML)
+        self.assertEqual(config.symlinks, {'.testfile': 'git/dotfiles/testfile'})
+
+    def test_load_rejects_python_tags(self):
+        """Test arbitrary Python objects cannot be constructed from a config"""
+        with open(self.configpath, 'w') as stream:
+            stream.write('!!python/object/apply:os.system [echo]\n')
+        self.assertRaises(Exception, self.loadConfig, self.configpath)
+
+    def test_yaml_tag_is_private(self):
+        """Test loading a config leaves the safe loader of PyYAML alone"""
+        import yaml
+
+        with open(self.configpath, 'w') as stream:
+            stream.write('!SymConfig\nsymlinks: {.testfile: git/dotfiles/testfile}\n')
+        self.loadConfig(self.configpath)
+        self.assertRaises(yaml.YAMLError, yaml.safe_load, '!SymConfig\nsymlinks: {}\n')
+
+
+class TestCompactLinkTable(unittest.TestCase):
+    """Tests the CompactLinkTable behaves like a LinkTable"""
+
+    LINKS = {
+        '.bashrc': '/repo/bash/bashrc',
+        '.vim/vimrc': '/repo/vim/vimrc',
+        '.vim/colors/dark.vim': '/repo/vim/colors/dark.vim',
+        '/etc/hosts': '/repo/etc/hosts',
+        '.profile': '/repo/bash/bashrc',
+    }
+
+    def test_mapping(self):
+        """Test the same changes give the same mapping and record the same changes"""
+        tables = [LinkTable(self.LINKS), CompactLinkTable(self.LINKS)]
+        for symlinks in tables:
+            symlinks.preimages = {}
+            symlinks['.vim/vimrc'] = '/repo/nvim/init.vim'
+            symlinks['/'] = '/repo/root'
+            del symlinks['.bashrc']
+            symlinks.pop('.missing', None)
+            symlinks.setdefault('.inputrc', '/repo/inputrc')
+            symlinks.update({'.vim': '/repo/vim'})
+        linktable, compact = tables
+        self.assertEqual(compact, dict(linktable))
+        self.assertEqual(len(compact), len(linktable))
+        self.assertEqual(compact.changes, linktable.changes)
+        self.assertEqual(compact.preimages, {'.vim/vimrc': '/repo/vim/vimrc', '/': None, '.bashrc': '/repo/bash/bashrc',
+                                             '.inputrc': None, '.vim': None})
+        self.assertEqual(linktable.preimages, compact.preimages)
+        self.assertEqual(sorted(compact), sorted(linktable))
+        self.assertEqual(sorted(compact.values()), sorted(linktable.values()))
+        self.assertNotIn('.bashrc', compact)
+        self.assertNotIn('.vim/colors', compact)
+        self.assertRaises(KeyError, compact.__getitem__, '.bashrc')
+
+    def test_queries(self):
+        """Test the prefix lookups and the reverse index give the same results"""
+        linktable, compact = LinkTable(self.LINKS), CompactLinkTable(self.LINKS)
+        compact['.profile'] = '/repo/profile'
+        linktable['.profile'] = '/repo/profile'
+        for symlinks in (linktable, compact):
+            self.assertEqual(symlinks.destinations_of('/repo/bash/bashrc'), ['.bashrc'])
+            self.assertEqual(symlinks.destinations_of('/repo/bash'), [])
+        for directory in (os.curdir, '.vim', '/repo/vim', '/repo', '/etc/'):
+            self.assertEqual(compact.within(directory), linktable.within(directory))
+            self.assertEqual(list(compact.below(directory, sources=True)),
+                             list(linktable.below(directory, sources=True)))
+        self.assertEqual(list(compact.starting_with('.v')), list(linktable.starting_with('.v')))
+
+    def test_clear(self):
+        """Test clearing records the removal of every destination"""
+        compact = CompactLinkTable(self.LINKS)
+        compact.clear()
+        self.assertEqual(len(compact), 0)
+        self.assertEqual(sorted(compact.changes), sorted((destination, None) for destination in self.LINKS))
+        self.assertEqual(compact.destinations_of('/repo/bash/bashrc'), [])
+
+    def test_config_round_trip(self):
+        """Test a large config is loaded into a CompactLinkTable and saved unchanged"""
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.addCleanup(shutil.rmtree, os.environ["HOME"])
+        compact_links = sym_config.COMPACT_LINKS
+        sym_config.COMPACT_LINKS = len(self.LINKS)
+        try:
+            config = ConfigYAML.from_state({'symlinks': self.LINKS})
+        finally:
+            sym_config.COMPACT_LINKS = compact_links
+
+        self.assertIsInstance(config.symlinks, CompactLinkTable)
+        cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(os.environ["HOME"], '.cache')
+        try:
+            config.save()
+        finally:
+            if cachehome is None:
+                del os.environ["XDG_CACHE_HOME"]
+            else:
+                os.environ["XDG_CACHE_HOME"] = cachehome
+        with open(os.path.join(os.environ["HOME"], '.symconfig')) as stream:
+            self.assertEqual(serializers.loads(stream.read())[0]['symlinks'], self.LINKS)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import argparse
+import errno
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from sym import api
+from sym import apply
+from sym import cli
+from sym import copies
+from sym import verify
+from sym.config import load_config
+from sym.exceptions import FileExistsError
+
+
+class TestCopies(unittest.TestCase):
+    """Tests materializing sources as copies"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        os.chdir(self.homedir)
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        self.source = os.path.join(self.testrepo, 'bashrc')
+        with open(self.source, 'w') as stream:
+            stream.write('set -o vi\n')
+        os.chmod(self.source, 0o640)
+        self.destination = os.path.join(self.homedir, '.bashrc')
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def add(self, source, destination, copy=True):
+        api.add(argparse.Namespace(source=source, destination=destination, fold=False, copy=copy))
+
+    def write(self, path, content):
+        with open(path, 'w') as stream:
+            stream.write(content)
+
+    def read(self, path):
+        with open(path, 'r') as stream:
+            return stream.read()
+
+    def test_hash_file(self):
+        """Test small files are read in blocks and large ones through mmap to the same digest"""
+        path = os.path.join(self.testrepo, 'big')
+        content = b'x' * (copies.MMAP_THRESHOLD + 1)
+        with open(path, 'wb') as stream:
+            stream.write(content)
+        self.assertEqual(copies.hash_file(path), hashlib.blake2b(content).hexdigest())
+        self.assertEqual(copies.hash_file(path, 0), hashlib.blake2b(content).hexdigest())
+
+    def test_clone_file(self):
+        """Test a clone has the content and mode of its source"""
+        method = copies.clone_file(self.source, self.destination)
+        self.assertIn(method, ('reflink', 'copy_file_range', 'sendfile', 'read'))
+        self.assertEqual(self.read(self.destination), 'set -o vi\n')
+        self.assertEqual(stat.S_IMODE(os.stat(self.destination).st_mode), 0o640)
+        with self.assertRaises(OSError):
+            copies.clone_file(self.source, self.destination)  # Never overwrites
+        with self.assertRaises(ValueError):
+            copies.clone_file(self.testrepo, os.path.join(self.homedir, 'dir'))
+        self.assertFalse(os.path.lexists(os.path.join(self.homedir, 'dir')))
+
+    def test_clone_fallback(self):
+        """Test the data is read and written where the kernel can not copy it"""
+        def unsupported(*args):
+            raise OSError(errno.ENOSYS, os.strerror(errno.ENOSYS))
+
+        saved = os.copy_file_range, os.sendfile
+        os.copy_file_range = os.sendfile = unsupported
+        try:
+            method = copies.clone_file(self.source, self.destination)
+        finally:
+            os.copy_file_range, os.sendfile = saved
+        self.assertIn(method, ('reflink', 'read'))
+        self.assertEqual(self.read(self.destination), 'set -o vi\n')
+
+    def test_copy_file(self):
+        """Test a copy is skipped when the destination has the content of the source already"""
+        digest = copies.copy_file(self.source, self.destination)
+        self.assertEqual(digest, copies.digest_of(self.destination))
+        inode = os.stat(self.destination).st_ino
+        self.assertEqual(copies.copy_file(self.source, self.destination), digest)
+        self.assertEqual(os.stat(self.destination).st_ino, inode)
+
+        self.write(self.source, 'set -o emacs\n')
+        self.assertNotEqual(copies.copy_file(self.source, self.destination), digest)
+        self.assertEqual(self.read(self.destination), 'set -o emacs\n')
+        self.assertEqual(stat.S_IMODE(os.stat(self.destination).st_mode), 0o640)
+        self.assertEqual(sorted(os.listdir(self.homedir)), ['.bashrc'])
+
+        # A destination of another size is replaced without hashing it
+        self.write(self.destination, 'set -o vi\n')
+        hashed = []
+        hash_file = copies.hash_file
+        copies.hash_file = lambda path, size=None: hashed.append(path) or hash_file(path, size)
+        try:
+            copies.copy_file(self.source, self.destination)
+        finally:
+            copies.hash_file = hash_file
+        self.assertEqual(hashed, [self.source])
+        self.assertEqual(self.read(self.destination), 'set -o emacs\n')
+
+    def test_add_copy(self):
+        """Test adding a copy records it, and verify, apply and remove treat it as one"""
+        api.init(argparse.Namespace(basedir=self.testrepo))
+        self.add(self.source, self.destination)
+        self.assertFalse(os.path.islink(self.destination))
+        config = load_config(api.get_symconfig_path())
+        self.assertEqual(config.copies, {'.bashrc': copies.digest_of(self.source)})
+
+        results = api.verify(argparse.Namespace(jobs=1, incremental=True))
+        self.assertEqual([result.status for result in results], [verify.OK])
+
+        self.write(self.source, 'set -o emacs\n')
+        results = api.verify(argparse.Namespace(jobs=1, incremental=True))
+        self.assertEqual([result.status for result in results], [verify.OUTDATED])
+        results = api.apply(argparse.Namespace(dry_run=False, copy=False))
+        self.assertEqual([result.status for result in results], [apply.UPDATED])
+        self.assertEqual(self.read(self.destination), 'set -o emacs\n')
+        self.assertEqual(load_config(api.get_symconfig_path()).copies['.bashrc'], copies.digest_of(self.source))
+
+        self.write(self.destination, 'edited\n')
+        results = api.apply(argparse.Namespace(dry_run=False, copy=False))
+        self.assertEqual([(result.status, result.reason) for result in results],
+                         [(apply.CONFLICT, 'destination was modified')])
+        results = api.remove(argparse.Namespace(paths=[self.destination], recursive=False))
+        self.assertEqual([result.status for result in results], ['conflict'])
+
+        self.write(self.destination, 'set -o emacs\n')
+        results = api.remove(argparse.Namespace(paths=[self.destination], recursive=False))
+        self.assertEqual([result.status for result in results], ['removed'])
+        self.assertFalse(os.path.lexists(self.destination))
+        self.assertEqual(load_config(api.get_symconfig_path()).copies, {})
+
+    def test_add_copy_conflicts(self):
+        """Test a copy does not replace a different file and is rolled back with its transaction"""
+        api.init(argparse.Namespace(basedir=self.testrepo))
+        self.write(self.destination, 'mine\n')
+        with self.assertRaises(FileExistsError):
+            self.add(self.source, self.destination)
+        with self.assertRaises(ValueError):
+            self.add(self.testrepo, os.path.join(self.homedir, '.repo'))
+
+        other = os.path.join(self.homedir, '.other')
+        os.symlink(self.source, other)
+        self.add(self.source, other)
+        self.assertFalse(os.path.islink(other))
+        self.assertEqual(self.read(other), 'set -o vi\n')
+
+        failures = api.add_many([(self.source, os.path.join(self.homedir, '.link')), ('bad',)], atomic=True)
+        self.assertEqual(len(failures), 1)
+
+    def test_apply_copy(self):
+        """Test apply --copy replaces the symlinks by copies"""
+        parser = cli.setup_parser()
+        cli.parse_args(parser, ['init', self.testrepo])
+        cli.parse_args(parser, ['add', self.source, self.destination])
+        self.assertTrue(os.path.islink(self.destination))
+
+        self.assertEqual(cli.parse_args(parser, ['apply', '--copy']), 0)
+        self.assertFalse(os.path.islink(self.destination))
+        self.assertEqual(list(load_config(api.get_symconfig_path()).copies), ['.bashrc'])
+        self.assertEqual(cli.parse_args(parser, ['verify']), 0)
+
+        os.remove(self.destination)
+        self.assertEqual(cli.parse_args(parser, ['apply']), 0)
+        self.assertFalse(os.path.islink(self.destination))
+
+
+if __name__ == '__main__':
+    unittest.main()
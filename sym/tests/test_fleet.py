@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import argparse
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import api
+from sym import cli
+from sym import fleet
+
+
+class TestFleet(unittest.TestCase):
+    """Tests applying one config repo across many home directories"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        os.chdir(self.homedir)
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        self.homes = [os.path.join(self.homedir, 'svc{}'.format(i)) for i in range(3)]
+        for home in self.homes:
+            os.mkdir(home)
+            api.init(argparse.Namespace(basedir=self.testrepo), userhome=home)
+
+        self.source = os.path.join(self.testrepo, 'linkme')
+        open(self.source, 'a').close()
+        api.add(argparse.Namespace(source=self.source, destination=os.path.join(self.homes[0], '.linkme'), fold=False,
+                                   copy=False), userhome=self.homes[0])
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def test_explicit_home(self):
+        """Test the config of another home is used without changing $HOME"""
+        self.assertFalse(os.path.lexists(os.path.join(self.homedir, '.symconfig')))
+        self.assertEqual(list(api.list_links(argparse.Namespace(path=None, pattern=None, source=None),
+                                             userhome=self.homes[1])), [('.linkme', self.source)])
+
+    def test_expand_homes(self):
+        """Test expanding globs and lists of home directories"""
+        open(os.path.join(self.homedir, 'svcfile'), 'a').close()
+        self.assertEqual(fleet.expand_homes([os.path.join(self.homedir, 'svc*')]), self.homes)
+        self.assertEqual(fleet.expand_homes(['{},{}'.format(self.homes[2], self.homes[0]), self.homes[2]]),
+                         [self.homes[2], self.homes[0]])
+
+    def test_apply_homes(self):
+        """Test applying many homes in a process pool"""
+        results = fleet.apply_homes(self.homes, jobs=2)
+        self.assertEqual([result.status for result in results], [fleet.OK] * 3)
+        self.assertEqual([result.counts['created'] for result in results], [0, 1, 1])
+        for home in self.homes:
+            self.assertEqual(os.readlink(os.path.join(home, '.linkme')), self.source)
+
+    def test_apply_homes_failures(self):
+        """Test a failing home does not affect the others unless asked to stop"""
+        missing = os.path.join(self.homedir, 'nosymconfig')
+        os.mkdir(missing)
+        os.symlink(os.path.join(self.homedir, 'elsewhere'), os.path.join(self.homes[2], '.linkme'))
+
+        results = fleet.apply_homes([missing] + self.homes, jobs=2)
+        self.assertEqual([result.status for result in results], [fleet.FAILED, fleet.OK, fleet.OK, fleet.CONFLICT])
+        self.assertEqual([str(conflict) for conflict in results[3].conflicts],
+                         ['conflict: .linkme -> {} (destination exists)'.format(self.source)])
+
+        os.remove(os.path.join(self.homes[1], '.linkme'))
+        results = fleet.apply_homes([missing] + self.homes, jobs=1, policy=fleet.STOP)
+        self.assertEqual([result.status for result in results], [fleet.FAILED] + [fleet.SKIPPED] * 3)
+        self.assertFalse(os.path.lexists(os.path.join(self.homes[1], '.linkme')))
+
+    def test_cli_apply_homes(self):
+        """Test apply --homes"""
+        parser = cli.setup_parser()
+        self.assertEqual(cli.parse_args(parser, ['apply', '--homes', os.path.join(self.homedir, 'svc*')]), 0)
+        self.assertEqual(cli.parse_args(parser, ['apply', '--homes', os.path.join(self.homedir, 'nohome*')]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import argparse
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import api
+from sym.exceptions import FileExistsError
+
+
+class TestFold(unittest.TestCase):
+    """Tests linking directory trees with folding"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.testrepo = os.path.realpath(tempfile.mkdtemp('testrepo'))
+        api.init(argparse.Namespace(basedir=self.testrepo))
+
+        self.nvim = os.path.join(self.testrepo, 'nvim')
+        os.makedirs(os.path.join(self.nvim, 'lua'))
+        for name in ('init.lua', os.path.join('lua', 'a.lua'), os.path.join('lua', 'b.lua')):
+            open(os.path.join(self.nvim, name), 'a').close()
+        self.config_dir = os.path.join(self.homedir, '.config')
+        os.mkdir(self.config_dir)
+        self.destination = os.path.join(self.config_dir, 'nvim')
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def add(self, source, destination, fold=False):
+        api.add(argparse.Namespace(source=source, destination=destination, fold=fold, copy=False))
+
+    def symlinks(self):
+        return api.load_config(api.get_symconfig_path()).symlinks
+
+    def test_fold_missing_directory(self):
+        """Test a tree whose destination does not exist is linked with a single symlink"""
+        self.add(self.nvim, self.destination, fold=True)
+        self.assertEqual(os.readlink(self.destination), self.nvim)
+        self.assertEqual(self.symlinks(), {os.path.join('.config', 'nvim'): self.nvim})
+        self.assertEqual(api.load_config(api.get_symconfig_path()).folds, {self.nvim: os.path.join('.config', 'nvim')})
+
+    def test_fold_shared_directory(self):
+        """Test a tree is linked one level down where the destination holds foreign files"""
+        os.mkdir(self.destination)
+        open(os.path.join(self.destination, 'foreign'), 'a').close()
+
+        self.add(self.nvim, self.destination, fold=True)
+        self.assertFalse(os.path.islink(self.destination))
+        self.assertEqual(os.readlink(os.path.join(self.destination, 'lua')), os.path.join(self.nvim, 'lua'))
+        self.assertEqual(sorted(self.symlinks()), [os.path.join('.config', 'nvim', 'init.lua'),
+                                                   os.path.join('.config', 'nvim', 'lua')])
+
+        # Once the foreign file is gone the directory is folded again
+        os.remove(os.path.join(self.destination, 'foreign'))
+        self.add(self.nvim, self.destination, fold=True)
+        self.assertEqual(os.readlink(self.destination), self.nvim)
+        self.assertEqual(self.symlinks(), {os.path.join('.config', 'nvim'): self.nvim})
+
+    def test_fold_conflict(self):
+        """Test nothing is changed when a foreign file is in the way"""
+        os.makedirs(os.path.join(self.destination, 'lua'))
+        open(os.path.join(self.destination, 'lua', 'a.lua'), 'a').close()
+
+        self.assertRaises(FileExistsError, self.add, self.nvim, self.destination, True)
+        self.assertEqual(os.listdir(self.destination), ['lua'])
+        self.assertEqual(self.symlinks(), {})
+
+    def test_unfold_and_refold(self):
+        """Test adding a foreign file unfolds a folded directory and removing it refolds the directory"""
+        self.add(self.nvim, self.destination, fold=True)
+        extra = os.path.join(self.testrepo, 'extra.lua')
+        open(extra, 'a').close()
+        link = os.path.join(self.destination, 'lua', 'extra.lua')
+
+        self.add(extra, link)
+        self.assertFalse(os.path.islink(self.destination))
+        self.assertFalse(os.path.islink(os.path.join(self.destination, 'lua')))
+        self.assertEqual(os.readlink(link), extra)
+        self.assertFalse(os.path.exists(os.path.join(self.nvim, 'lua', 'extra.lua')))
+        self.assertEqual(sorted(self.symlinks()), [os.path.join('.config', 'nvim', 'init.lua'),
+                                                   os.path.join('.config', 'nvim', 'lua', 'a.lua'),
+                                                   os.path.join('.config', 'nvim', 'lua', 'b.lua'),
+                                                   os.path.join('.config', 'nvim', 'lua', 'extra.lua')])
+
+        api.remove(argparse.Namespace(paths=[link], recursive=False))
+        self.assertEqual(os.readlink(self.destination), self.nvim)
+        self.assertEqual(self.symlinks(), {os.path.join('.config', 'nvim'): self.nvim})
+
+    def test_fold_two_trees(self):
+        """Test a directory folded for one tree is unfolded to make room for another"""
+        self.add(self.nvim, self.destination, fold=True)
+        other = os.path.join(self.testrepo, 'other')
+        os.makedirs(os.path.join(other, 'lua'))
+        open(os.path.join(other, 'lua', 'c.lua'), 'a').close()
+
+        self.add(other, self.destination, fold=True)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.destination, 'lua'))), ['a.lua', 'b.lua', 'c.lua'])
+        self.assertEqual(os.readlink(os.path.join(self.destination, 'lua', 'c.lua')),
+                         os.path.join(other, 'lua', 'c.lua'))
+
+        api.remove(argparse.Namespace(paths=[other], recursive=True))
+        self.assertEqual(os.readlink(self.destination), self.nvim)
+        self.assertEqual(list(api.load_config(api.get_symconfig_path()).folds), [self.nvim])
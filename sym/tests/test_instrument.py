@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import instrument
+
+
+class TestInstrument(unittest.TestCase):
+    """Tests the timing and syscall instrumentation"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        instrument.disable()
+        instrument.reset()
+        shutil.rmtree(self.tmpdir)
+
+    def test_disabled(self):
+        """Test nothing is collected or wrapped while disabled"""
+        lstat = os.lstat
+        with instrument.span('disabled'):
+            os.lstat(self.tmpdir)
+        self.assertIs(os.lstat, lstat)
+        self.assertEqual(instrument.get_data(), {'spans': {}, 'syscalls': {}})
+
+    def test_enabled(self):
+        """Test spans and syscalls are collected while enabled"""
+        lstat = os.lstat
+
+        @instrument.timed('decorated')
+        def decorated():
+            os.lstat(self.tmpdir)
+
+        instrument.enable()
+        with instrument.span('block'):
+            os.lstat(self.tmpdir)
+        decorated()
+        decorated()
+        instrument.disable()
+
+        self.assertIs(os.lstat, lstat)
+        data = instrument.get_data()
+        self.assertEqual(data['spans']['block']['calls'], 1)
+        self.assertEqual(data['spans']['decorated']['calls'], 2)
+        self.assertEqual(data['syscalls']['lstat'], 3)
+
+    def test_report(self):
+        """Test reports in every format"""
+        instrument.enable()
+        with instrument.span('block'):
+            os.path.realpath(self.tmpdir)
+        instrument.disable()
+
+        self.assertIn('block', instrument.format_table(instrument.get_data()))
+        self.assertIn('sym_syscalls{command="verify",syscall="realpath"} 1',
+                      instrument.format_prometheus(instrument.get_data(), 'verify'))
+
+        output = os.path.join(self.tmpdir, 'profile.json')
+        instrument.report(instrument.JSON, output)
+        with open(output) as stream:
+            self.assertEqual(json.load(stream)['spans']['block']['calls'], 1)
+        self.assertEqual(os.listdir(self.tmpdir), ['profile.json'])
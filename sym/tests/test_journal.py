@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from sym import config as symconfig
+from sym import journal
+from sym.config import ConfigYAML
+from sym.config import LinkTable
+from sym.config import load_config
+
+
+class TestJournal(unittest.TestCase):
+    """Tests the journaled storage mode"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.configpath = os.path.join(self.homedir, '.symconfig')
+        self.journalpath = journal.get_journal_path(self.configpath)
+
+        config = ConfigYAML(storage=symconfig.JOURNAL)
+        config.symlinks['.a'] = 'git/dotfiles/a'
+        config.save()
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+
+    def test_link_table_changes(self):
+        """Test every change to a LinkTable is recorded"""
+        symlinks = LinkTable({'.a': 'a'})
+        self.assertEqual(symlinks.changes, [])
+        symlinks['.b'] = 'b'
+        del symlinks['.a']
+        symlinks.pop('.missing', None)
+        symlinks.update({'.c': 'c'})
+        self.assertEqual(symlinks.changes, [('.b', 'b'), ('.a', None), ('.c', 'c')])
+
+    def test_journal_append(self):
+        """Test saving a journaled config appends to the journal instead of rewriting it"""
+        before = os.stat(self.configpath)
+        self.assertFalse(os.path.exists(self.journalpath))
+
+        config = load_config(self.configpath)
+        config.symlinks['.b'] = 'git/dotfiles/b'
+        del config.symlinks['.a']
+        config.save()
+
+        after = os.stat(self.configpath)
+        self.assertEqual((before.st_ino, before.st_mtime_ns), (after.st_ino, after.st_mtime_ns))
+        with open(self.journalpath) as stream:
+            self.assertEqual(len(stream.readlines()), 2)
+
+        config = load_config(self.configpath)
+        self.assertEqual(config.symlinks, {'.b': 'git/dotfiles/b'})
+        self.assertEqual(config.symlinks.changes, [])
+
+    def test_journal_torn_record(self):
+        """Test a record torn by a crash is ignored"""
+        config = load_config(self.configpath)
+        config.symlinks['.b'] = 'git/dotfiles/b'
+        config.save()
+        with open(self.journalpath, 'a') as stream:
+            stream.write('[".c", "git/dot')
+
+        config = load_config(self.configpath)
+        self.assertEqual(config.symlinks, {'.a': 'git/dotfiles/a', '.b': 'git/dotfiles/b'})
+
+    def test_journal_append_after_torn_record(self):
+        """Test the changes saved after a record torn by a crash are kept"""
+        with open(self.journalpath, 'a') as stream:
+            stream.write('["torn", "x')
+        config = load_config(self.configpath)
+        config.symlinks['.b'] = 'git/dotfiles/b'
+        config.save()
+        config.symlinks['.c'] = 'git/dotfiles/c'
+        config.save()
+
+        config = load_config(self.configpath)
+        self.assertEqual(config.symlinks, {'.a': 'git/dotfiles/a', '.b': 'git/dotfiles/b', '.c': 'git/dotfiles/c'})
+
+    def test_journal_compaction(self):
+        """Test the journal is compacted into the config past the size threshold"""
+        compact_bytes = journal.COMPACT_BYTES
+        journal.COMPACT_BYTES = 256
+        try:
+            config = load_config(self.configpath)
+            for i in range(20):
+                config.symlinks['.link{}'.format(i)] = 'git/dotfiles/link{}'.format(i)
+                config.save()
+        finally:
+            journal.COMPACT_BYTES = compact_bytes
+
+        self.assertLess(os.path.getsize(self.journalpath) if os.path.exists(self.journalpath) else 0, 256)
+        config = load_config(self.configpath)
+        self.assertEqual(len(config.symlinks), 21)
+        self.assertEqual(config.storage, symconfig.JOURNAL)
+
+    def test_atomic_save_keeps_mode(self):
+        """Test rewriting the config keeps its permissions"""
+        os.chmod(self.configpath, 0o640)
+        config = load_config(self.configpath)
+        config.storage = symconfig.FILE
+        config.save()
+        self.assertEqual(stat.S_IMODE(os.stat(self.configpath).st_mode), 0o640)
+        # No temporary file is left behind, the cache directory holds the lock of the config
+        self.assertEqual(sorted(os.listdir(self.homedir)), ['.cache', '.symconfig'])
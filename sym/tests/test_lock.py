@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from sym import api
+from sym import config as symconfig
+from sym import lock
+from sym.config import load_config
+from sym.exceptions import ConfigNotFoundError
+
+
+class TestLock(unittest.TestCase):
+    """Tests concurrent updates of the config"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        api.init(argparse.Namespace(basedir=self.testrepo))
+        self.configpath = api.get_symconfig_path()
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def test_lock_reentrant(self):
+        """Test a process can take the lock it already holds"""
+        with lock.lock(self.configpath, shared=True):
+            with lock.lock(self.configpath):
+                self.assertFalse(lock._held[lock.get_lock_path(self.configpath)][2])
+            with lock.lock(self.configpath, shared=True):
+                pass
+        self.assertEqual(lock._held, {})
+
+    def test_read_file_without_lock(self):
+        """Test reading a config stored as a file takes no lock, a journaled one takes it shared"""
+        path = lock.get_lock_path(self.configpath)
+        self.assertTrue(path.startswith(os.path.join(self.homedir, '.cache')))
+        os.unlink(path)  # Taken by the write of sym init
+        load_config(self.configpath)
+        self.assertFalse(os.path.exists(path))
+
+        config = load_config(self.configpath)
+        config.storage = symconfig.JOURNAL
+        config.save()
+        config.symlinks['.a'] = 'a'
+        config.save()
+        os.unlink(path)
+        self.assertEqual(load_config(self.configpath).symlinks, {'.a': 'a'})
+        self.assertTrue(os.path.exists(path))
+
+    def test_read_missing_config(self):
+        """Test reading a missing config raises ConfigNotFoundError and creates no lock file"""
+        os.unlink(self.configpath)
+        os.unlink(lock.get_lock_path(self.configpath))
+        with self.assertRaises(ConfigNotFoundError):
+            load_config(self.configpath)
+        self.assertFalse(os.path.exists(lock.get_lock_path(self.configpath)))
+
+    def test_merge_on_write(self):
+        """Test saving a config which changed on disk keeps the changes of both writers"""
+        first = load_config(self.configpath)
+        first.symlinks['.a'] = 'a'
+        first.symlinks['.shared'] = 'shared'
+        first.save()
+
+        second = load_config(self.configpath)
+        third = load_config(self.configpath)
+        second.symlinks['.b'] = 'b'
+        second.folds['tree'] = '.tree'
+        second.save()
+        third.symlinks['.c'] = 'c'
+        del third.symlinks['.shared']
+        third.save()
+
+        config = load_config(self.configpath)
+        self.assertEqual(config.symlinks, {'.a': 'a', '.b': 'b', '.c': 'c'})
+        self.assertEqual(config.folds, {'tree': '.tree'})
+
+    def test_merge_on_write_journal(self):
+        """Test concurrent writers of a journaled config keep each other's changes"""
+        config = load_config(self.configpath)
+        config.storage = symconfig.JOURNAL
+        config.save()
+
+        first = load_config(self.configpath)
+        second = load_config(self.configpath)
+        first.symlinks['.a'] = 'a'
+        first.save()
+        second.symlinks['.b'] = 'b'
+        second.save()
+        self.assertEqual(second.symlinks, {'.a': 'a', '.b': 'b'})
+        self.assertEqual(load_config(self.configpath).symlinks, {'.a': 'a', '.b': 'b'})
+
+    def test_concurrent_adds(self):
+        """Test many processes adding symlinks at once, merging and holding the lock"""
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        env = dict(os.environ, SYM_NO_SERVER='1')
+        env.pop('XDG_CACHE_HOME', None)
+
+        expected = {}
+        for mode in ([], ['--lock']):
+            processes = []
+            for i in range(12):
+                source = os.path.join(self.testrepo, 'file{}{}'.format(len(mode), i))
+                destination = '.link{}{}'.format(len(mode), i)
+                open(source, 'a').close()
+                expected[destination] = source
+                argv = [sys.executable, '-m', 'sym'] + mode + ['add', source, os.path.join(self.homedir, destination)]
+                processes.append(subprocess.Popen(argv, cwd=root, env=env))
+            self.assertEqual([process.wait() for process in processes], [0] * len(processes))
+
+        self.assertEqual(load_config(self.configpath).symlinks, expected)
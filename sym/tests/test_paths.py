@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import paths
+from sym.paths import PathResolver
+
+
+class TestPaths(unittest.TestCase):
+    """Tests resolving and canonicalizing paths"""
+
+    def setUp(self):
+        self.tmpdir = os.path.realpath(tempfile.mkdtemp())
+        self.realhome = os.path.join(self.tmpdir, 'realhome')
+        self.homedir = os.path.join(self.tmpdir, 'home')
+        self.testrepo = os.path.join(self.tmpdir, 'testrepo')
+        os.makedirs(os.path.join(self.realhome, '.config'))
+        os.makedirs(self.testrepo)
+        os.symlink(self.realhome, self.homedir)  # $HOME is itself a symlink
+        os.symlink(self.testrepo, os.path.join(self.realhome, 'dotfiles'))
+        self.resolver = PathResolver(self.homedir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_is_within(self):
+        """Test matching whole path components only"""
+        self.assertTrue(paths.is_within('/home/al', '/home/al'))
+        self.assertTrue(paths.is_within('/home/al/.vimrc', '/home/al'))
+        self.assertFalse(paths.is_within('/home/alice/.vimrc', '/home/al'))
+        self.assertTrue(paths.is_within('/etc', '/'))
+
+    def test_key(self):
+        """Test the same path gets the same key however it is specified"""
+        expected = os.path.join('.config', 'app')
+        self.assertEqual(self.resolver.key(os.path.join(self.homedir, '.config', 'app')), expected)
+        self.assertEqual(self.resolver.key(os.path.join(self.realhome, '.config', 'app')), expected)
+        self.assertEqual(self.resolver.key(os.path.join(self.homedir, '.config', '..', '.config', 'app')), expected)
+
+        expected = os.path.join(self.testrepo, 'vimrc')
+        self.assertEqual(self.resolver.key(os.path.join(self.testrepo, 'vimrc')), expected)
+        self.assertEqual(self.resolver.key(os.path.join(self.homedir, 'dotfiles', 'vimrc')), expected)
+
+    def test_key_keeps_last_component(self):
+        """Test a symlink is identified by its own path rather than what it points to"""
+        self.assertEqual(self.resolver.key(os.path.join(self.homedir, 'dotfiles')), 'dotfiles')
+
+    def test_realpath(self):
+        """Test resolving real paths with memoized directories"""
+        vimrc = os.path.join(self.testrepo, 'vimrc')
+        open(vimrc, 'a').close()
+        os.symlink(os.path.join(self.homedir, 'dotfiles', 'vimrc'), os.path.join(self.realhome, '.vimrc'))
+
+        self.assertEqual(self.resolver.realpath(os.path.join(self.homedir, '.vimrc')), vimrc)
+        self.assertEqual(self.resolver.realpath(os.path.join(self.homedir, 'dotfiles', 'vimrc')), vimrc)
+        self.assertEqual(self.resolver.realdir(self.homedir), self.realhome)
+
+    def test_resolve(self):
+        """Test resolving paths stored in the config"""
+        self.assertEqual(self.resolver.resolve('.vimrc'), os.path.join(self.homedir, '.vimrc'))
+        self.assertEqual(self.resolver.resolve('/etc/motd'), '/etc/motd')
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import query
+from sym.config import LinkTable
+from sym.paths import PathResolver
+
+
+class TestQuery(unittest.TestCase):
+    """Tests querying the symlink entries of a config"""
+
+    def setUp(self):
+        self.homedir = tempfile.mkdtemp('homedir')
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.resolver = PathResolver(self.homedir)
+        self.symlinks = LinkTable({
+            '.bashrc': '/repo/bash/bashrc',
+            '.config/app/a.conf': '/repo/app/a.conf',
+            '.config/app/b.ini': '/repo/app/b.ini',
+            '.config/apple': '/repo/apple',
+            '.vimrc': '/repo/vim/vimrc',
+            '/etc/hosts': '/repo/hosts',
+        })
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+
+    def query(self, **kwargs):
+        return [destination for destination, _ in query.query_links(self.symlinks, self.resolver, **kwargs)]
+
+    def test_query_all(self):
+        """Test every entry is listed, sorted by destination"""
+        self.assertEqual(self.query(), sorted(self.symlinks))
+
+    def test_query_path(self):
+        """Test listing the entries below a directory"""
+        self.assertEqual(self.query(path=os.path.join(self.homedir, '.config', 'app')),
+                         ['.config/app/a.conf', '.config/app/b.ini'])
+        self.assertEqual(self.query(path=os.path.join(self.homedir, '.config', 'apple')), ['.config/apple'])
+        self.assertEqual(self.query(path=self.homedir), sorted(self.symlinks)[:-1])
+        self.assertEqual(self.query(path='/etc'), ['/etc/hosts'])
+
+    def test_query_glob(self):
+        """Test filtering entries with a glob"""
+        self.assertEqual(self.query(pattern='.config/*.conf'), ['.config/app/a.conf'])
+        self.assertEqual(self.query(pattern='*rc'), ['.bashrc', '.vimrc'])
+        self.assertEqual(self.query(path=os.path.join(self.homedir, '.config'), pattern='*.ini'), ['.config/app/b.ini'])
+
+    def test_query_source(self):
+        """Test filtering entries by their source"""
+        self.assertEqual(self.query(source='/repo/app'), ['.config/app/a.conf', '.config/app/b.ini'])
+        self.assertEqual(self.query(source='/repo/vim/vimrc'), ['.vimrc'])
+        self.assertEqual(self.query(source='/repo', path='/etc'), ['/etc/hosts'])
+        self.assertEqual(self.query(source='/nowhere'), [])
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import remove
+from sym.config import LinkTable
+from sym.exceptions import FileNotFoundError
+from sym.paths import PathResolver
+
+
+class TestRemove(unittest.TestCase):
+    """Tests removing symlink entries and their symlinks"""
+
+    def setUp(self):
+        self.homedir = tempfile.mkdtemp('homedir')
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.testrepo = os.path.realpath(tempfile.mkdtemp('testrepo'))
+        self.resolver = PathResolver(self.homedir)
+        self.symlinks = LinkTable()
+        os.makedirs(os.path.join(self.testrepo, 'vim'))
+        for name in ('vimrc', os.path.join('vim', 'colors'), 'bashrc'):
+            open(os.path.join(self.testrepo, name), 'a').close()
+        self.link('.vimrc', 'vimrc')
+        self.link('.nvimrc', 'vimrc')
+        self.link('.vim', os.path.join('vim', 'colors'))
+        self.link('.bashrc', 'bashrc')
+        del self.symlinks.changes[:]
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def link(self, destination, source):
+        source = os.path.join(self.testrepo, source)
+        os.symlink(source, os.path.join(self.homedir, destination))
+        self.symlinks[destination] = source
+
+    def test_reverse_index(self):
+        """Test the reverse index follows every change to the table"""
+        vimrc = os.path.join(self.testrepo, 'vimrc')
+        self.assertEqual(self.symlinks.destinations_of(vimrc), ['.nvimrc', '.vimrc'])
+        self.symlinks['.nvimrc'] = os.path.join(self.testrepo, 'bashrc')
+        self.assertEqual(self.symlinks.destinations_of(vimrc), ['.vimrc'])
+        self.symlinks.pop('.vimrc')
+        self.assertEqual(self.symlinks.destinations_of(vimrc), [])
+        self.assertEqual(self.symlinks.within(self.testrepo), ['.bashrc', '.nvimrc', '.vim'])
+        self.assertEqual(self.symlinks.within(os.path.join(self.testrepo, 'vim')), ['.vim'])
+        self.assertEqual(self.symlinks.within(os.path.join(self.testrepo, 'vi')), [])
+        self.assertEqual(LinkTable(self.symlinks).within(os.curdir), ['.bashrc', '.nvimrc', '.vim'])
+
+    def test_select_links(self):
+        """Test paths select entries by destination, by source and by directory"""
+        def select(*paths, **kwargs):
+            return remove.select_links(self.symlinks, self.resolver, paths, **kwargs)
+
+        self.assertEqual(select(os.path.join(self.homedir, '.vimrc')), ['.vimrc'])
+        self.assertEqual(select(os.path.join(self.testrepo, 'vimrc')), ['.nvimrc', '.vimrc'])
+        self.assertEqual(select(os.path.join(self.testrepo, 'vim'), recursive=True), ['.vim'])
+        self.assertRaises(FileNotFoundError, select, os.path.join(self.testrepo, 'vim'))
+        self.assertRaises(FileNotFoundError, select, os.path.join(self.homedir, '.missing'))
+
+    def test_remove_links(self):
+        """Test only symlinks pointing to their source are deleted"""
+        os.remove(os.path.join(self.homedir, '.vimrc'))
+        os.remove(os.path.join(self.homedir, '.nvimrc'))
+        open(os.path.join(self.homedir, '.nvimrc'), 'a').close()
+
+        results = remove.remove_links(self.symlinks, ['.bashrc', '.nvimrc', '.vimrc'], self.resolver)
+        statuses = dict((result.destination, result.status) for result in results)
+        self.assertEqual(statuses, {'.bashrc': remove.REMOVED, '.nvimrc': remove.CONFLICT, '.vimrc': remove.FORGOTTEN})
+        self.assertFalse(os.path.lexists(os.path.join(self.homedir, '.bashrc')))
+        self.assertTrue(os.path.isfile(os.path.join(self.homedir, '.nvimrc')))
+        self.assertEqual(sorted(self.symlinks), ['.nvimrc', '.vim'])
+        self.assertEqual(sorted(self.symlinks.changes), [('.bashrc', None), ('.vimrc', None)])
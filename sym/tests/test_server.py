@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from sym import cli
+from sym import server
+from sym.config import load_config
+from sym.shards import ENV_SHARDS
+
+
+class TestServer(unittest.TestCase):
+    """Tests running commands in a resident sym server"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        os.chdir(self.homedir)
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        self.parser = cli.setup_parser()
+        cli.parse_args(self.parser, ['init', self.testrepo])
+        self.symconfig = os.path.join(self.testrepo, 'symconfig')
+
+        self.server = server.Server()
+        self.server.start()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.start()
+
+    def tearDown(self):
+        self.stopped.set()
+        self.thread.join()
+        self.server.stop()
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def serve(self):
+        while not self.stopped.is_set():
+            self.server.serve_once(0.05)
+
+    def test_server_batches_saves(self):
+        """Test commands run in the server and their saves are batched"""
+        source = os.path.join(self.testrepo, 'linkme')
+        link = os.path.join(self.homedir, '.linkme')
+        open(source, 'a').close()
+
+        self.assertEqual(cli.parse_args(self.parser, ['add', source, link]), 0)
+        self.assertEqual(os.readlink(link), source)
+        self.assertTrue(self.server.config.dirty)
+        self.assertEqual(dict(self.server.config.symlinks), {'.linkme': source})
+
+        self.assertEqual(cli.parse_args(self.parser, ['verify']), 0)
+        os.remove(link)
+        self.assertEqual(cli.parse_args(self.parser, ['verify']), 1)
+
+        # Commands the server does not answer see the batched changes
+        self.assertEqual(cli.parse_args(self.parser, ['apply']), 0)
+        self.assertFalse(self.server.config.dirty)
+        self.assertEqual(os.readlink(link), source)
+
+    def test_server_shard_selection(self):
+        """Test a command selecting shards through the environment runs in process, not in the server"""
+        source = os.path.join(self.testrepo, 'linkme')
+        open(source, 'a').close()
+        remote = []
+        run_remote = server.run_remote
+        server.run_remote = remote.append
+        os.environ[ENV_SHARDS] = 'dots'
+        try:
+            cli.parse_args(self.parser, ['add', source, os.path.join(self.homedir, '.linkme')])
+            cli.parse_args(self.parser, ['list'])
+        finally:
+            del os.environ[ENV_SHARDS]
+            server.run_remote = run_remote
+
+        self.assertEqual(remote, [])
+        self.assertEqual(os.readlink(os.path.join(self.homedir, '.linkme')), source)
+
+    def test_server_reloads_changed_config(self):
+        """Test the server picks up changes made on disk while it is not dirty"""
+        self.assertEqual(server.request({'command': 'ping'}), {'exit': 0, 'output': ''})
+        os.environ[server.ENV_NO_SERVER] = '1'
+        try:
+            self.assertIsNone(server.request({'command': 'ping'}))
+            config = load_config(self.symconfig)
+            config.symlinks['.other'] = os.path.join(self.testrepo, 'other')
+            config.save()
+        finally:
+            del os.environ[server.ENV_NO_SERVER]
+
+        self.assertEqual(cli.parse_args(self.parser, ['verify']), 1)
+        self.assertIn('.other', self.server.config.symlinks)
+
+    def test_server_already_running(self):
+        """Test a second server refuses to start"""
+        self.assertRaises(OSError, server.Server().start)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import argparse
+import json
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from sym import api
+from sym import cli
+from sym import shards
+from sym.exceptions import FileExistsError
+from sym.exceptions import FileNotFoundError
+
+
+class TestShards(unittest.TestCase):
+    """Tests sharded configs"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        api.init(argparse.Namespace(basedir=self.testrepo))
+        self.configpath = api.get_symconfig_path()
+
+        config = api.load_config(self.configpath)
+        config.symlinks['.bashrc'] = 'bashrc'
+        config.symlinks['.config/work/vpn'] = 'vpn'
+        config.symlinks['.config/work/mail'] = 'mail'
+        config.save()
+
+    def tearDown(self):
+        for name in (shards.ENV_SHARDS, shards.ENV_TAGS):
+            os.environ.pop(name, None)
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def write_index(self, index):
+        with open(shards.get_index_path(self.configpath), 'w') as stream:
+            json.dump(index, stream)
+
+    def test_select_shards(self):
+        """Test shards are selected by hostname, tags and name"""
+        index = {'shards': {'common': None, 'web': {'hosts': ['web-*']}, 'work': {'tags': ['work']}}}
+        self.assertEqual(shards.select_shards(index, 'laptop'), ['common'])
+        self.assertEqual(shards.select_shards(index, 'web-1'), ['common', 'web'])
+        self.assertEqual(shards.select_shards(index, 'laptop', ['work']), ['common', 'work'])
+        self.assertEqual(shards.select_shards(index, 'laptop', [], ['work']), ['work'])
+        self.assertRaises(FileNotFoundError, shards.select_shards, index, 'laptop', [], ['missing'])
+
+    def test_split_config(self):
+        """Test splitting a config into shards which every host uses"""
+        counts = api.split(argparse.Namespace(rules=[('work', '.config/work/*')], default='common'))
+        self.assertEqual(dict(counts), {'common': 1, 'work': 2})
+        self.assertTrue(os.path.isdir(self.configpath))
+        self.assertEqual(sorted(os.listdir(self.configpath)), ['common', 'index', 'work'])
+
+        config = api.load_config(self.configpath)
+        self.assertEqual(sorted(config.shards), ['common', 'work'])
+        self.assertEqual(sorted(config.symlinks), ['.bashrc', '.config/work/mail', '.config/work/vpn'])
+        self.assertRaises(FileExistsError, api.split, argparse.Namespace(rules=[], default='common'))
+
+    def test_split_config_permissions(self):
+        """Test the shards keep the permissions of the config and the index is a plain mapping"""
+        os.chmod(self.configpath, 0o640)
+        api.split(argparse.Namespace(rules=[('work', '.config/work/*')], default='common'))
+        self.assertEqual(stat.S_IMODE(os.stat(self.configpath).st_mode), 0o750)
+        for name in ('common', 'index', 'work'):
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.join(self.configpath, name)).st_mode), 0o640)
+        with open(shards.get_index_path(self.configpath)) as stream:
+            self.assertNotIn('!SymConfig', stream.read())
+
+    def test_load_selected_shards(self):
+        """Test only the selected shards are loaded, and changes go to the shard holding the entry"""
+        api.split(argparse.Namespace(rules=[('work', '.config/work/*')], default='common'))
+        self.write_index({'default': 'common', 'shards': {'common': {}, 'work': {'tags': ['work']}}})
+        self.assertEqual(list(api.load_config(self.configpath).symlinks), ['.bashrc'])
+
+        os.environ[shards.ENV_TAGS] = 'work'
+        config = api.load_config(self.configpath)
+        common = os.stat(os.path.join(self.configpath, 'common'))
+        del config.symlinks['.config/work/mail']
+        config.save()
+        self.assertEqual(os.stat(os.path.join(self.configpath, 'common')).st_ino, common.st_ino)
+
+        config.symlinks['.new'] = 'new'
+        config.save()
+        self.assertEqual(sorted(api.load_config(os.path.join(self.configpath, 'common')).symlinks), ['.bashrc', '.new'])
+        self.assertEqual(list(api.load_config(os.path.join(self.configpath, 'work')).symlinks), ['.config/work/vpn'])
+
+    def test_cli_shard(self):
+        """Test selecting a shard by name on the command line"""
+        parser = cli.setup_parser()
+        self.assertIsNone(cli.parse_args(parser, ['split', 'work=.config/work/*']))
+        self.write_index({'default': 'common', 'shards': {'common': {}, 'work': {'hosts': ['nowhere']}}})
+
+        source = os.path.join(self.testrepo, 'token')
+        open(source, 'a').close()
+        cli.parse_args(parser, ['--shard', 'work', 'add', source, os.path.join(self.homedir, '.token')])
+        self.assertEqual(sorted(api.load_config(os.path.join(self.configpath, 'work')).symlinks),
+                         ['.config/work/mail', '.config/work/vpn', '.token'])
+        self.assertEqual(cli.parse_args(parser, ['split', 'bad/name=*']), 1)
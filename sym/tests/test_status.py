@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import cache
+from sym import status
+from sym import verify
+from sym.paths import PathResolver
+
+
+class TestStatus(unittest.TestCase):
+    """Tests detecting changed symlinks and sources"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        self.resolver = PathResolver()
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def make_source(self, name, content):
+        path = os.path.join(self.testrepo, name)
+        with open(path, 'w') as stream:
+            stream.write(content)
+        os.symlink(path, os.path.join(self.homedir, '.' + name))
+        return path
+
+    def test_digest_cache(self):
+        """Test digests are cached by inode, size and mtime"""
+        path = os.path.join(self.testrepo, 'cached')
+        with open(path, 'w') as stream:
+            stream.write('one')
+        os.utime(path, ns=(0, 0))  # Old enough not to be racy
+
+        hashes = status.ContentHashes()
+        digest = hashes.digest(path)
+        self.assertEqual(hashes.files[path][3], digest)
+
+        hashes.files[path] = hashes.files[path][:3] + ('cached',)
+        self.assertEqual(hashes.digest(path), 'cached')
+
+        with open(path, 'w') as stream:
+            stream.write('three')
+        os.utime(path, ns=(0, 0))
+        self.assertEqual(hashes.digest(path), hashlib.blake2b(b'three').hexdigest())
+        self.assertIsNone(hashes.digest(os.path.join(self.testrepo, 'missing')))
+
+    def test_check_status(self):
+        """Test content changes are reported against the recorded snapshot"""
+        vimrc = self.make_source('vimrc', 'set number')
+        bashrc = self.make_source('bashrc', 'set -o vi')
+        os.makedirs(os.path.join(self.testrepo, 'nvim', 'lua'))
+        with open(os.path.join(self.testrepo, 'nvim', 'lua', 'init.lua'), 'w') as stream:
+            stream.write('-- init')
+        os.symlink(os.path.join(self.testrepo, 'nvim'), os.path.join(self.homedir, '.nvim'))
+        symlinks = {'.vimrc': vimrc, '.bashrc': bashrc, '.nvim': os.path.join(self.testrepo, 'nvim'),
+                    '.missing': os.path.join(self.testrepo, 'missing')}
+
+        results, changes = status.check_status(symlinks, self.resolver)
+        self.assertIsNone(changes)
+        self.assertEqual([result.status for result in results], [verify.OK] * 3 + [verify.MISSING])
+
+        hashes = status.ContentHashes()
+        results, changes = status.check_status(symlinks, self.resolver, 4, hashes)
+        self.assertEqual([result.content for result in results], [status.NEW] * 4)
+        status.record_snapshot(hashes, changes)
+        hashes.save(os.path.join(self.homedir, '.symconfig'))
+
+        hashes = status.ContentHashes.load(os.path.join(self.homedir, '.symconfig'))
+        with open(vimrc, 'a') as stream:
+            stream.write('\nset ruler')
+        with open(os.path.join(self.testrepo, 'nvim', 'lua', 'init.lua'), 'a') as stream:
+            stream.write('\nvim.o.number = true')
+        os.remove(bashrc)
+        results = dict((result.destination, result) for result in status.check_status(symlinks, self.resolver, 4,
+                                                                                       hashes)[0])
+        self.assertEqual(results['.vimrc'].status, status.MODIFIED)
+        self.assertEqual(results['.nvim'].status, status.MODIFIED)
+        self.assertEqual((results['.bashrc'].status, results['.bashrc'].content),
+                         (verify.DANGLING_SOURCE, status.DELETED))
+        self.assertEqual(results['.missing'].status, verify.MISSING)
+        self.assertTrue(os.path.exists(cache.get_cache_path(os.path.join(self.homedir, '.symconfig'), 'content')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import argparse
+import errno
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from sym import api
+from sym import transaction
+from sym.config import load_config
+
+
+class TestTransaction(unittest.TestCase):
+    """Tests changing the filesystem and the config together"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        api.init(argparse.Namespace(basedir=self.testrepo))
+        self.symconfig = api.get_symconfig_path()
+
+        self.source = os.path.join(self.testrepo, 'source')
+        open(self.source, 'a').close()
+        self.existing = os.path.join(self.homedir, '.existing')
+        os.symlink(self.source, self.existing)
+        config = load_config(self.symconfig)
+        config.symlinks['.existing'] = self.source
+        config.save()
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def change(self, fs, config):
+        directory = os.path.join(self.homedir, '.dir', 'sub')
+        fs.makedirs(directory)
+        fs.symlink(self.source, os.path.join(directory, 'link'))
+        fs.unlink(self.existing)
+        config.symlinks[os.path.join('.dir', 'sub', 'link')] = self.source
+        del config.symlinks['.existing']
+
+    def test_commit(self):
+        """Test committing saves the config and forgets the undo journal"""
+        config = load_config(self.symconfig)
+        with transaction.Transaction(config, self.symconfig) as txn:
+            self.change(txn, config)
+            self.assertTrue(os.path.exists(txn.path))
+
+        self.assertFalse(os.path.exists(txn.path))
+        self.assertEqual(load_config(self.symconfig).symlinks, {os.path.join('.dir', 'sub', 'link'): self.source})
+
+    def test_rollback(self):
+        """Test an error rolls back the filesystem and the config"""
+        config = load_config(self.symconfig)
+        with self.assertRaises(RuntimeError):
+            with transaction.Transaction(config, self.symconfig) as txn:
+                self.change(txn, config)
+                raise RuntimeError()
+
+        self.assertFalse(os.path.exists(txn.path))
+        self.assertFalse(os.path.exists(os.path.join(self.homedir, '.dir')))
+        self.assertEqual(os.readlink(self.existing), self.source)
+        self.assertEqual(config.symlinks, {'.existing': self.source})
+        self.assertEqual(config.symlinks.changes, [])
+
+    def test_rollback_failed_save(self):
+        """Test a config which cannot be saved rolls back the filesystem and the config"""
+        config = load_config(self.symconfig)
+
+        def write():
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+        config.write = write
+        with self.assertRaises(OSError):
+            with transaction.Transaction(config, self.symconfig) as txn:
+                self.change(txn, config)
+
+        self.assertTrue(txn.done)
+        self.assertFalse(os.path.exists(txn.path))
+        self.assertFalse(os.path.exists(os.path.join(self.homedir, '.dir')))
+        self.assertEqual(os.readlink(self.existing), self.source)
+        self.assertEqual(config.symlinks, {'.existing': self.source})
+        self.assertEqual(config.symlinks.changes, [])
+
+    def test_rollback_copies(self):
+        """Test rolling back removes the copies made and restores the copies removed"""
+        with open(self.source, 'w') as stream:
+            stream.write('content')
+        kept = os.path.join(self.homedir, '.kept')
+        config = load_config(self.symconfig)
+        with transaction.Transaction(config, self.symconfig) as txn:
+            config.copies['.kept'] = txn.copy_file(self.source, kept)
+        self.assertEqual(load_config(self.symconfig).copies, config.copies)
+
+        made = os.path.join(self.homedir, '.made')
+        with self.assertRaises(RuntimeError):
+            with transaction.Transaction(config, self.symconfig) as txn:
+                config.copies['.made'] = txn.copy_file(self.source, made)
+                txn.unlink(kept)
+                del config.copies['.kept']
+                raise RuntimeError()
+
+        self.assertFalse(os.path.exists(made))
+        with open(kept, 'r') as stream:
+            self.assertEqual(stream.read(), 'content')
+        self.assertEqual(list(config.copies), ['.kept'])
+        self.assertEqual([name for name in os.listdir(os.path.dirname(txn.path)) if '.undo.' in name], [])
+
+    def test_recover(self):
+        """Test the transaction of a process which died is rolled back"""
+        process = subprocess.Popen(['true'])
+        process.wait()
+        link = os.path.join(self.homedir, '.orphan')
+        os.symlink(self.source, link)
+        os.unlink(self.existing)
+        path = transaction.get_undo_path(self.symconfig, process.pid)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as stream:
+            stream.write(json.dumps(['unlink', link, self.source]) + '\n')
+            stream.write(json.dumps(['symlink', self.existing, self.source]) + '\n')
+            stream.write('["torn')
+
+        transaction.recover(self.symconfig)
+        self.assertFalse(os.path.lexists(link))
+        self.assertEqual(os.readlink(self.existing), self.source)
+        self.assertFalse(os.path.exists(transaction.get_undo_path(self.symconfig, process.pid)))
+
+    def test_add_many_atomic(self):
+        """Test an atomic batch adds nothing if any entry fails"""
+        entries = [(self.source, os.path.join(self.homedir, '.a')),
+                   (os.path.join(self.testrepo, 'missing'), os.path.join(self.homedir, '.b'))]
+        self.assertEqual(len(api.add_many(entries, atomic=True)), 1)
+        self.assertFalse(os.path.lexists(os.path.join(self.homedir, '.a')))
+        self.assertEqual(list(load_config(self.symconfig).symlinks), ['.existing'])
+
+        self.assertEqual(len(api.add_many(entries)), 1)
+        self.assertTrue(os.path.lexists(os.path.join(self.homedir, '.a')))
+        self.assertEqual(sorted(load_config(self.symconfig).symlinks), ['.a', '.existing'])
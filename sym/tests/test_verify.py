@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sym import verify
+from sym.paths import PathResolver
+
+
+class TestVerify(unittest.TestCase):
+    """Tests verifying symlinks against the filesystem"""
+
+    def setUp(self):
+        self.homedir = tempfile.mkdtemp('homedir')
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        self.resolver = PathResolver(self.homedir)
+        self.source = os.path.join(self.testrepo, 'linkme')
+        open(self.source, 'a').close()
+
+    def tearDown(self):
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def test_check_link_statuses(self):
+        """Test each status a symlink entry can be in"""
+        os.symlink(self.source, os.path.join(self.homedir, '.ok'))
+        result = verify.check_link('.ok', self.source, self.resolver)
+        self.assertEqual(result.status, verify.OK)
+        self.assertEqual(result.target, self.source)
+
+        result = verify.check_link('.missing', self.source, self.resolver)
+        self.assertEqual(result.status, verify.MISSING)
+
+        other = os.path.join(self.testrepo, 'other')
+        open(other, 'a').close()
+        os.symlink(other, os.path.join(self.homedir, '.wrong'))
+        result = verify.check_link('.wrong', self.source, self.resolver)
+        self.assertEqual(result.status, verify.WRONG_TARGET)
+
+        open(os.path.join(self.homedir, '.regular'), 'a').close()
+        result = verify.check_link('.regular', self.source, self.resolver)
+        self.assertEqual(result.status, verify.WRONG_TARGET)
+
+        gone = os.path.join(self.testrepo, 'gone')
+        os.symlink(gone, os.path.join(self.homedir, '.dangling'))
+        result = verify.check_link('.dangling', gone, self.resolver)
+        self.assertEqual(result.status, verify.DANGLING_SOURCE)
+
+    def test_verify_links(self):
+        """Test verifying many links keeps the config order and counts statuses"""
+        symlinks = {}
+        for i in range(50):
+            destination = '.link{}'.format(i)
+            if i % 2 == 0:
+                os.symlink(self.source, os.path.join(self.homedir, destination))
+            symlinks[destination] = self.source
+
+        results = verify.verify_links(symlinks, self.resolver, jobs=4)
+        self.assertEqual([result.destination for result in results], list(symlinks))
+
+        counts = verify.summarize(results)
+        self.assertEqual(counts[verify.OK], 25)
+        self.assertEqual(counts[verify.MISSING], 25)
+        self.assertEqual(counts[verify.WRONG_TARGET], 0)
+
+    def test_verify_links_incremental(self):
+        """Test an incremental verify only checks the entries which changed"""
+        linkdir = os.path.join(self.homedir, 'links')
+        os.makedirs(linkdir)
+        symlinks = {}
+        for i in range(10):
+            destination = os.path.join('links', 'link{}'.format(i))
+            os.symlink(self.source, os.path.join(self.homedir, destination))
+            symlinks[destination] = self.source
+        os.utime(linkdir, ns=(10 ** 18, 10 ** 18))
+
+        fingerprints = verify.Fingerprints()
+        results = verify.verify_links(symlinks, self.resolver, jobs=4, fingerprints=fingerprints)
+        self.assertEqual(verify.summarize(results)[verify.SKIPPED], 0)
+        self.assertEqual(len(fingerprints.links), 10)
+
+        results = verify.verify_links(symlinks, self.resolver, jobs=4, fingerprints=fingerprints, incremental=True)
+        counts = verify.summarize(results)
+        self.assertEqual((counts[verify.OK], counts[verify.SKIPPED]), (10, 10))
+
+        # Replacing a link modifies the directory, only the replaced link is checked again
+        other = os.path.join(self.testrepo, 'other')
+        open(other, 'a').close()
+        os.remove(os.path.join(linkdir, 'link3'))
+        os.symlink(other, os.path.join(linkdir, 'link3'))
+
+        results = verify.verify_links(symlinks, self.resolver, jobs=4, fingerprints=fingerprints, incremental=True)
+        counts = verify.summarize(results)
+        self.assertEqual((counts[verify.OK], counts[verify.WRONG_TARGET], counts[verify.SKIPPED]), (9, 1, 9))
+        self.assertEqual(results[3].status, verify.WRONG_TARGET)
+        self.assertNotIn(os.path.join('links', 'link3'), fingerprints.links)
+
+        # Removing the source of a skipped link is noticed all the same
+        os.rename(self.source, self.source + '.moved')
+        results = verify.verify_links(symlinks, self.resolver, jobs=4, fingerprints=fingerprints, incremental=True)
+        self.assertEqual(verify.summarize(results)[verify.DANGLING_SOURCE], 10)
+        os.rename(self.source + '.moved', self.source)
+
+        # A full verify ignores the fingerprints
+        results = verify.verify_links(symlinks, self.resolver, jobs=4, fingerprints=fingerprints)
+        self.assertEqual(verify.summarize(results)[verify.SKIPPED], 0)
+
+    def test_verify_links_incremental_swapped_dir(self):
+        """Test a directory swapped for another one with the same mtime is checked again"""
+        linkdir = os.path.join(self.homedir, 'links')
+        os.makedirs(linkdir)
+        destination = os.path.join('links', 'link')
+        os.symlink(self.source, os.path.join(self.homedir, destination))
+        os.utime(linkdir, ns=(10 ** 18, 10 ** 18))
+        fingerprints = verify.Fingerprints()
+        verify.verify_links({destination: self.source}, self.resolver, fingerprints=fingerprints)
+
+        # As restored by rsync -a, with the mtime of the directory it replaces
+        restored = os.path.join(self.homedir, 'restored')
+        os.makedirs(restored)
+        os.utime(restored, ns=(10 ** 18, 10 ** 18))
+        shutil.rmtree(linkdir)
+        os.rename(restored, linkdir)
+
+        results = verify.verify_links({destination: self.source}, self.resolver, fingerprints=fingerprints,
+                                      incremental=True)
+        self.assertEqual(results[0].status, verify.MISSING)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from sym import verify
+from sym import watch
+from sym.config import ConfigYAML
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is only available on Linux')
+class TestWatch(unittest.TestCase):
+    """Tests watching symlinks for changes"""
+
+    def setUp(self):
+        os.environ["HOME"] = tempfile.mkdtemp('homedir')
+        self.homedir = os.environ["HOME"]
+        self.cachehome = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.homedir, '.cache')
+        self.testrepo = tempfile.mkdtemp('testrepo')
+        self.symconfig = os.path.join(self.testrepo, 'symconfig')
+        os.symlink(self.symconfig, os.path.join(self.homedir, '.symconfig'))
+
+        self.source = os.path.join(self.testrepo, 'linkme')
+        open(self.source, 'a').close()
+        self.link = os.path.join(self.homedir, '.config', 'linkme')
+        os.makedirs(os.path.dirname(self.link))
+        os.symlink(self.source, self.link)
+
+        config = ConfigYAML()
+        config.symlinks[os.path.join('.config', 'linkme')] = self.source
+        config.save()
+
+        self.watcher = watch.Watcher(self.symconfig, debounce=0.01)
+
+    def tearDown(self):
+        self.watcher.close()
+        if self.cachehome is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cachehome
+        shutil.rmtree(self.homedir)
+        shutil.rmtree(self.testrepo)
+
+    def test_watch_reports_changes(self):
+        """Test only the affected entries are checked"""
+        results = self.watcher.start()
+        self.assertEqual([result.status for result in results], [verify.OK])
+        self.assertEqual(self.watcher.poll(0), [])
+
+        open(os.path.join(self.homedir, '.config', 'unrelated'), 'a').close()
+        self.assertEqual(self.watcher.poll(1), [])
+
+        os.remove(self.link)
+        results = self.watcher.poll(1)
+        self.assertEqual([result.status for result in results], [verify.MISSING])
+
+    def test_watch_repair(self):
+        """Test missing links are recreated"""
+        self.watcher.repair = True
+        self.watcher.start()
+        os.remove(self.link)
+        results = self.watcher.poll(1)
+        self.assertEqual([result.status for result in results], [watch.REPAIRED])
+        self.assertEqual(os.readlink(self.link), self.source)
+
+    def test_watch_repair_removed(self):
+        """Test a link removed along with its entry is not recreated before the write of the config is handled"""
+        self.watcher.repair = True
+        self.watcher.start()
+        os.remove(self.link)
+        ConfigYAML().save()
+
+        # The deletion of the link arrives in a batch of its own, without the write of the config
+        wd = [wd for wd, directory in self.watcher.watches.items() if directory == os.path.dirname(self.link)][0]
+        self.assertEqual(self.watcher.handle([(wd, watch.IN_DELETE, 'linkme')]), [])
+        self.assertFalse(os.path.lexists(self.link))
+
+    def test_watch_parent_created(self):
+        """Test links are checked when their missing parent directory is created"""
+        self.watcher.repair = True
+        shutil.rmtree(os.path.dirname(self.link))
+        self.watcher.start()
+
+        os.makedirs(os.path.dirname(self.link))
+        results = self.watcher.poll(1)
+        self.assertEqual([result.status for result in results], [watch.REPAIRED])
+
+    def test_watch_config_reload(self):
+        """Test the config is reloaded when it is saved"""
+        self.watcher.start()
+        other = os.path.join(self.testrepo, 'other')
+        open(other, 'a').close()
+
+        config = ConfigYAML()
+        config.symlinks[os.path.join('.config', 'linkme')] = self.source
+        config.symlinks['.other'] = other
+        config.save()
+
+        results = self.watcher.poll(1)
+        statuses = dict((result.destination, result.status) for result in results)
+        self.assertEqual(statuses, {os.path.join('.config', 'linkme'): verify.OK, '.other': verify.MISSING})
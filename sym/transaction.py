@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import errno
+import json
+import os
+
+from sym import cache
+from sym import copies
+
+
+class Transaction(object):
+    """Changes the filesystem and the config together, so that either both change or neither does
+
+    A transaction offers the filesystem operations sym needs with the same names and arguments as the os module, so
+    that code taking an fs argument can run inside a transaction or directly on os. For every operation the operation
+    undoing it is appended to an undo journal in the cache directory. Committing saves the
+    config and removes the undo journal. Rolling back undoes the operations in reverse order and restores the symlinks,
+    folds and copies of the config to what they were when the transaction began, the symlinks from the preimages the
+    link table records while the transaction runs (see sym.config.LinkTable). A file which is not a symlink, i.e.
+    a copy (see sym.copies), is backed up next to the undo journal before it is removed.
+
+    The undo journal is not synced after every record, so that a large batch is not slowed down by it. If a process
+    dies in the middle of a transaction, the next transaction on the same symconfig rolls back the filesystem changes
+    recorded in its journal. A process dying between saving the config and removing its journal leaves the config
+    listing symlinks which were rolled back, which verify reports and apply recreates.
+
+    Used as a context manager, a transaction commits when the block completes and rolls back when it raises.
+
+    Parameters:
+        config    - The loaded config (sym.config.ConfigYAML or sym.shards.ShardedConfig) the changes are recorded in
+        symconfig - The real path to the symconfig
+    """
+
+    def __init__(self, config, symconfig):
+        self.config = config
+        self.symconfig = symconfig
+        recover(symconfig)
+
+        self.path = get_undo_path(symconfig, os.getpid())
+        self._fd = None
+        self._undo = []
+        self._preimages = config.symlinks.preimages = {}
+        self._folds = dict(config.folds)
+        self._copies = dict(config.copies)
+        self._mark = len(config.symlinks.changes)
+        self.done = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.done:
+            return
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def _record(self, undo):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.write(self._fd, (json.dumps(undo) + '\n').encode('utf-8'))
+        self._undo.append(undo)
+
+    # Creations are recorded once they succeeded, so that a failed one never undoes something which existed before.
+    # Removals are recorded before they happen, as what they remove cannot be found out afterwards.
+
+    def symlink(self, source, destination):
+        os.symlink(source, destination)
+        self._record(['unlink', destination, source])
+
+    def unlink(self, path):
+        if os.path.islink(path):
+            self._record(['symlink', path, os.readlink(path)])
+        else:
+            backup = '{}.{}'.format(self.path, len(self._undo))
+            copies.clone_file(path, backup)
+            self._record(['restore', path, backup])
+        os.unlink(path)
+
+    def copy_file(self, source, destination):
+        """Materializes source at destination, which must not exist or have the content of source, see sym.copies"""
+        existed = os.path.lexists(destination)
+        digest = copies.copy_file(source, destination)
+        if not existed:
+            self._record(['remove', destination, digest])
+        return digest
+
+    def mkdir(self, path):
+        os.mkdir(path)
+        self._record(['rmdir', path])
+
+    def makedirs(self, path):
+        parent = os.path.dirname(path)
+        if parent != path and not os.path.isdir(parent):
+            self.makedirs(parent)
+        self.mkdir(path)
+
+    def rmdir(self, path):
+        self._record(['mkdir', path])
+        os.rmdir(path)
+
+    def commit(self):
+        """Saves the config if it changed, and forgets how to undo the filesystem changes
+
+        If the config cannot be saved, the transaction is rolled back and the error raised again.
+        """
+        changed = self.config.folds != self._folds or self.config.copies != self._copies
+        if self.config.symlinks.changes[self._mark:] or changed:
+            try:
+                self.config.save()
+            except BaseException:
+                self.rollback()
+                raise
+        self._finish()
+
+    def rollback(self):
+        """Undoes the filesystem changes and the changes to the config made in the transaction"""
+        try:
+            undo(reversed(self._undo))
+        finally:
+            symlinks = self.config.symlinks
+            for destination, source in self._preimages.items():
+                if source is None:
+                    symlinks.pop(destination, None)
+                else:
+                    symlinks[destination] = source
+            del symlinks.changes[self._mark:]
+            self.config.folds.clear()
+            self.config.folds.update(self._folds)
+            self.config.copies.clear()
+            self.config.copies.update(self._copies)
+            self._finish()
+
+    def _finish(self):
+        self.done = True
+        self.config.symlinks.preimages = None
+        for operation in self._undo:
+            if operation[0] == 'restore' and os.path.exists(operation[2]):
+                os.unlink(operation[2])  # The backup of a removed copy, unless the rollback restored it
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            os.unlink(self.path)
+
+
+def get_undo_path(symconfig, pid):
+    """Returns the path of the undo journal of a process' transaction on a symconfig"""
+    return cache.get_cache_path(symconfig, 'undo.{}'.format(pid))
+
+
+def undo(operations):
+    """Applies undo records, skipping the ones whose operation never happened or was undone already
+
+    Parameters:
+        operations - An iterable of [action, path, ...] undo records as written by Transaction, in the order to apply
+                     them
+    """
+    for operation in operations:
+        action, path = operation[0], operation[1]
+        try:
+            if action == 'unlink':
+                if os.path.islink(path) and os.readlink(path) == operation[2]:
+                    os.unlink(path)
+            elif action == 'symlink':
+                if not os.path.lexists(path):
+                    os.symlink(operation[2], path)
+            elif action == 'rmdir':
+                os.rmdir(path)
+            elif action == 'mkdir':
+                os.mkdir(path)
+            elif action == 'remove':
+                if copies.digest_of(path) == operation[2]:
+                    os.unlink(path)
+            elif action == 'restore':
+                if not os.path.lexists(path):
+                    copies.copy_file(operation[2], path)
+                os.unlink(operation[2])
+        except OSError as e:
+            if e.errno not in (errno.ENOENT, errno.EEXIST, errno.ENOTEMPTY):
+                raise
+
+
+def recover(symconfig):
+    """Rolls back the transactions on a symconfig whose process died before finishing them
+
+    Parameters:
+        symconfig - The real path to the symconfig
+    """
+    prefix = os.path.basename(get_undo_path(symconfig, ''))
+    try:
+        names = [name for name in os.listdir(cache.get_cache_dir()) if name.startswith(prefix)]
+    except OSError:
+        return
+
+    for name in names:
+        try:
+            pid = int(name[len(prefix):])
+            os.kill(pid, 0)
+            continue  # Still running
+        except ValueError:
+            continue
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                continue
+
+        path = os.path.join(cache.get_cache_dir(), name)
+        with open(path, 'r') as stream:
+            operations = []
+            for line in stream:
+                try:
+                    operations.append(json.loads(line))
+                except ValueError:
+                    break  # Torn by the crash, the operation it records never started
+        undo(reversed(operations))
+        os.unlink(path)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import collections
+import errno
+import os
+import stat
+
+from sym import cache
+from sym.constants import DEFAULT_JOBS
+from sym.copies import hash_file
+
+
+OK = 'ok'
+MISSING = 'missing'
+WRONG_TARGET = 'wrong-target'
+DANGLING_SOURCE = 'dangling-source'
+OUTDATED = 'outdated'  # A copy (see sym.copies) whose content differs from its source
+
+STATUSES = (OK, MISSING, WRONG_TARGET, DANGLING_SOURCE, OUTDATED)
+
+SKIPPED = 'skipped'
+
+
+class VerifyResult(object):
+    """The outcome of verifying a single symlink entry
+
+    Attributes:
+        destination - The destination path as stored in the config
+        source      - The source path as stored in the config
+        status      - One of OK, MISSING, WRONG_TARGET, DANGLING_SOURCE or OUTDATED
+        target      - What the destination currently links to, None if it is not a symlink
+        checked     - False if the entry was skipped because its fingerprint showed it is unchanged
+        fingerprint - The (inode, mtime_ns, target, source) fingerprint of an OK entry, None otherwise
+    """
+
+    def __init__(self, destination, source, status, target=None, checked=True, fingerprint=None):
+        self.destination = destination
+        self.source = source
+        self.status = status
+        self.target = target
+        self.checked = checked
+        self.fingerprint = fingerprint
+
+    def __str__(self):
+        if self.status == WRONG_TARGET:
+            return '{}: {} -> {} (expected {})'.format(self.status, self.destination, self.target, self.source)
+        return '{}: {} -> {}'.format(self.status, self.destination, self.source)
+
+
+def check_link(destination, source, resolver):
+    """Verifies a single symlink entry against the filesystem
+
+    Parameters:
+        destination - The destination path as stored in the config
+        source      - The source path as stored in the config
+        resolver    - The sym.paths.PathResolver to resolve paths with
+
+    Returns:
+        A VerifyResult
+    """
+    abs_destination = resolver.resolve(destination)
+    abs_source = resolver.resolve(source)
+
+    try:
+        st = os.lstat(abs_destination)
+    except OSError as e:
+        if e.errno in (errno.ENOENT, errno.ENOTDIR):
+            return VerifyResult(destination, source, MISSING)
+        raise
+
+    target = None
+    if stat.S_ISLNK(st.st_mode):
+        target = os.readlink(abs_destination)
+
+    if not os.path.exists(abs_source):
+        return VerifyResult(destination, source, DANGLING_SOURCE, target)
+
+    if target is None or resolver.realpath(abs_destination) != resolver.realpath(abs_source):
+        return VerifyResult(destination, source, WRONG_TARGET, target)
+
+    return VerifyResult(destination, source, OK, target, fingerprint=(st.st_ino, st.st_mtime_ns, target, source))
+
+
+def check_copy(destination, source, resolver):
+    """Verifies a single entry materialized as a copy (see sym.copies) against the filesystem
+
+    A copy is OK if it is a regular file with the content of its source, the files are only hashed if their sizes
+    match.
+
+    Parameters:
+        destination - The destination path as stored in the config
+        source      - The source path as stored in the config
+        resolver    - The sym.paths.PathResolver to resolve paths with
+
+    Returns:
+        A VerifyResult
+    """
+    abs_destination = resolver.resolve(destination)
+    abs_source = resolver.resolve(source)
+
+    try:
+        st = os.lstat(abs_destination)
+    except OSError as e:
+        if e.errno in (errno.ENOENT, errno.ENOTDIR):
+            return VerifyResult(destination, source, MISSING)
+        raise
+
+    if stat.S_ISLNK(st.st_mode):
+        return VerifyResult(destination, source, WRONG_TARGET, os.readlink(abs_destination))
+    try:
+        source_st = os.stat(abs_source)
+    except OSError:
+        return VerifyResult(destination, source, DANGLING_SOURCE)
+    if not stat.S_ISREG(st.st_mode):
+        return VerifyResult(destination, source, WRONG_TARGET)
+
+    if st.st_size != source_st.st_size or \
+            hash_file(abs_destination, st.st_size) != hash_file(abs_source, source_st.st_size):
+        return VerifyResult(destination, source, OUTDATED)
+    return VerifyResult(destination, source, OK)
+
+
+def check_link_incremental(destination, source, resolver, fingerprint, parent_unchanged):
+    """Verifies a single symlink entry, unless its fingerprint shows that it has not changed since it was last verified
+
+    An entry is skipped when its parent directory is the same directory and has not been modified, as replacing or
+    removing the link would have modified it, or when the link still has the same inode and mtime as a symlink can not
+    be changed in place. The source is stat'ed all the same, an entry whose source went missing is checked in full.
+
+    Parameters:
+        destination      - The destination path as stored in the config
+        source           - The source path as stored in the config
+        resolver         - The sym.paths.PathResolver to resolve paths with
+        fingerprint      - The fingerprint recorded when the entry was last verified OK, or None
+        parent_unchanged - True if the inode and mtime of the parent directory match the ones recorded
+
+    Returns:
+        A VerifyResult
+    """
+    if fingerprint is not None and fingerprint[3] == source and os.path.exists(resolver.resolve(source)):
+        if parent_unchanged:
+            return VerifyResult(destination, source, OK, fingerprint[2], checked=False, fingerprint=fingerprint)
+
+        try:
+            st = os.lstat(resolver.resolve(destination))
+        except OSError:
+            st = None
+        if st is not None and (st.st_ino, st.st_mtime_ns) == tuple(fingerprint[:2]):
+            return VerifyResult(destination, source, OK, fingerprint[2], checked=False, fingerprint=fingerprint)
+
+    return check_link(destination, source, resolver)
+
+
+class Fingerprints(object):
+    """Stat fingerprints recorded by verify, used to skip unchanged entries in an incremental verify
+
+    Fingerprints describe the state of this host's filesystem, so they are kept in the cache (see sym.cache) rather
+    than in the config.
+
+    Attributes:
+        dirs  - A dict of parent directory to its (inode, mtime_ns), a directory swapped for another one with the same
+                mtime (e.g. restored by rsync -a) has another inode
+        links - A dict of destination to its (inode, mtime_ns, target, source) fingerprint
+    """
+
+    def __init__(self, dirs=None, links=None):
+        self.dirs = dirs or {}
+        self.links = links or {}
+
+    @classmethod
+    def load(cls, symconfig):
+        """Returns the fingerprints recorded for a symconfig"""
+        data = cache.load_data(symconfig, 'fingerprints')
+        if data is None:
+            return cls()
+        return cls(*data)
+
+    def save(self, symconfig):
+        """Records the fingerprints for a symconfig"""
+        cache.store_data(symconfig, 'fingerprints', (self.dirs, self.links))
+
+
+def _stat_dir(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if cache.is_racy(st):
+        return None  # Too recent to tell apart further modifications
+    return st.st_ino, st.st_mtime_ns
+
+
+def _map(func, items, jobs, report=None):
+    if jobs <= 1 or len(items) <= 1:
+        return _collect((func(item) for item in items), report)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as executor:
+        return _collect(executor.map(func, items), report)
+
+
+def _collect(results, report):
+    if report is None:
+        return list(results)
+    collected = []
+    for result in results:
+        report(result)
+        collected.append(result)
+    return collected
+
+
+def verify_links(symlinks, resolver, jobs=DEFAULT_JOBS, fingerprints=None, incremental=False, report=None,
+                 copies=()):
+    """Verifies every symlink entry, running the filesystem checks in a bounded thread pool
+
+    The checks are dominated by lstat, readlink and realpath calls which release the GIL, so running them concurrently
+    hides most of the latency of slow (e.g. NFS backed) home directories.
+
+    Parameters:
+        symlinks     - A mapping of destination to source paths, as stored in ConfigYAML.symlinks
+        resolver     - The sym.paths.PathResolver to resolve paths with
+        jobs         - The maximum number of checks to run at once
+        fingerprints - Fingerprints to update with the outcome of this verify, or None
+        incremental  - Skip the entries whose fingerprints show they are unchanged (see check_link_incremental)
+        report       - Called with every VerifyResult as soon as it is known, in the order of symlinks
+        copies       - The destinations materialized as copies, checked with check_copy and never skipped
+
+    Returns:
+        A list of VerifyResult, in the same order as symlinks
+    """
+    entries = list(symlinks.items())
+
+    def check_entry(entry):
+        if entry[0] in copies:
+            return check_copy(entry[0], entry[1], resolver)
+        return check_link(entry[0], entry[1], resolver)
+
+    if fingerprints is None:
+        return _map(check_entry, entries, jobs, report)
+
+    # Stat the parent directories before the entries, a directory modified while its entries are checked then simply
+    # does not match next time.
+    parents = [os.path.dirname(resolver.resolve(destination)) for destination, source in entries]
+    unique_parents = list(set(parents))
+    dirs = dict(zip(unique_parents, _map(_stat_dir, unique_parents, jobs)))
+
+    if incremental:
+        def check(item):
+            (destination, source), parent = item
+            if destination in copies:
+                return check_copy(destination, source, resolver)
+            unchanged = dirs[parent] is not None and fingerprints.dirs.get(parent) == dirs[parent]
+            return check_link_incremental(destination, source, resolver, fingerprints.links.get(destination),
+                                          unchanged)
+        results = _map(check, list(zip(entries, parents)), jobs, report)
+    else:
+        results = _map(check_entry, entries, jobs, report)
+
+    fingerprints.dirs = dict((parent, key) for parent, key in dirs.items() if key is not None)
+    fingerprints.links = dict((result.destination, result.fingerprint) for result in results
+                              if result.fingerprint is not None)
+    return results
+
+
+def summarize(results):
+    """Returns a Counter of how many results there are for each status, and how many were skipped"""
+    counts = collections.Counter(dict.fromkeys(STATUSES, 0))
+    counts.update(result.status for result in results)
+    counts[SKIPPED] = sum(1 for result in results if not result.checked)
+    return counts
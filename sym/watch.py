@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#  The MIT License (MIT)
+#
+#  Copyright (c) 2013 Thanh Ha
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of
+#  this software and associated documentation files (the "Software"), to deal in
+#  the Software without restriction, including without limitation the rights to
+#  use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+#  the Software, and to permit persons to whom the Software is furnished to do so,
+#  subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+#  FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+#  COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+#  IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+#  CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+from sym.config import load_config
+from sym.copies import copy_file
+from sym.paths import PathResolver
+from sym.verify import MISSING
+from sym.verify import VerifyResult
+from sym.verify import check_copy
+from sym.verify import check_link
+
+
+REPAIRED = 'repaired'
+
+DEFAULT_DEBOUNCE = 0.2
+
+# However busy the filesystem is, the affected entries are checked at least this many debounce periods after an event
+MAX_DEBOUNCES = 10
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+DIR_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+CONFIG_EVENTS = DIR_EVENTS | IN_CLOSE_WRITE | IN_MODIFY
+
+_EVENT = struct.Struct('iIII')
+
+
+class Inotify(object):
+    """A minimal wrapper around the Linux inotify API, through ctypes"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, 'inotify is not available on this platform')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available on this platform')
+
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def add_watch(self, path, mask):
+        """Watches a path, returns the watch descriptor"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+        return wd
+
+    def read(self):
+        """Returns a list of (wd, mask, name) tuples for the events which are ready, without blocking"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def wait(self, timeout):
+        """Waits up to timeout seconds (None for ever) for events, returns True if there are events to read"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        return bool(readable)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class Watcher(object):
+    """Watches every symlink in a config and checks the ones affected by filesystem events
+
+    The parent directory of every destination is watched, or its nearest existing ancestor while it does not exist,
+    together with the directory of the config so that the config is reloaded when it is written or replaced. Events
+    are coalesced: once an event arrives the watcher keeps reading until no new event arrived for debounce seconds (or
+    MAX_DEBOUNCES debounce periods passed), then every affected entry is checked once.
+
+    Attributes:
+        symconfig - The real path to the symconfig file
+        repair    - Recreate the links which went missing
+        debounce  - How long the filesystem must be quiet before the affected entries are checked
+    """
+
+    def __init__(self, symconfig, userhome=None, repair=False, debounce=DEFAULT_DEBOUNCE):
+        self.symconfig = os.path.realpath(symconfig)
+        self.userhome = userhome
+        self.repair = repair
+        self.debounce = debounce
+        self.inotify = None
+        self.config = None
+        self.symlinks = {}
+        self.copies = {}  # The destinations materialized as copies, see sym.copies
+        self.parents = {}  # parent directory -> {name: destination}
+        self.watches = {}  # wd -> watched directory
+
+    def start(self):
+        """Starts watching, returns the results of checking every entry"""
+        self.inotify = Inotify()
+        return self.reload()
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def reload(self):
+        """Reloads the config and watches it, returns the results of checking every entry"""
+        resolver = PathResolver(self.userhome)
+        self.config = load_config(self.symconfig)
+        self.symlinks = dict(self.config.symlinks.items())
+        self.copies = dict(self.config.copies)
+        self.parents = {}
+        for destination in self.symlinks:
+            parent, name = os.path.split(resolver.resolve(destination))
+            self.parents.setdefault(parent, {})[name] = destination
+
+        self._watch(os.path.dirname(self.symconfig), CONFIG_EVENTS)
+        if os.path.isdir(self.symconfig):  # The index and shards of a sharded config, see sym.shards
+            self._watch(self.symconfig, CONFIG_EVENTS)
+        self._watch_parents()
+        return self.check(self.symlinks)
+
+    def _watch(self, directory, mask):
+        try:
+            wd = self.inotify.add_watch(directory, mask)
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                return False
+            raise
+        self.watches[wd] = directory
+        return True
+
+    def _watch_parents(self):
+        """Watches every parent directory, or its nearest existing ancestor while it does not exist"""
+        watched = set(self.watches.values())
+        for parent in self.parents:
+            directory = parent
+            while directory not in watched and not self._watch(directory, DIR_EVENTS):
+                up = os.path.dirname(directory)
+                if up == directory:
+                    break
+                directory = up
+            watched.add(directory)
+
+    def check(self, destinations):
+        """Checks the given entries, repairing the missing ones if asked to
+
+        Before repairing anything the config is reloaded if it changed on disk and every entry is checked again, so that
+        a link sym remove deleted is not recreated from the config loaded before it.
+
+        Returns:
+            A list of sym.verify.VerifyResult, a repaired entry has the status REPAIRED
+        """
+        resolver = PathResolver(self.userhome)  # Directories may have been replaced since the last check
+        results = []
+        for destination in destinations:
+            source = self.symlinks[destination]
+            if destination in self.copies:
+                result = check_copy(destination, source, resolver)
+            else:
+                result = check_link(destination, source, resolver)
+            if result.status == MISSING and self.repair:
+                if self.config.changed_on_disk():
+                    return self.reload()
+                if self._repair(destination, source, resolver):
+                    result = VerifyResult(destination, source, REPAIRED)
+            results.append(result)
+        return results
+
+    def _repair(self, destination, source, resolver):
+        abs_source = resolver.resolve(source)
+        if not os.path.exists(abs_source):
+            return False
+        try:
+            if destination in self.copies:
+                copy_file(abs_source, resolver.resolve(destination))
+            else:
+                os.symlink(abs_source, resolver.resolve(destination))
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def poll(self, timeout=None):
+        """Waits for events and checks the entries they affect
+
+        Parameters:
+            timeout - How long to wait for the first event in seconds, None to wait for ever
+
+        Returns:
+            A list of sym.verify.VerifyResult for the affected entries, empty if nothing happened
+        """
+        if not self.inotify.wait(timeout):
+            return []
+
+        events = []
+        deadline = time.monotonic() + self.debounce * MAX_DEBOUNCES
+        while True:
+            events.extend(self.inotify.read())
+            if time.monotonic() >= deadline or not self.inotify.wait(self.debounce):
+                break
+        return self.handle(events)
+
+    def handle(self, events):
+        """Checks the entries affected by a batch of inotify events"""
+        config_names = (os.path.basename(self.symconfig), os.path.basename(self.symconfig) + '.journal')
+        config_dir = os.path.dirname(self.symconfig)
+        affected = set()
+        rewatch = False
+
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                affected.update(self.symlinks)  # Events were lost, check everything
+                continue
+
+            directory = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                rewatch = True
+                continue
+            if directory is None:
+                continue
+
+            if directory == config_dir and name in config_names or directory == self.symconfig:
+                return self.reload()
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                rewatch = True
+                affected.update(self._below(directory))
+            elif mask & IN_ISDIR:
+                rewatch = True
+                affected.update(self._below(os.path.join(directory, name)))
+
+            destination = self.parents.get(directory, {}).get(name)
+            if destination is not None:
+                affected.add(destination)
+
+        if rewatch:
+            self._watch_parents()
+        return self.check(sorted(affected))
+
+    def _below(self, directory):
+        """Returns the destinations which live in or below a directory"""
+        prefix = directory.rstrip(os.sep) + os.sep
+        destinations = []
+        for parent, names in self.parents.items():
+            if parent == directory or parent.startswith(prefix):
+                destinations.extend(names.values())
+        return destinations
+
+    def run(self, report):
+        """Watches until interrupted, passing every batch of results to report"""
+        report(self.start())
+        try:
+            while True:
+                results = self.poll()
+                if results:
+                    report(results)
+        finally:
+            self.close()